@@ -1,32 +1,79 @@
 from source.Market import *
 from source.commonStratgy import *
+from source.dataParsers import *
 from time import clock
 import csv
+from functools import partial
+import hashlib
+import os
+import numpy as np
 
 
 class Backtest:
-    def __init__(self):
-        self.market = Market()
+    def __init__(self, memory_budget=None, indicator_budget=None):
+        """ memory_budget: (int) the bytes that can be used by the values of the assets (see Market.assetMemory)
+        indicator_budget: (int) the bytes that can be used by the indicators (see Market.indicatorCache) """
+        self.market = Market(memory_budget, indicator_budget)
         print(self.__repr__())
 
     def __repr__(self):
         return "<Backtest>"
 
-    def add_asset_from_csv(self, path_name, sort_type, delimiter=";", asset_name="Unknown asset"):
-        the_data_reader = DataReader()
-        the_data_reader.open_csv(path_name, delimiter)
-        the_data_reader.clean_data(sort_type)
+    def add_asset_from_csv(self, path_name, sort_type="auto", delimiter=None, asset_name="Unknown asset",
+                           use_cache=True, lazy=False):
+        """ Load a csv file and register it in the market as a new asset
+
+        sort_type: (str) the name of the parser of the file (see dataParsers.PARSER_REGISTRY), "auto" to choose it
+            (and the delimiter) from the first lines of the file
+        delimiter: (str) the delimiter of the file, None for the one of the parser
 
-        the_asset = Asset(asset_name, the_data_reader.data)
+        Only the dates and the default field of the parser are read (Asset.data), the other fields (high, volume...) are loaded
+        together the first time one of them is asked (see Asset.get_column)
+        If use_cache, the cleaned data is memory-mapped from the binary cache (see DataReader.read_cached),
+        the csv is only parsed the first time or when it has been modified
+        If lazy, only the dates are read: the values are loaded the first time they are used, and may be unloaded
+        when the memory budget of the market is exceeded (see Market.assetMemory). A file without dates is not lazy.
+        """
+        if sort_type == "auto":
+            sort_type, delimiter = sniff_parser(path_name)
+        parser = get_parser(sort_type)
+        if delimiter is None:
+            delimiter = parser.delimiter
+        fields = [DATE_FIELD] if lazy else [parser.default, DATE_FIELD]
+        columns = load_csv_columns(path_name, delimiter, sort_type, fields, use_cache)
+        if lazy and columns[DATE_FIELD] is None:
+            # the length of the asset is unknown without its values
+            columns = load_csv_columns(path_name, delimiter, sort_type, [parser.default, DATE_FIELD], use_cache)
+
+        the_asset = Asset(asset_name, columns.get(parser.default), default_field=parser.default,
+                          field_names=list(parser.fields), dates=columns[DATE_FIELD],
+                          loader=partial(load_csv_columns, path_name, delimiter, sort_type, use_cache=use_cache))
         self.market.register_asset(the_asset)
         return the_asset
 
     def simule(self, string_mode=True, plot_mode=True, **kwargs):
         """ Called to simulate a market from the day 0 (or first_day included if given in the parameters)
-        to the last day (or the last_day included given in the parameters) """
+        to the last day (or the last_day included given in the parameters)
+
+        first_day and last_day may be days (int) or dates (str "yyyy-mm-dd", datetime.date, numpy.datetime64),
+        a date is converted with market.get_day(): first day >= first_day, last day <= last_day
+
+        The vectorized strategies (see Strategy.signals) are simulated first by market.run_vectorized(), the look-ahead
+        check can be disabled with check_look_ahead=False. The day by day loop is skipped if nothing else is simulated.
+
+        If resume=True, the simulation starts at market.theDay: the day after the last day simulated (first_day is
+        ignored), used to continue a simulation or a branch restored from a snapshot (see snapshot())
+
+        If deferred_valuation=True, the valueHistory of the portfolios is not updated day by day but rebuilt from their
+        trades after the loop (see Market.rebuild_value_histories), faster when there are many portfolios
+        """
 
         beginning_time = clock()  # for time execution measurement
 
+        for key, side in (("first_day", "left"), ("last_day", "right")):
+            if key in kwargs and kwargs[key] is not None and not isinstance(kwargs[key], (int, np.integer)):
+                kwargs[key] = self.market.get_day(kwargs[key], side)
+
         if "last_day" in kwargs and kwargs["last_day"] is not None:
             last_day = min(self.market.maximumDay, kwargs["last_day"])
             if self.market.maximumDay < kwargs["last_day"]:
@@ -34,15 +81,32 @@ class Backtest:
         else:
             last_day = self.market.maximumDay
 
-        if "first_day" in kwargs and kwargs["first_day"] is not None:
+        if kwargs.get("resume", False):
+            first_day = self.market.theDay
+        elif "first_day" in kwargs and kwargs["first_day"] is not None:
             first_day = min(last_day, kwargs["first_day"])
         else:
             first_day = 0
 
+        for strategy in self.market.strategyList:
+            if strategy.vectorized:
+                self.market.run_vectorized(strategy, first_day, last_day, kwargs.get("check_look_ahead", True))
+
         self.market._theDay = first_day
         # print("first day :", first_day, "and last day :", last_day)
-        while self.market.play_day(last_day):
-            pass
+        if (any(not strategy.vectorized for strategy in self.market.strategyList) or
+                any(not portfolio.vectorized for portfolio in self.market.portfolioList) or
+                len(self.market.expertList) > 0 or len(self.market.pendingPredictions) > 0):
+            self.market.deferredValuation = kwargs.get("deferred_valuation", False)
+            try:
+                while self.market.play_day(last_day):
+                    pass
+            finally:
+                self.market.deferredValuation = False
+            if kwargs.get("deferred_valuation", False):
+                self.market.rebuild_value_histories(first_day, last_day)
+        else:
+            self.market._theDay = max(first_day, last_day + 1)
         elapsed_time = clock() - beginning_time
         if string_mode:
             print("")
@@ -70,68 +134,188 @@ class Backtest:
             if plot_mode:
                 plt.show(block=True)
 
+    def simule_batch(self, make_instance, parameter_list, batch_size=None, **kwargs):
+        """ Simulate a grid of strategies or experts in one walk of the market, instead of one simule() per parameter
+
+        make_instance: (function) called with each element of parameter_list, creates the strategies / experts of this
+            parameter in self.market and returns them (or anything used to read their results)
+        batch_size: (int) the number of parameters simulated together, all of them if None (the memory used grows
+            with the number of instances simulated together)
+        the other kwargs are given to simule() (first_day, last_day, deferred_valuation...)
+
+        Yield the results of make_instance() in the order of parameter_list, when the batch of the parameter has been
+        simulated. Each day is played once for the whole batch: the strategies / experts are called one after the
+        other, each one has its own portfolio and predictions, so the results are the same as one simulation per
+        parameter (except for the instances using the random module, which is shared). The market is soft_reset()
+        after each batch, when the first instance of the next batch is asked for (or when the generator is closed):
+        the instances of a batch are still in the market (self.market.strategyList...) while they are read. After
+        the reset, the portfolios and predictions keep their own ledger, so their results (results_description(),
+        closePositionList...) stay readable. The market must be empty before.
+        """
+        if len(self.market.strategyList) > 0 or len(self.market.expertList) > 0:
+            raise ValueError("simule_batch needs a market without strategy nor expert, use soft_reset() before")
+        parameter_list = list(parameter_list)
+        if batch_size is None:
+            batch_size = max(len(parameter_list), 1)
+        kwargs.setdefault("string_mode", False)
+
+        for first in range(0, len(parameter_list), batch_size):
+            instance_list = [make_instance(parameters) for parameters in parameter_list[first:first + batch_size]]
+            self.simule(**kwargs)
+            try:
+                for instance in instance_list:
+                    yield instance
+            finally:
+                # the batch is still in the market while it is read, reset when the next one is asked for
+                self.soft_reset()
+
     def soft_reset(self):
         """Reset the market for an other new simulation, keep the assets loaded
         WARNING : the max day is still the lowest ! """
         self.market.strategyList.clear()
         self.market.portfolioList.clear()
-        self.market.predictionList.clear()
+        self.market.clear_holdings()
+        # the records of the previous simulation stay readable from their own ledger
+        self.market.ledger = Ledger(self.market.assetList)
+        self.market.pendingPredictions.clear()
         self.market.expertList.clear()
         self.market._theDay = 0
 
+    def snapshot(self):
+        """ Return a copy of the market at its current day (see Market.fork)
+
+        Used when several simulations share their first days: the common days are simulated once, then each branch
+        is restored from the snapshot (restore()) and simulated with simule(resume=True)
+        """
+        return self.market.fork()
+
+    def restore(self, snapshot):
+        """ Replace the market by a copy of snapshot (which is not modified: it can be restored again)
+
+        Return the new market: its strategies, portfolios and experts are copies, found in its lists
+        """
+        self.market = snapshot.fork()
+        return self.market
+
     def hard_reset(self):
         """Reset the market for an other new simulation, delete the assset and reset max day """
-        self.market = Market()
+        self.market = Market(self.market.assetMemory.budget, self.market.indicatorCache.budget)
 
 
 class DataReader:
+    """ Read a csv file and convert its fields into numpy arrays of float64 (one value per day, the oldest first)
+
+    The parsing is done by the parser registered for the sort_type (see dataParsers.CsvParser)
+
+    pathName: (str) the csv file opened by open_csv()
+    delimiter: (str) the delimiter of the csv file (None for the delimiter of the parser)
+    data: (numpy array) the cleaned data of the default field of the parser, set by clean_data()
+    columns: (dict) field -> numpy array, the fields read by clean_data(), the DATE_FIELD is an array of
+        datetime64[D] (or None if the dates of the file can not be parsed)
+    rowsPerSecond: (float) the speed of the last parsing
+    """
+
     def __init__(self):
-        self.reader = None
-        self.file = None
+        self.pathName = None
+        self.delimiter = None
         self.data = None
+        self.columns = {}
+        self.rowsPerSecond = None
         # print(self.__repr__())
 
     def __repr__(self):
         return "<DataReader>"
 
     def open_csv(self, path_name, delimiter):
-        with open(path_name) as self.file:
-            self.reader = csv.reader(self.file, delimiter=delimiter)
-            self.data = list(self.reader)
-
-    def clean_data(self, sort_type):
-        if sort_type == "propre":
-            temp_data = []
-            for row in self.data:
-                temp_data += [float(row[1])]
-            self.data = temp_data
-
-        elif sort_type == "yahoo":  # G : get adjusted close data from csv (date, open, high, low, close, adjclose)
-            temp_data = []
-            self.data = self.data[1:]  # delete the first line
-            # reverse the order of the data (the oldest become the last ones)
-            for i in range(len(self.data)):
-                temp_data += [self.data[-i-1]]
-
-            self.data = temp_data
-            temp_data = []
-            for row in self.data:
-                temp_data += [float(row[6])]
-            self.data = temp_data
-
-        elif sort_type == "ltc":  # G : get adjusted close data from csv (date, open, high, low, close, adjclose)
-            temp_data = []
-            self.data = self.data[1:]  # delete the first line
-            # reverse the order of the data (the oldest become the last ones)
-            for i in range(len(self.data)):
-                temp_data += [self.data[-i-1]]
-
-            self.data = temp_data
-            temp_data = []
-            for row in self.data:
-                temp_data += [float(row[4])]
-            self.data = temp_data
+        """ Register the file to read, nothing is parsed before clean_data() """
+        self.pathName = path_name
+        self.delimiter = delimiter
+
+    def clean_data(self, sort_type, fields=None):
+        """ Parse the csv registered by open_csv() into self.columns, with the parser registered as sort_type
+
+        fields: (list of str) the fields read in one pass (may contain DATE_FIELD), only the default field of the
+            parser if None
+        """
+        parser = get_parser(sort_type)
+        rows_parsed, time_spent = parser.rowsParsed, parser.timeSpent
+        self.columns = parser.parse(self.pathName, fields, self.delimiter)
+        self.data = self.columns.get(parser.default)
+        self.rowsPerSecond = (parser.rowsParsed - rows_parsed) / max(parser.timeSpent - time_spent, 1e-9)
+
+    def read_cached(self, path_name, delimiter, sort_type, fields=None):
+        """ Same result as open_csv() then clean_data(), but the columns are memory-mapped from a binary cache
+
+        There is one .npy file per field stored in DATA_CACHE_DIRECTORY next to the csv, its name contains a key
+        computed from the path, the modification time and the size of the csv, the delimiter and the sort_type:
+        a modified csv gets a new key and is parsed again. The fields missing in the cache are parsed in one pass.
+        The cache is skipped (with a warning) if it can not be written.
+        """
+        parser = get_parser(sort_type)
+        if fields is None:
+            fields = [parser.default]
+        cache_names = {field: data_cache_name(path_name, delimiter, sort_type, field) for field in fields}
+        missing_fields = [field for field in fields if not os.path.isfile(cache_names[field])]
+        if missing_fields:
+            self.open_csv(path_name, delimiter)
+            self.clean_data(sort_type, missing_fields)
+            parsed_columns = self.columns
+            try:
+                for field in missing_fields:
+                    if parsed_columns[field] is not None:
+                        write_data_cache(cache_names[field], parsed_columns[field])
+            except OSError as error:
+                print("!!! DATA CACHE NOT WRITTEN FOR {0}: {1} !!!".format(path_name, error))
+        else:
+            parsed_columns = {}
+
+        self.columns = {}
+        for field in fields:
+            if os.path.isfile(cache_names[field]):
+                self.columns[field] = np.load(cache_names[field], mmap_mode="r")
+            else:
+                self.columns[field] = parsed_columns[field]
+        self.data = self.columns.get(parser.default)
+
+
+def load_csv_columns(path_name, delimiter, sort_type, fields, use_cache=True):
+    """ Return a dict field -> numpy array of the fields of a csv, read in one pass (used to load Asset columns) """
+    the_data_reader = DataReader()
+    if use_cache:
+        the_data_reader.read_cached(path_name, delimiter, sort_type, fields)
+    else:
+        the_data_reader.open_csv(path_name, delimiter)
+        the_data_reader.clean_data(sort_type, fields)
+    return the_data_reader.columns
+
+
+DATA_CACHE_DIRECTORY = "__datacache__"
+
+
+def data_cache_name(path_name, delimiter, sort_type, field):
+    """ Return the path of the binary cache of a field of a csv file, see DataReader.read_cached() """
+    path_name = os.path.abspath(path_name)
+    stat = os.stat(path_name)
+    key = "{0}|{1}|{2}|{3}|{4}".format(path_name, stat.st_mtime_ns, stat.st_size, delimiter, sort_type)
+    key = hashlib.sha1(key.encode()).hexdigest()[:16]
+    directory, file_name = os.path.split(path_name)
+    return os.path.join(directory, DATA_CACHE_DIRECTORY, "{0}.{1}.{2}.{3}.npy".format(file_name, sort_type, field, key))
+
+
+def write_data_cache(cache_name, data):
+    """ Write data in cache_name, remove the outdated caches of the same csv, sort_type and field """
+    directory, file_name = os.path.split(cache_name)
+    os.makedirs(directory, exist_ok=True)
+    prefix = file_name.rsplit(".", 2)[0] + "."
+    for old_file in os.listdir(directory):
+        if old_file.startswith(prefix) and old_file.endswith(".npy") and old_file != file_name:
+            os.remove(os.path.join(directory, old_file))
 
+    # written in a temporary file and then renamed, so that a parallel job never reads a half written cache
+    temp_name = "{0}.{1}.tmp".format(cache_name, os.getpid())
+    with open(temp_name, "wb") as file:
+        np.save(file, np.asarray(data))
+    os.replace(temp_name, cache_name)
 
 
 
@@ -1,6 +1,12 @@
 import random
+import copy
+import numpy as np
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 from source.commonTools import *
+from source.ledger import *
+from source.indicatorCache import *
+from source.leadLagTools import *
 
 # TODO SHORT (opening and closing)
 # TODO PREDICTION (other than UP or DOWN)
@@ -13,32 +19,71 @@ from source.commonTools import *
 # - Moyenne mobile avec un expert (indicateur)
 
 
-class Trade:
-    """ Represent a Trade registered in a Position
+# the values copied as they are by fork_copy()
+NUMBER_TYPES = (int, float, bool, np.number, np.bool_)
+
 
-    No registration needed : position are registered
+def fork_copy(the_object, memo):
+    """ copy.deepcopy() of an object of a simulation (used as __deepcopy__ by Portfolio, Expert and Strategy, see
+    Market.fork): its lists of numbers (valueHistory, pastLongSum...) are copied in one go, not number by number, its
+    read-only arrays (the indicators of the market, see Market.indicator) are shared """
+    the_copy = the_object.__class__.__new__(the_object.__class__)
+    memo[id(the_object)] = the_copy
+    for name, value in the_object.__dict__.items():
+        if type(value) is list and all(isinstance(item, NUMBER_TYPES) for item in value):
+            the_copy.__dict__[name] = list(value)
+        elif isinstance(value, np.ndarray) and not value.flags.writeable:
+            the_copy.__dict__[name] = value
+        else:
+            the_copy.__dict__[name] = copy.deepcopy(value, memo)
+    return the_copy
 
-    Constructor : Trade(the asset traded,
-                       the volume bought (<0 if sold) by the strategy,
-                       the day it was made)
 
-    id: (int) unique id generated using the 'static' variable lastId
+class Trade(LedgerRecord):
+    """ Represent a Trade registered in a Position
+
+    No registration needed : position are registered. The values are stored by columns in the trades of the ledger of
+    the market (see ledger.Ledger), a Trade only keeps its row: it is created by Ledger.add_trade() then read with
+    Trade(the ledger, the row)
+
+    id: (int) the row of the trade in ledger.trades, unique in a market (until it is reset)
+    asset: (Asset) the asset traded
+    volume: (float) the volume bought (<0 if sold) by the strategy
+    day: (int) the day it was made
+    price: (float) the value of the asset the day it was made
+    portfolio: (Portfolio) the portfolio that made it
     """
-    lastId = 0
-
-    def __init__(self, asset, volume, day):
-        self.asset = asset
-        self.volume = volume
-        self.day = day
-        self.id = Trade.lastId
-        Trade.lastId += 1
-        # print(self.__repr__())
+    __slots__ = ()
+
+    def __init__(self, ledger, row):
+        self.ledger = ledger
+        self.id = row
 
     def __repr__(self):
         return "<Trade of {0}, volume: {1}, the day: {2}>".format(self.asset.name, self.volume, self.day)
 
+    @property
+    def asset(self):
+        return self.ledger.assets[self.ledger.trades.get("asset", self.id)]
+
+    @property
+    def volume(self):
+        return self.ledger.trades.get("volume", self.id)
+
+    @property
+    def day(self):
+        return self.ledger.trades.get("day", self.id)
+
+    @property
+    def price(self):
+        return self.ledger.trades.get("price", self.id)
+
+    @property
+    def portfolio(self):
+        return self.ledger.portfolios[self.ledger.trades.get("portfolio", self.id)]
+
 
-class Position:
+class Position(LedgerRecord):
     """ Represent a Position opened by a Strategy, may be SHORT or LONG.
 
     Is registered into the portfolio when created: Portfolio.register_position()
@@ -51,29 +96,28 @@ class Position:
                            the type of position (True for LONG, False for SHORT),
                            the portfolio where it will be registered and where the cash will be send when closed)
 
+    The values are stored by columns in the ledger of the market (see ledger.Ledger), a Position only keeps its row:
+    the attributes below are read from the ledger
+    id: (int) the row of the position in ledger.positions, unique in a market (until it is reset)
+
     openTrade: (Trade) the opening trade
     closeTrade: (Trade) the closing trade (None initially)
 
     long: (boolean) True for long, False for short
     closed: (boolean) True if closed (False initially)
 
-    gain: (float) the gain realized by the position (>0 for a SHORT if final_price < first_price)
-    result: (float) the return realized by the position =final_price/open_price
-    value_history: (list) the historical values of the position (volume*price stored each day)
+    gain: (float) the gain realized by the position (>0 for a SHORT if final_price < first_price), None while open
+    result: (float) the return realized by the position =final_price/open_price, None while open
+    valueHistory: (numpy array) the historical values of the position (volume*price of each day from the opening day
+        to the closing day, or to the last day the portfolio was valued if still open), property: computed from the
+        values of the asset when asked, nothing is stored day by day
     portfolio: (Portfolio) the portfolio where it is registered and where the cash will be send when closed
     """
+    __slots__ = ()
 
     def __init__(self, asset, volume, day, long, portfolio):
-        self.openTrade = Trade(asset, volume, day)
-        self.closeTrade = None
-
-        self.long = long
-        self.closed = False
-
-        self.gain = None
-        self.result = None
-        self.valueHistory = []
-        self.portfolio = portfolio
+        self.ledger = portfolio.market.ledger
+        self.id = self.ledger.add_position(self.ledger.add_trade(asset, volume, day, portfolio), long)
 
         # the position is registered in the portfolio
         portfolio.register_position(self)
@@ -95,8 +139,50 @@ class Position:
                                                                         self.openTrade.volume, self.openTrade.day,
                                                                         self.closeTrade.day, self.gain, self.result)
 
+    @property
+    def openTrade(self):
+        return Trade(self.ledger, self.ledger.positions.get("open", self.id))
+
+    @property
+    def closeTrade(self):
+        row = self.ledger.positions.get("close", self.id)
+        return Trade(self.ledger, row) if row >= 0 else None
+
+    @property
+    def long(self):
+        return POSITION_TYPES[self.ledger.positions.get("long", self.id)]
+
+    @property
+    def closed(self):
+        return self.ledger.positions.get("close", self.id) >= 0
+
+    @property
+    def gain(self):
+        return self.ledger.position_gain(self.id)[0] if self.closed else None
+
+    @property
+    def result(self):
+        return self.ledger.position_gain(self.id)[1] if self.closed else None
+
+    @property
+    def portfolio(self):
+        return self.ledger.portfolios[self.ledger.trades.get("portfolio", self.ledger.positions.get("open", self.id))]
+
+    @property
+    def valueHistory(self):
+        open_trade = self.openTrade
+        if self.closed:
+            last_day = self.closeTrade.day
+        else:
+            last_day = self.portfolio.lastDay
+        if last_day is None or last_day < open_trade.day:
+            return np.empty(0)
+        return open_trade.asset.data[open_trade.day:last_day + 1] * open_trade.volume
+
     def get_returns(self):
-        returns = get_returns(self.valueHistory)
+        """ Return the daily returns of the position (numpy array, one less than valueHistory) """
+        values = self.valueHistory
+        returns = (values[1:] - values[:-1]) / values[:-1]
 
         # ***** POINT TO CHECK ***** (Guillaume)
         # seems ok to me (JM) because for a short, value_history should be normally decreasing and cause
@@ -104,12 +190,12 @@ class Position:
 
         # multiply by -1 if is short
         if not self.long:
-            returns = [-item for item in returns]
+            returns = -returns
 
         return returns
 
 
-class Prediction:
+class Prediction(LedgerRecord):
     """ Represent a Prediction made by an Expert.
 
     Is registered into the market when created : Market.register_prediction()
@@ -121,24 +207,19 @@ class Prediction:
                              the day it was made,
                              the market where it will be registered (market not stored))
 
-    id: (int) unique id generated using the 'static' variable lastId
+    The values are stored by columns in the ledger of the market (see ledger.Ledger), a Prediction only keeps its row:
+    the attributes below are read from the ledger (isTrue and result are written there by the market)
+    id: (int) the row of the prediction in ledger.predictions, unique in a market (until it is reset)
     isTrue: (boolean) initially False and turn to True (if is true) by the market when the Prediction is checked
     final_term: (int) the day ID when the prediction will be verified (and isTrue finally set) NB: not the shift of day!
     result: (float) yield: asset(final_term)/asset(day_it_was_made)
     """
-    lastId = 0
+    __slots__ = ()
 
     def __init__(self, asset, evolution, final_term, expert_who_made_it, day_it_was_made, market):
-        self.asset = asset
-        self.evolution = evolution  # can be UP, DOWN for the moment (soon : an evolution (ex: -250 for the cac 40))
-        self.expert = expert_who_made_it
-        self.day = day_it_was_made
-        self.final_term = final_term
-        self.isTrue = False
-        self.result = -1
-
-        self.id = Prediction.lastId
-        Prediction.lastId += 1
+        self.ledger = market.ledger
+        # evolution can be UP, DOWN for the moment (soon : an evolution (ex: -250 for the cac 40))
+        self.id = self.ledger.add_prediction(asset, evolution, final_term, expert_who_made_it, day_it_was_made)
         # the prediction is registered in the market
         market.register_prediction(self)
         # print(self.__repr__())
@@ -147,6 +228,42 @@ class Prediction:
         return "<Prediction {} of asset : {}, the theDay {}, evolution : {}>".format(self.id, self.asset.name,
                                                                                      self.day, self.evolution)
 
+    @property
+    def asset(self):
+        return self.ledger.assets[self.ledger.predictions.get("asset", self.id)]
+
+    @property
+    def evolution(self):
+        return self.ledger.evolutions[self.id]
+
+    @property
+    def expert(self):
+        return self.ledger.experts[self.ledger.predictions.get("expert", self.id)]
+
+    @property
+    def day(self):
+        return self.ledger.predictions.get("day", self.id)
+
+    @property
+    def final_term(self):
+        return self.ledger.predictions.get("final_term", self.id)
+
+    @property
+    def isTrue(self):
+        return self.ledger.predictions.get("isTrue", self.id)
+
+    @isTrue.setter
+    def isTrue(self, value):
+        self.ledger.predictions.set("isTrue", self.id, value)
+
+    @property
+    def result(self):
+        return self.ledger.predictions.get("result", self.id)
+
+    @result.setter
+    def result(self, value):
+        self.ledger.predictions.set("result", self.id, value)
+
 
 class Asset:
     """ Represent a Asset in the market.
@@ -154,20 +271,286 @@ class Asset:
     Must be registered into the market: market.
 
     Constructor : Asset(the name of the asset,
-                        the list of the value (one for each day))
-
+                        the list (or array) of the value (one for each day), None to load it on first access,
+                        the name of the field of data (optional, value = "close"),
+                        the names of all the fields available (optional, only the field of data by default),
+                        the function loading the fields (optional): loader(list of fields) -> dict field -> data,
+                        the dates of the values (optional, array of datetime64[D] sorted from the oldest),
+                        the number of values (optional, needed if data and dates are None))
+
+    An asset registered with data=None (lazy asset, see Backtest.add_asset_from_csv) only knows its name, its length
+    and its dates: its values are loaded by the loader the first time they are used, and can be unloaded again by
+    the AssetMemory of the market when the memory budget is exceeded (they will be loaded again if needed)
+
+    data: (numpy array of float64) contiguous and *read-only*, so that the slices given by market.get_asset_data()
+        are views and never copies (property, loaded on first access)
     length: (int) the number of day that can be simulated (from day=0 to length-1 because the first simulated day is 0)
+    columns: (dict) field -> numpy array, one contiguous read-only array per field already loaded (struct of arrays)
+    fieldNames: (list of str) the fields that can be asked to get_column()
+    dates: (numpy array of datetime64[D]) the date of each day, None if unknown
+    memory: (AssetMemory) the memory manager of the market where the asset is registered (None before)
+    index: (int) the column of the asset in market.holdings (None before the registration)
+
+    rawColumns, rawDates: the columns and dates as loaded, columns, dates and data are their reindexing on the
+        calendar of the market when the market aligns its assets (see Asset.align)
+    alignIndex: (numpy array of int) for each day of the calendar, the position in the raw data (None if not aligned)
+    visibleDays: (int) if not None, only the visibleDays first days are given by data and get_column() (the next ones
+        are hidden while the market checks the look-ahead of a vectorized strategy, see Market.check_signals)
     """
 
-    def __init__(self, name, data):
+    def __init__(self, name, data=None, default_field="close", field_names=None, loader=None, dates=None, length=None):
         self.name = name
-        self.data = data
-        self.length = len(data)
+        self.defaultField = default_field
+        self.fieldNames = field_names if field_names is not None else [default_field]
+        self.loader = loader
+        self.memory = None
+        self.index = None
+
+        self.rawColumns = {}
+        self.columns = {}
+        self._data = None
+        if data is not None:
+            self._data = read_only_array(data)
+            self.rawColumns[default_field] = self._data
+            self.columns[default_field] = self._data
+        elif loader is None:
+            raise ValueError("the asset {0} has no data and no loader".format(name))
+
+        self.dates = None
+        if dates is not None:
+            self.dates = np.asarray(dates, dtype="datetime64[D]").view()
+            self.dates.flags.writeable = False
+        self.rawDates = self.dates
+        self.alignIndex = None
+        self.visibleDays = None
+
+        if self._data is not None:
+            self.rawLength = len(self._data)
+        elif self.dates is not None:
+            self.rawLength = len(self.dates)
+        elif length is not None:
+            self.rawLength = length
+        else:
+            raise ValueError("the length of the lazy asset {0} is unknown".format(name))
+        self.length = self.rawLength
         # print(self.__repr__())
 
+    def __deepcopy__(self, memo):
+        # the assets (and their values) are shared by the copies of a market, see Market.fork()
+        return self
+
     def __repr__(self):
         return "<Asset: {0}>".format(self.name)
 
+    @property
+    def data(self):
+        """ The values of the default field, loaded by the loader the first time (see get_column) """
+        if self._data is None:
+            self._data = self.full_column(self.defaultField)
+        elif self.memory is not None:
+            self.memory.touch(self)
+        if self.visibleDays is not None:
+            return self._data[:self.visibleDays]
+        return self._data
+
+    def is_loaded(self):
+        """ True if the values of the default field are in memory """
+        return self._data is not None
+
+    def get_column(self, field=None):
+        """ Return the read-only array of a field (data if field is None)
+
+        The default field is loaded alone the first time it is asked, the first time an other field is asked all the
+        fields not yet loaded are loaded in one pass by self.loader
+        """
+        if field is None:
+            return self.data
+        column = self.full_column(field)
+        if self.visibleDays is not None:
+            return column[:self.visibleDays]
+        return column
+
+    def full_column(self, field):
+        """ get_column() with all the days, even the ones hidden by visibleDays """
+        column = self.columns.get(field)
+        if column is None:
+            if field not in self.rawColumns:
+                if field not in self.fieldNames or self.loader is None:
+                    raise KeyError("no field {0!r} in {1}, available: {2}".format(field, self, self.fieldNames))
+                if field == self.defaultField:
+                    missing_fields = [field]
+                else:
+                    missing_fields = [name for name in self.fieldNames
+                                      if name not in self.rawColumns and name != self.defaultField]
+                for name, column in self.loader(missing_fields).items():
+                    self.rawColumns[name] = read_only_array(column)
+            column = self.rawColumns[field]
+            if self.alignIndex is not None:
+                column = read_only_array(column[self.alignIndex])
+            self.columns[field] = column
+            if self.memory is not None:
+                self.memory.update(self)
+        elif self.memory is not None:
+            self.memory.touch(self)
+        return column
+
+    def memory_size(self):
+        """ Return the number of bytes of the columns in memory (raw and aligned) """
+        size = sum(column.nbytes for column in self.rawColumns.values())
+        if self.alignIndex is not None:
+            size += sum(column.nbytes for column in self.columns.values())
+        return size
+
+    def unload(self):
+        """ Free the columns (they will be loaded again if needed), return False if they can not be loaded again """
+        if self.loader is None:
+            return False
+        self.rawColumns = {}
+        self.columns = {}
+        self._data = None
+        return True
+
+    def append(self, values, dates=None):
+        """ Add new days at the end of the asset (the new bars of a daily run, see Market.append_bars)
+
+        values: (list or array) the values of the default field for the new days, or a dict field -> values that must
+            contain the default field. The other fields are removed from the asset (they would be too short)
+        dates: (list or array of dates) the dates of the new days, after the last date (needed if the asset has dates)
+        The values are loaded first if needed: the asset can not be unloaded any more (its file does not have the
+        new days)
+        """
+        if not isinstance(values, dict):
+            values = {self.defaultField: values}
+        if self.defaultField not in values:
+            raise ValueError("the values of the default field {0!r} of {1} are needed".format(self.defaultField, self))
+        values = {field: np.asarray(column, dtype=np.float64) for field, column in values.items()}
+        number_of_days = len(values[self.defaultField])
+        for field, column in values.items():
+            if len(column) != number_of_days:
+                raise ValueError("{0} values of {1!r} given for {2} days".format(len(column), field, number_of_days))
+        if self.rawDates is not None:
+            if dates is None:
+                raise ValueError("the dates of the new days of {0} are needed".format(self))
+            dates = np.asarray(dates, dtype="datetime64[D]")
+            if len(dates) != number_of_days or not (np.all(dates[1:] > dates[:-1]) and
+                                                    (self.rawLength == 0 or dates[0] > self.rawDates[-1])):
+                raise ValueError("the dates of the new days of {0} must be sorted and after its last date".format(self))
+
+        # the fields are loaded before the loader is dropped
+        old_columns = {field: self.get_column(field) if field not in self.rawColumns else self.rawColumns[field]
+                       for field in values}
+        self.loader = None
+        self.fieldNames = list(values)
+        self.rawColumns = {field: read_only_array(np.concatenate([old_columns[field], values[field]]))
+                           for field in values}
+        if self.rawDates is not None:
+            self.rawDates = np.concatenate([self.rawDates, dates])
+            self.rawDates.flags.writeable = False
+        self.rawLength += number_of_days
+        # the market aligns the asset again with its new days
+        self.align(None)
+
+    def has_sorted_dates(self):
+        """ True if the asset has dates, strictly increasing (needed to be aligned on a calendar) """
+        return self.rawDates is not None and bool(np.all(self.rawDates[1:] > self.rawDates[:-1]))
+
+    def align(self, calendar):
+        """ Reindex all the columns on the calendar (None to come back to the raw data)
+
+        For a day of the calendar where the asset is not quoted, the value of the previous quoted day is used.
+        The calendar must be in the range of self.rawDates. The columns not loaded yet are reindexed when loaded.
+        """
+        if calendar is None or (len(calendar) == len(self.rawDates) and np.array_equal(calendar, self.rawDates)):
+            # nothing to reindex: the raw arrays are used (no copy)
+            self.alignIndex = None
+            self.columns = dict(self.rawColumns)
+            self.dates = self.rawDates
+            self.length = self.rawLength
+        else:
+            self.alignIndex = np.searchsorted(self.rawDates, calendar, side="right") - 1
+            self.columns = {field: read_only_array(column[self.alignIndex])
+                            for field, column in self.rawColumns.items()}
+            self.dates = calendar
+            self.length = len(calendar)
+        self._data = self.columns.get(self.defaultField)
+        if self.memory is not None:
+            self.memory.update(self)
+
+
+def read_only_array(data):
+    """ Return a read-only contiguous float64 view of data (the buffer is shared if possible) """
+    # a read-only view: the strategies can not modify the history through the views of market.get_asset_data()
+    array = np.ascontiguousarray(data, dtype=np.float64).view()
+    array.flags.writeable = False
+    return array
+
+
+class AssetMemory:
+    """ Keep the memory used by the columns of the assets of a market under a budget
+
+    Only the assets that can be loaded again (with a loader) are managed. When the budget is exceeded, the least
+    recently used assets are unloaded (Asset.unload) until the memory used is under the budget again: the memory
+    scales with the assets actually used, not with the assets registered.
+
+    Constructor : AssetMemory(the budget in bytes (optional, None for no limit))
+
+    budget: (int) the number of bytes that can be used by the columns, None for no limit
+    loadedAssets: (OrderedDict) asset -> bytes used, the least recently used first
+    size: (int) the bytes used by all the loaded assets
+    loads, evictions: (int) number of times an asset was loaded and unloaded
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.loadedAssets = OrderedDict()
+        self.size = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __deepcopy__(self, memo):
+        # shared by the copies of a market, like the assets it manages
+        return self
+
+    def __repr__(self):
+        return "<AssetMemory: {0} assets, {1} bytes, budget: {2}>".format(len(self.loadedAssets), self.size,
+                                                                         self.budget)
+
+    def touch(self, asset):
+        """ Mark the asset as the most recently used """
+        if asset in self.loadedAssets:
+            self.loadedAssets.move_to_end(asset)
+
+    def update(self, asset):
+        """ Called when the columns of the asset change, unload other assets if the budget is exceeded """
+        old_size = self.loadedAssets.pop(asset, None)
+        if old_size is not None:
+            self.size -= old_size
+        if asset.loader is None:
+            # can not be unloaded (see Asset.append)
+            return
+        new_size = asset.memory_size()
+        if new_size > 0:
+            if old_size is None:
+                self.loads += 1
+            self.loadedAssets[asset] = new_size
+            self.size += new_size
+        self.shrink()
+
+    def shrink(self):
+        """ Unload the least recently used assets while the budget is exceeded (the last used one is kept) """
+        if self.budget is None:
+            return
+        while self.size > self.budget and len(self.loadedAssets) > 1:
+            old_asset, old_size = self.loadedAssets.popitem(last=False)
+            self.size -= old_size
+            old_asset.unload()
+            self.evictions += 1
+
+    def set_budget(self, budget):
+        """ Change the budget (bytes, None for no limit), unload assets if needed """
+        self.budget = budget
+        self.shrink()
+
 
 class Portfolio:
     """ Represent a Portfolio in the market usually own by a Strategy.
@@ -179,26 +562,47 @@ class Portfolio:
                             the initial cash owned,
                             the market where it is operating)
 
-    valueHistory: (list of int) updated at the end of each day within the function market.update_portfolio,
+    valueHistory: (list of int) updated at the end of each day within the function market.update_portfolios,
         that store the value of the portfolio day after day, converting the value of every asset owned in cash
+    lastDay: (int) the last day stored in valueHistory (None before the first one), the valueHistory of the open
+        positions ends this day
     presentAssetDict: (dict) that store the asset actually owned, update directly when a position is register
-    presentPositionList: (list of Position) position (still open) hold by the portfolio
-    pastPositionList: (list of Position) position closed (opened or closed), *ORDERED BY THE CLOSING DAY*
+    costBasis: (dict) asset -> the price paid for the open positions on the asset (sum of opening price * volume)
+
+    The open positions are kept in a book indexed by position and by asset: opening and closing a position is O(1)
+    openPositions: (dict) position.id -> Position, the positions still open, in the order of their opening
+    assetPositions: (dict) asset -> dict position.id -> Position, the positions still open on each asset
+    openPositionList: (list of Position) position (still open) hold by the portfolio (property: a new list at each
+        access, so a position can be closed while iterating on it), see also open_positions()
+    closePositionList: (LedgerList of Position) position closed (opened or closed), *ORDERED BY THE CLOSING DAY*,
+        only their rows are stored
 
     cash: (float) used to buy (and sell) assets
     initialCash: (float) the cash available when created
     market: (Market) the market where it is operating
+    vectorized: (boolean) True if it is owned by a vectorized strategy: it is not updated day by day by the market
+        (see Market.run_vectorized)
+    index: (int) the row of the portfolio in market.holdings (the volume owned of each asset)
+    owner: (Strategy) the strategy owning the portfolio (set by the strategy), None if it has no owner
     """
 
+    __deepcopy__ = fork_copy
+
     def __init__(self, name, cash, market):
         self.name = name
+        self.index = None
+        self.owner = None
         self.valueHistory = []
+        self.lastDay = None
         self.presentAssetDict = {}
-        self.openPositionList = []
-        self.closePositionList = []
+        self.costBasis = {}
+        self.openPositions = {}
+        self.assetPositions = {}
+        self.closePositionList = LedgerList(market.ledger, Position.view)
 
         self.cash = cash
         self.initialCash = cash
+        self.vectorized = False
 
         self.market = market
         # the portfolio is registered in the market
@@ -209,14 +613,61 @@ class Portfolio:
     def __repr__(self):
         return "<{0}, cash : {1}$>".format(self.name, self.initialCash)
 
+    @property
+    def openPositionList(self):
+        return list(self.openPositions.values())
+
     def register_position(self, position):
+        """ Add a new position to the book of the open positions """
         # print("Position registered: {}".format(position))
-        self.openPositionList.append(position)
+        open_trade = position.openTrade
+        asset = open_trade.asset
+        self.openPositions[position.id] = position
+        if asset in self.assetPositions:
+            self.assetPositions[asset][position.id] = position
+        else:
+            self.assetPositions[asset] = {position.id: position}
+        self.costBasis[asset] = self.costBasis.get(asset, 0.) + open_trade.price * open_trade.volume
+
+    def close_position(self, position):
+        """ Move a position closed by the market from the book of the open positions to self.closePositionList """
+        open_trade = position.openTrade
+        asset = open_trade.asset
+        del self.openPositions[position.id]
+        asset_positions = self.assetPositions[asset]
+        del asset_positions[position.id]
+        if len(asset_positions) > 0:
+            self.costBasis[asset] -= open_trade.price * open_trade.volume
+        else:
+            # no rounding error is kept when the last position on the asset is closed
+            del self.assetPositions[asset]
+            del self.costBasis[asset]
+        self.closePositionList.append(position)
+
+    def open_positions(self, asset=None):
+        """ Return the list of the positions still open (on the asset if given), the oldest first """
+        if asset is None:
+            return list(self.openPositions.values())
+        return list(self.assetPositions.get(asset, {}).values())
+
+    def first_open_position(self, asset=None):
+        """ Return the oldest position still open (on the asset if given), None if there is none """
+        positions = self.openPositions if asset is None else self.assetPositions.get(asset, {})
+        return next(iter(positions.values()), None)
+
+    def average_cost(self, asset):
+        """ Return the average price paid for the volume of the asset held by the open positions (None if no volume) """
+        volume = self.presentAssetDict.get(asset, 0)
+        if volume == 0 or asset not in self.costBasis:
+            return None
+        return self.costBasis[asset] / volume
 
     def results_description(self, string_mode=False):
-        total_number_of_positions = len(self.openPositionList) + len(self.closePositionList)
-        number_of_open_positions = len(self.openPositionList)
-        number_of_good_positions = len([pos for pos in self.closePositionList if pos.gain >= 0])
+        total_number_of_positions = len(self.openPositions) + len(self.closePositionList)
+        number_of_open_positions = len(self.openPositions)
+        # the ledger of the positions, not the one of the market: it is replaced when the market is reset
+        gains = self.closePositionList.ledger.position_gains(self.closePositionList.rows())[0]
+        number_of_good_positions = int(np.count_nonzero(gains >= 0))
         ratio = number_of_good_positions / max(total_number_of_positions, 1)
         the_list = [total_number_of_positions, number_of_open_positions,
                     number_of_good_positions, ratio]
@@ -236,13 +687,16 @@ class Expert:
     Constructor : Expert(the market where it operates,
                          the name (optional))
 
-    predictionMadeList: (list of Prediction) register the predictions *after they have been verified*
+    predictionMadeList: (LedgerList of Prediction) register the predictions *after they have been verified*, only
+        their rows are stored
     """
 
+    __deepcopy__ = fork_copy
+
     def __init__(self, market, name="Unknown Expert"):
         self.name = name
         self.market = market
-        self.predictionMadeList = []
+        self.predictionMadeList = LedgerList(market.ledger, Prediction.view)
         # the expert is registered in the market
         self.market.register_expert(self)
         # print(self.__repr__())
@@ -295,15 +749,25 @@ class Strategy:
 
     Constructor : Strategy(the market where it operates,
                            the name (optional),
-                           the initialCash (optional, value = 10 000) )
+                           the initialCash (optional, value = 10 000),
+                           True for the vectorized mode (optional, value = False, see signals()))
 
     portfolio: (Portfolio) portfolio owned by the strategy
+    vectorized: (boolean) if True, new_day() is never called: the trades of the whole simulation are given at once by
+        signals() and done by Market.run_vectorized()
     """
 
-    def __init__(self, market, name="Unknown Strategy", cash=10 ** 4):
+    __deepcopy__ = fork_copy
+
+    def __init__(self, market, name="Unknown Strategy", cash=10 ** 4, vectorized=False):
         self.name = name
         self.market = market
+        if vectorized and type(self).signals is Strategy.signals:
+            raise ValueError("{0} has no vectorized mode (no signals())".format(type(self).__name__))
+        self.vectorized = vectorized
         self.portfolio = Portfolio("Portfolio of " + name, cash, self.market)
+        self.portfolio.owner = self
+        self.portfolio.vectorized = vectorized
         # the strategy is registered in the market
         self.market.register_strategy(self)
         # print(self.__repr__())
@@ -324,44 +788,86 @@ class Strategy:
             if should_i_buy:
                 self.market.open(self.portfolio, asset, random.randint(1, 10), "LONG")
             else:
-                length = len(self.portfolio.openPositionList)
+                length = len(self.portfolio.openPositions)
                 if length > 0:
                     self.market.close(self.portfolio.openPositionList[random.randint(0, length - 1)])
             i += 1
 
+    def signals(self, first_day):
+        """ Called once by the market in the vectorized mode, replaces new_day() (see Market.run_vectorized)
+
+        Return the list of the trades of the strategy from first_day to market.theDay, computed with arrays:
+        (asset, opens, closes, volumes) where opens and closes are arrays of boolean, volumes an array of float,
+        indexed by day (from 0 to market.theDay included):
+            closes[day]: the oldest position on the asset still open is closed
+            opens[day]: a LONG position of volumes[day] is opened, after the closing
+        The signal of a day must only use the values until this day included (market.get_asset_data()), like
+        new_day(): it is checked by the market. signals() must not change the strategy, it may be called several times.
+
+        Currently no trade (a strategy without signals() can not be vectorized, see __init__)
+        """
+        return []
+
 
 class Market:
     """ Represent a Market that simulates assets and portfolios.
 
     Is used to link Expert, Strategy and their prediction or portfolio.
 
-    Constructor : Market()
+    Constructor : Market(the memory budget of the assets in bytes (optional, None for no limit),
+                         the memory budget of the indicators in bytes (optional, None for no limit))
 
     _theDay: (int) PRIVATE *do not set it* used stored the current day
         used theDay instead to get the current day
     theDay: (int) *do not set it* property used to manage the simulation,
         used in market.play_day()
-    maximumDay: (int) day limit after which at least one asset has no value
+    maximumDay: (int) day limit after which at least one asset has no value (property, the assets are aligned
+        on the calendar first if needed)
 
     assetList: (list of Asset) list of asset simulated
+    calendarMode: (str) how the assets are aligned: "intersection", "union" or "position", see align_assets()
+    calendar: (numpy array of datetime64[D]) the date of each day of the market, None if the assets are aligned by
+        position
+    assetMemory: (AssetMemory) unloads the least recently used assets when the memory budget is exceeded
+    indicatorCache: (IndicatorCache) the indicators computed for the strategies and experts, shared by all of them
+        (see indicator()), the least recently used are removed when its memory budget is exceeded
+
+    ledger: (Ledger) the trades, positions and predictions of the simulations, stored by columns (see ledger.py)
+    holdings: (numpy array) portfolios x assets, the volume of each asset owned by each portfolio (row portfolio.index,
+        column asset.index), same values as the presentAssetDict of the portfolios
+    pricedAssets: (dict) asset.index -> asset, the assets owned at least once by a portfolio: their values of the day
+        are read from their own arrays (see day_prices), the values of the other assets are 0
+    deferredValuation: (boolean) if True, the valueHistory of the portfolios is not updated day by day but rebuilt
+        from their trades at the end of the simulation (see rebuild_value_history)
 
     portfolioList: (list of Portfolio) list of portfolio simulated
     strategyList: (list of Strategy) list of strategy simulated
 
-    predictionList: (list of Prediction) list of predictions not yet expired made by the experts
+    pendingPredictions: (dict) final_term -> list of the predictions (not yet expired) made by the experts that will be
+        checked this day, in the order of their registration
+    predictionList: (list of Prediction) list of predictions not yet expired made by the experts (property, read-only)
     expertList: (list of Expert) list of expert simulated
     """
 
-    def __init__(self):
+    def __init__(self, memory_budget=None, indicator_budget=None):
         self._theDay = 0
-        self.maximumDay = 0
+        self._maximumDay = 0
 
         self.assetList = []
+        self.assetMemory = AssetMemory(memory_budget)
+        self.indicatorCache = IndicatorCache(indicator_budget)
+        self.ledger = Ledger(self.assetList)
+        self.holdings = np.zeros((0, 0))
+        self.pricedAssets = {}
+        self.deferredValuation = False
+        self.calendarMode = "intersection"
+        self.calendar = None
+        self._calendarOutdated = False
 
         self.portfolioList = []
         self.strategyList = []
 
-        self.predictionList = []
+        self.pendingPredictions = {}
         self.expertList = []
 
         print(self.__repr__())
@@ -370,7 +876,7 @@ class Market:
     def theDay(self):
         """ Property used to manage the simulation
 
-        When set, calls new_day() of Strategy, update_portfolio() and self.play_prediction()
+        When set, calls new_day() of Strategy, update_portfolios() and self.play_prediction()
         """
         return self._theDay
 
@@ -378,11 +884,10 @@ class Market:
     def theDay(self, value):
         # print("Simulation theDay", self._theDay)
         for strategy in self.strategyList:
-            strategy.new_day()
+            if not strategy.vectorized:
+                strategy.new_day()
 
-        for portfolio in self.portfolioList:
-            self.update_portfolio(portfolio)
-            # print(portfolio.presentAssetDict)
+        self.update_portfolios()
 
         self.play_prediction()
         self._theDay = value
@@ -391,9 +896,36 @@ class Market:
     def theDay(self):
         del self._theDay
 
+    @property
+    def predictionList(self):
+        """ The list of the predictions not yet expired, in the order of their registration """
+        return sorted((prediction for bucket in self.pendingPredictions.values() for prediction in bucket),
+                      key=lambda prediction: prediction.id)
+
+    @property
+    def maximumDay(self):
+        """ Day limit after which at least one asset has no value, the assets are aligned first if needed """
+        if self._calendarOutdated:
+            self.align_assets()
+        return self._maximumDay
+
     def __repr__(self):
         return "<Market, theDay : {0}>".format(self.theDay)
 
+    def fork(self):
+        """ Return a copy of the market at theDay, that can be simulated independently (see Backtest.snapshot)
+
+        The portfolios, strategies, experts and pending predictions are copied (copy.deepcopy), the tables of the
+        ledger are copied on write (see LedgerTable), the assets, their values, the assetMemory and the
+        indicatorCache are shared.
+        The global random state (random module) is not part of the copy.
+        """
+        memo = {}
+        if self.calendar is not None:
+            # read-only: shared too
+            memo[id(self.calendar)] = self.calendar
+        return copy.deepcopy(self, memo)
+
     def play_day(self, last_day):
         """ Manage the simulation of a day
 
@@ -408,48 +940,247 @@ class Market:
             return False
 
     def play_prediction(self):
-        """ Call new_day() of expert and check their pasted predictions and remove them from self.predictionList """
+        """ Call new_day() of expert and check their predictions expiring today, and remove them from the pending ones
+
+        Only the bucket of today in self.pendingPredictions is read: the cost of a day does not depend on the number of
+        predictions still pending
+        """
         # print("play prediction")
         for expert in self.expertList:
             expert.new_day()
 
-        # iterating on a copy is *necessary*, elements may be skipped otherwise
-        for prediction in self.predictionList[:]:
-            if prediction.final_term == self.theDay:
-                asset_before = prediction.asset.data[prediction.day]
-                asset_today = prediction.asset.data[self.theDay]
-
-                # prediction.result is calculated and set
-                prediction.result = asset_today/asset_before
-
-                # prediction.isTrue is calculated and set
-                if prediction.evolution == "UP":
-                    if asset_before < asset_today:
-                        prediction.isTrue = True
-                elif prediction.evolution == "DOWN":
-                    if asset_before > asset_today:
-                        prediction.isTrue = True
-                elif type(prediction.evolution) is (int or float):
-                    print("!!! NOT YET IMPLEMENTED !!!")
-                else:
-                    print("!!! WRONG FORMAT FOR PREDICTION !!!")
+        for prediction in self.pendingPredictions.pop(self.theDay, ()):
+            asset_before = prediction.asset.data[prediction.day]
+            asset_today = prediction.asset.data[self.theDay]
+
+            # prediction.result is calculated and set
+            prediction.result = asset_today/asset_before
 
-                prediction.expert.prediction_result(prediction)
-                self.predictionList.remove(prediction)
+            # prediction.isTrue is calculated and set
+            if prediction.evolution == "UP":
+                if asset_before < asset_today:
+                    prediction.isTrue = True
+            elif prediction.evolution == "DOWN":
+                if asset_before > asset_today:
+                    prediction.isTrue = True
+            elif type(prediction.evolution) is (int or float):
+                print("!!! NOT YET IMPLEMENTED !!!")
+            else:
+                print("!!! WRONG FORMAT FOR PREDICTION !!!")
 
-    def update_portfolio(self, portfolio):
-        """ Update the attributes of portfolios (valueHistory) and their Positions (valueHistory) """
-        actual_value = portfolio.cash
-        for asset, volume in portfolio.presentAssetDict.items():
-            actual_value += asset.data[self.theDay] * volume
-        portfolio.valueHistory.append(actual_value)
+            prediction.expert.prediction_result(prediction)
 
-        # update position history value of the positions held by the portfolio
-        for position in portfolio.openPositionList:
-            position.valueHistory.append(position.openTrade.asset.data[self.theDay] * position.openTrade.volume)
-        for position in portfolio.closePositionList:
-            if position.closeTrade.day == self.theDay:
-                position.valueHistory.append(position.openTrade.asset.data[self.theDay] * position.openTrade.volume)
+    def run_vectorized(self, strategy, first_day, last_day, check_look_ahead=True):
+        """ Simulate a vectorized strategy (see Strategy.signals) from first_day to last_day included
+
+        The trades are done by open() and close() only on the days where the strategy gives a signal (the loop is on
+        the trades, not on the days), then the valueHistory of the portfolio is computed for all the days with
+        arrays: the results are the same as the ones of the day by day simulation.
+        check_look_ahead: (boolean) the signals are checked against look-ahead (see check_signals)
+        """
+        portfolio = strategy.portfolio
+        self._theDay = last_day
+        signal_list = strategy.signals(first_day)
+        if check_look_ahead:
+            self.check_signals(strategy, signal_list, first_day, last_day)
+
+        event_days = set()
+        for asset, opens, closes, volumes in signal_list:
+            event_days.update((np.flatnonzero(opens[first_day:last_day + 1] | closes[first_day:last_day + 1]) +
+                               first_day).tolist())
+        event_days = sorted(event_days)
+
+        # the trades, and the state of the portfolio after the trades of each day with a trade
+        cash_states = [portfolio.cash]
+        asset_states = [dict(portfolio.presentAssetDict)]
+        for day in event_days:
+            self._theDay = day
+            for asset, opens, closes, volumes in signal_list:
+                if closes[day]:
+                    position = portfolio.first_open_position(asset)
+                    if position is not None:
+                        self.close(position)
+                if opens[day]:
+                    self.open(portfolio, asset, volumes[day], "LONG")
+            cash_states.append(portfolio.cash)
+            asset_states.append(dict(portfolio.presentAssetDict))
+
+        # the value of the portfolio each day: same operations as update_portfolios(), with arrays
+        days = np.arange(first_day, last_day + 1)
+        state_index = np.searchsorted(event_days, days, side="right")
+        value_history = np.asarray(cash_states, dtype=np.float64)[state_index]
+        for asset in portfolio.presentAssetDict:
+            volume = np.array([state.get(asset, np.nan) for state in asset_states], dtype=np.float64)[state_index]
+            owned = ~np.isnan(volume)
+            value_history[owned] += asset.data[days[owned]] * volume[owned]
+        portfolio.valueHistory.extend(value_history.tolist())
+        portfolio.lastDay = last_day
+        self._theDay = last_day + 1
+
+    def check_signals(self, strategy, signal_list, first_day, last_day, number_of_checks=4):
+        """ Raise a ValueError if the signals of a vectorized strategy use values after their day (look-ahead)
+
+        The signals are computed again with the values after a day hidden: market.theDay is the day, and the assets
+        only give the values until it (asset.data, get_column(), so get_asset_data() and indicator() too, see
+        Asset.visibleDays). The signals until this day must be the same. The days checked are the middle day and
+        number_of_checks days with a signal (a signal using the next values can not be computed again).
+        It is a check on a few days, not a proof: a look-ahead on the other days, or through arrays kept by the
+        strategy before the simulation, is not detected.
+        """
+        signal_days = set()
+        for asset, opens, closes, volumes in signal_list:
+            signal_days.update(np.flatnonzero(opens[first_day:last_day] | closes[first_day:last_day]) + first_day)
+        signal_days = sorted(signal_days)
+        check_days = {(first_day + last_day) // 2}
+        if len(signal_days) > 0:
+            check_days.update(signal_days[int(i)] for i in np.linspace(0, len(signal_days) - 1,
+                                                                         min(number_of_checks, len(signal_days))))
+        for check_day in sorted(check_days):
+            if check_day >= last_day:
+                continue
+            self._theDay = check_day
+            days = slice(first_day, check_day + 1)
+            lengths = [asset.length for asset in self.assetList]
+            try:
+                for asset in self.assetList:
+                    asset.visibleDays = check_day + 1
+                    asset.length = min(asset.length, check_day + 1)
+                check_signal_list = strategy.signals(first_day)
+            finally:
+                for asset, length in zip(self.assetList, lengths):
+                    asset.visibleDays = None
+                    asset.length = length
+            for (asset, opens, closes, volumes), check_signal in zip(signal_list, check_signal_list):
+                check_opens, check_closes, check_volumes = check_signal[1:]
+                if not (np.array_equal(opens[days], check_opens[days]) and
+                        np.array_equal(closes[days], check_closes[days]) and
+                        np.array_equal(volumes[days][opens[days]], check_volumes[days][opens[days]])):
+                    raise ValueError("the signals of {0} on {1} use values after the day {2} "
+                                     "(look-ahead)".format(strategy, asset, check_day))
+        self._theDay = last_day
+
+    def update_portfolios(self):
+        """ Update the valueHistory of all the portfolios (not vectorized) for theDay
+
+        The values of all the portfolios are computed at once: self.holdings x the values of the day
+        (day_prices()), instead of a loop on the assets of each portfolio
+        """
+        if self.deferredValuation:
+            # the valueHistory will be rebuilt at the end (see rebuild_value_history)
+            for portfolio in self.portfolioList:
+                if not portfolio.vectorized:
+                    portfolio.lastDay = self.theDay
+            return
+        if len(self.portfolioList) == 0:
+            return
+
+        prices = self.day_prices()
+        holdings = self.holdings[:len(self.portfolioList)]
+        values = holdings @ prices
+        missing_prices = np.isnan(prices)
+        if missing_prices.any():
+            # nan * 0 is nan: only the portfolios owning an asset without value have no value
+            values = np.where(holdings[:, missing_prices].any(axis=1), np.nan,
+                              holdings[:, ~missing_prices] @ prices[~missing_prices])
+        for portfolio in self.portfolioList:
+            if not portfolio.vectorized:
+                portfolio.valueHistory.append(portfolio.cash + values[portfolio.index])
+                portfolio.lastDay = self.theDay
+
+    def day_prices(self):
+        """ Return the values of the assets for theDay (array, column asset.index), 0 for the assets never owned
+
+        The values are read from the arrays of the assets (no copy of their history): only the assets of
+        self.pricedAssets are read
+        """
+        prices = np.zeros(len(self.assetList))
+        for index, asset in self.pricedAssets.items():
+            prices[index] = asset.data[self.theDay]
+        return prices
+
+    def price_asset(self, asset):
+        """ Add the asset to self.pricedAssets: it is valued each day (see day_prices) """
+        self.pricedAssets[asset.index] = asset
+
+    def resize_holdings(self):
+        """ Make self.holdings big enough for all the portfolios and assets registered (rows added by blocks) """
+        rows, columns = self.holdings.shape
+        if rows < len(self.portfolioList) or columns != len(self.assetList):
+            new_rows = max(rows, len(self.portfolioList))
+            if new_rows > rows:
+                new_rows = max(new_rows, 2 * rows, 8)
+            holdings = np.zeros((new_rows, len(self.assetList)))
+            holdings[:rows, :columns] = self.holdings[:, :len(self.assetList)]
+            self.holdings = holdings
+
+    def clear_holdings(self):
+        """ Called when the portfolios are removed from the market (see Backtest.soft_reset) """
+        self.holdings = np.zeros((0, len(self.assetList)))
+        self.pricedAssets = {}
+
+    def rebuild_value_histories(self, first_day, last_day):
+        """ Call rebuild_value_history() for every portfolio (not vectorized), the positions are grouped by portfolio
+        in one pass on the ledger """
+        positions = self.ledger.positions
+        position_portfolios = self.ledger.trades.column("portfolio")[positions.column("open")]
+        order = np.argsort(position_portfolios, kind="stable")
+        bounds = np.searchsorted(position_portfolios[order], np.arange(len(self.ledger.portfolios) + 1))
+        for portfolio in self.portfolioList:
+            if not portfolio.vectorized:
+                rows = order[bounds[portfolio.index]:bounds[portfolio.index + 1]]
+                self.rebuild_value_history(portfolio, first_day, last_day, rows)
+
+    def rebuild_value_history(self, portfolio, first_day, last_day, rows=None):
+        """ Add the values of the portfolio from first_day to last_day to its valueHistory, computed from its trades
+
+        Used when self.deferredValuation: the cash and the volumes owned each day are cumulative sums of the trades,
+        read from the columns of the ledger, the values are computed for all the days at once (the result may differ
+        from the day by day one by rounding)
+        rows: (numpy array of int) the rows of the positions of the portfolio in the ledger, found if None
+        """
+        number_of_days = last_day - first_day + 1
+        if number_of_days <= 0:
+            return
+        trades, positions = self.ledger.trades, self.ledger.positions
+        open_rows = positions.column("open")
+        if rows is None:
+            rows = np.flatnonzero(trades.column("portfolio")[open_rows] == portfolio.index)
+        open_rows = open_rows[rows]
+        close_rows = positions.column("close")[rows]
+        closed = close_rows >= 0
+        volumes = trades.column("volume")[open_rows]
+        long_codes = positions.column("long")[rows]
+        assets = trades.column("asset")[open_rows]
+
+        # the trades of the positions: day, cash received, volume received (same operations as open() and close())
+        owned_volumes = np.where(long_codes == POSITION_TYPES.index(True), volumes, -volumes)
+        sold_volumes = np.where(long_codes != POSITION_TYPES.index(False), volumes, -volumes)[closed]
+        days = np.concatenate([trades.column("day")[open_rows], trades.column("day")[close_rows[closed]]])
+        cash_flows = np.concatenate([-trades.column("price")[open_rows] * volumes,
+                                     self.ledger.position_gains(rows[closed])[0] +
+                                     trades.column("price")[open_rows[closed]] * volumes[closed]])
+        volume_changes = np.concatenate([owned_volumes, -sold_volumes])
+        trade_assets = np.concatenate([assets, assets[closed]])
+
+        in_range = (days >= first_day) & (days <= last_day)
+        days, cash_flows = days[in_range] - first_day, cash_flows[in_range]
+        volume_changes, trade_assets = volume_changes[in_range], trade_assets[in_range]
+        daily_cash = np.zeros(number_of_days)
+        np.add.at(daily_cash, days, cash_flows)
+        # only the columns of the assets traded or owned by the portfolio (not all the assets of the market)
+        holdings = self.holdings[portfolio.index]
+        asset_indexes = np.union1d(trade_assets, np.flatnonzero(holdings))
+        daily_volumes = np.zeros((number_of_days, len(asset_indexes)))
+        np.add.at(daily_volumes, (days, np.searchsorted(asset_indexes, trade_assets)), volume_changes)
+
+        # the cash and the volumes before first_day are the ones of now minus the trades of the simulation
+        cash = portfolio.cash - daily_cash.sum() + np.cumsum(daily_cash)
+        owned = holdings[asset_indexes] - daily_volumes.sum(axis=0) + np.cumsum(daily_volumes, axis=0)
+        values = cash
+        for column in np.flatnonzero(np.any(owned != 0, axis=0)):
+            values += self.assetList[asset_indexes[column]].data[first_day:last_day + 1] * owned[:, column]
+        portfolio.valueHistory.extend(values.tolist())
+        portfolio.lastDay = last_day
 
     def open(self, portfolio, asset, volume, type_of_position):
         """ Called by Strategy to create a buy Trade, VOLUME MUST BE >0
@@ -483,6 +1214,8 @@ class Market:
                 portfolio.presentAssetDict[asset] += owned_volume
             else:
                 portfolio.presentAssetDict[asset] = owned_volume
+            self.holdings[portfolio.index, asset.index] += owned_volume
+            self.price_asset(asset)
         else:
             print("!!! Not enough money to open {0} of {1} "
                   "for {2}, {3} has only {4:.2f} $ in cash !!!".format(volume, asset.name, asset_price * volume,
@@ -497,66 +1230,131 @@ class Market:
             return False
 
         # Else we execute the order
-        # Useful variables
+        # Useful variables (read once from the ledger)
         open_trade = position.openTrade
-        current_price = position.openTrade.asset.data[self.theDay]
-        opening_price = open_trade.asset.data[open_trade.day]
+        asset, volume, portfolio = open_trade.asset, open_trade.volume, open_trade.portfolio
+        current_price = asset.data[self.theDay]
+        opening_price = open_trade.price
 
         # gain for a LONG (difference between opening price and closing price X volume)
-        gain = (current_price - opening_price) * open_trade.volume
+        gain = (current_price - opening_price) * volume
         # to update the value of the portfolio.presentAssetDict: sold_volume is >0 for LONG, <0 for SHORT
-        sold_volume = open_trade.volume
-
-        # result does not depend of the type of trade
-        result = current_price/opening_price
+        sold_volume = volume
 
         if position.long:
-            # print("Long sold : {0}$ of {1} by {2}".format(position.portfolio.cash, open_trade.asset.name,
-            #                                               position.portfolio.name))
+            # print("Long sold : {0}$ of {1} by {2}".format(portfolio.cash, asset.name, portfolio.name))
             # update the cash of the portfolio for a LONG
-            position.portfolio.cash += gain + opening_price*open_trade.volume
+            portfolio.cash += gain + opening_price*volume
         else:
             sold_volume = -sold_volume
             gain = -gain
             # TODO SHORT closing
             # !! the next line is a problematic one !! what do we gain when closing a short ?
             # update the cash of the portfolio for a SHORT
-            position.portfolio.cash += gain + opening_price*open_trade.volume
-            print("Short sold : {0}$ of {1} by {2}".format(position.portfolio.cash, open_trade.asset.name,
-                                                           position.portfolio.name))
+            portfolio.cash += gain + opening_price*volume
+            print("Short sold : {0}$ of {1} by {2}".format(portfolio.cash, asset.name, portfolio.name))
 
         # update the variables of the position
-        position.closeTrade = Trade(open_trade.asset, open_trade.volume, self.theDay)
-        position.closed = True
-        position.gain = gain
-        position.result = result
-        # update the value of the portfolio: presentAssetDict, openPositionList and closePositionList
-        position.portfolio.presentAssetDict[open_trade.asset] -= sold_volume
-        position.portfolio.closePositionList.append(position)
-        position.portfolio.openPositionList.remove(position)
+        self.ledger.close_position(position.id, self.ledger.add_trade(asset, volume, self.theDay, portfolio))
+        # update the value of the portfolio: presentAssetDict and the book of the positions
+        portfolio.presentAssetDict[asset] -= sold_volume
+        self.holdings[portfolio.index, asset.index] -= sold_volume
+        portfolio.close_position(position)
+
+    def append_bars(self, asset, values, dates=None):
+        """ Add new days at the end of an asset (see Asset.append), the calendar is updated when needed """
+        asset.append(values, dates)
+        self._calendarOutdated = True
 
     def register_asset(self, asset: Asset):
-        """ Register a asset in self.assetList and update the value of self.maximumDay """
+        """ Register a asset in self.assetList, the calendar and self.maximumDay will be updated when needed """
+        asset.index = len(self.assetList)
         self.assetList.append(asset)
+        self.resize_holdings()
+        asset.memory = self.assetMemory
+        self.assetMemory.update(asset)
         print("+ Asset added : {0}, number of days : {1}".format(asset.name, asset.length))
-        if self.maximumDay > asset.length - 1 or self.maximumDay < 1:  # -1; the first day is 0 day, not 1
-            self.maximumDay = asset.length - 1
+        self._calendarOutdated = True
+
+    def align_assets(self, how=None):
+        """ Build the calendar of the market and align the assets on it: the day N is the same date for every asset
+
+        how: (str) replaces self.calendarMode if given
+            "intersection": the calendar is the days where every asset is quoted
+            "union": the days where at least one asset is quoted, between the first and the last days common to all the
+                assets, a missing value is replaced by the previous one
+            "position": no calendar, the assets are aligned by position (day N is the Nth value of each asset)
+        The calendar is computed with sorted merges of the dates (numpy.intersect1d, numpy.union1d). If an asset has
+        no (sorted) dates, the assets are aligned by position.
+        Called automatically when maximumDay is read after the registration of an asset.
+        """
+        if how is not None:
+            self.calendarMode = how
+        self._calendarOutdated = False
+        self.calendar = None
+
+        if self.calendarMode != "position" and len(self.assetList) > 0:
+            if all(asset.has_sorted_dates() for asset in self.assetList):
+                calendar = self.assetList[0].rawDates
+                for asset in self.assetList[1:]:
+                    if self.calendarMode == "intersection":
+                        calendar = np.intersect1d(calendar, asset.rawDates, assume_unique=True)
+                    elif self.calendarMode == "union":
+                        calendar = np.union1d(calendar, asset.rawDates)
+                    else:
+                        raise ValueError("wrong calendar mode {0!r}".format(self.calendarMode))
+                first_date = max(asset.rawDates[0] for asset in self.assetList)
+                last_date = min(asset.rawDates[-1] for asset in self.assetList)
+                self.calendar = calendar[(calendar >= first_date) & (calendar <= last_date)]
+                self.calendar.flags.writeable = False
+            elif any(asset.rawDates is not None for asset in self.assetList):
+                print("!!! ASSETS WITHOUT SORTED DATES, THEY ARE ALIGNED BY POSITION !!!")
+
+        for asset in self.assetList:
+            asset.align(self.calendar)
+        # the days of the assets may have changed
+        self.indicatorCache.clear()
+        if len(self.assetList) > 0:
+            self._maximumDay = min(asset.length for asset in self.assetList) - 1  # -1; the first day is 0 day, not 1
+        else:
+            self._maximumDay = 0
+
+    def get_day(self, date, side="left"):
+        """ Return the day (index in the calendar) of a date, found by binary search
+
+        date: (str "yyyy-mm-dd", datetime.date or numpy.datetime64)
+        side: "left" for the first day >= date, "right" for the last day <= date
+        """
+        if self._calendarOutdated:
+            self.align_assets()
+        if self.calendar is None:
+            raise ValueError("the market has no calendar, days must be given by position")
+        date = np.datetime64(date, "D")
+        if side == "left":
+            return int(np.searchsorted(self.calendar, date, side="left"))
+        return int(np.searchsorted(self.calendar, date, side="right")) - 1
 
     def register_portfolio(self, portfolio: Portfolio):
-        """ Register a portfolio in self.portfolioList """
+        """ Register a portfolio in self.portfolioList, and its row in self.holdings """
+        portfolio.index = self.ledger.add_portfolio(portfolio)
         self.portfolioList.append(portfolio)
+        self.resize_holdings()
 
     def register_strategy(self, strategy: Strategy):
         """ Register a strategy in self.strategyList """
         self.strategyList.append(strategy)
 
     def register_expert(self, expert):
-        """ Register an expert in self.expertList """
+        """ Register an expert in self.expertList, and in the ledger (the predictions refer to it by expert.index) """
+        expert.index = self.ledger.add_expert(expert)
         self.expertList.append(expert)
 
     def register_prediction(self, prediction):
-        """ Register a prediction made by a Expert into self.predictionList """
-        self.predictionList.append(prediction)
+        """ Register a prediction made by a Expert in the bucket of its final_term (see self.pendingPredictions) """
+        if prediction.final_term in self.pendingPredictions:
+            self.pendingPredictions[prediction.final_term].append(prediction)
+        else:
+            self.pendingPredictions[prediction.final_term] = [prediction]
         # print("prediction registered")
 
     def plot_market(self, asset=None):
@@ -570,5 +1368,43 @@ class Market:
             plt.title(asset.name)
         plt.show()
 
-    def get_asset_data(self, asset, start=0):
-        return asset.data[start:self.theDay + 1]
\ No newline at end of file
+    def indicator(self, asset, name, params=(), first_day=0, field=None):
+        """ Return the values of an indicator of the asset (see indicatorCache.INDICATOR_REGISTRY), read-only array with
+        one value per day: market.indicator(asset, "sma", (20,))[market.theDay] is the mean of the 20 last values
+
+        The array is computed once for all the days and shared by all the strategies and experts that ask for it
+        (see self.indicatorCache). The value of a day only depends on the values until this day.
+        """
+        if self._calendarOutdated:
+            self.align_assets()
+        return self.indicatorCache.get(asset, name, params, first_day, field)
+
+    def lead_lag(self, max_lag, time_frame=None, start=None, step=None, field=None, use_returns=False):
+        """ Scan the correlations of every pair of assets for all the shifts from -max_lag to max_lag (see
+        leadLagTools.lead_lag_scan, same convention as commonTools.correlation)
+
+        The values of the field (data if None) of the assets are used, or their daily returns if use_returns (then the
+        day 0 is the return of the day 1). If step is given, the scan is done on rolling windows of time_frame days
+        (see leadLagTools.rolling_lead_lag_scan), time_frame must be given.
+        Return (pairs of assets, lags, matrix pairs x lags), or (pairs of assets, lags, starts, matrix windows x pairs
+        x lags) with a step
+        """
+        if step is not None and time_frame is None:
+            raise ValueError("the rolling lead-lag scan (step={0}) needs the time_frame of its windows".format(step))
+        number_of_days = self.maximumDay + 1  # the assets are aligned here
+        data = np.vstack([asset.get_column(field)[:number_of_days] for asset in self.assetList])
+        if use_returns:
+            data = simple_returns(data)
+        if step is not None:
+            pairs, lags, starts, matrix = rolling_lead_lag_scan(data, max_lag, time_frame, step)
+            return [(self.assetList[i], self.assetList[j]) for i, j in pairs], lags, starts, matrix
+        pairs, lags, matrix = lead_lag_scan(data, max_lag, time_frame, start)
+        return [(self.assetList[i], self.assetList[j]) for i, j in pairs], lags, matrix
+
+    def get_asset_data(self, asset, start=0, field=None):
+        """ Return the values of the asset from start to theDay (included)
+
+        field: (str) the field returned ("open", "high", "volume"...), asset.data if None
+        The result is a read-only view on the column (no copy), so it costs O(1) whatever the length of the history
+        """
+        return asset.get_column(field)[start:self.theDay + 1]
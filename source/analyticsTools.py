@@ -0,0 +1,108 @@
+import numpy as np
+
+# The analytics of the returns computed with arrays. Every function works on the last axis: a 1-D array is the series
+# of one strategy (one value per day), a 2-D array is strategies x days and gives one result per strategy in one call
+# (the value histories of a grid of strategies, see Backtest.simule_batch).
+
+# the names exported by "from source.analyticsTools import *" (commonTools): the other functions are helpers
+__all__ = ["TRADING_DAYS", "simple_returns", "log_returns", "excess_returns", "sharpe_ratio", "sortino_ratio",
+           "rolling_sharpe_ratio", "rolling_sortino_ratio"]
+
+# the number of trading days in a year, used to annualize the ratios
+TRADING_DAYS = 252
+
+
+def simple_returns(values):
+    """ Return the daily returns (v[t] - v[t-1]) / v[t-1] of values (one less value on the last axis) """
+    values = np.asarray(values, dtype=np.float64)
+    return (values[..., 1:] - values[..., :-1]) / values[..., :-1]
+
+
+def log_returns(values):
+    """ Return the daily log returns log(v[t] / v[t-1]) of values (one less value on the last axis) """
+    values = np.asarray(values, dtype=np.float64)
+    return np.log(values[..., 1:] / values[..., :-1])
+
+
+def excess_returns(returns, risk_free=0., periods=TRADING_DAYS):
+    """ Return the returns minus the risk free rate of a period (risk_free is the annual rate) """
+    return np.asarray(returns, dtype=np.float64) - risk_free / periods
+
+
+def sharpe_ratio(returns, risk_free=0., periods=TRADING_DAYS):
+    """ Compute the annualized Sharpe ratio of daily returns: sqrt(periods) * mean / standard deviation (ddof=1) of
+    the excess returns (see excess_returns)
+
+    Return a float for a 1-D array, an array (one ratio per row) for a 2-D array. The ratio is 0 when the standard
+    deviation is 0, nan with less than 2 returns.
+    """
+    adj_returns = excess_returns(returns, risk_free, periods)
+    return ratio(adj_returns.mean(axis=-1), standard_deviation(adj_returns), periods)
+
+
+def sortino_ratio(returns, risk_free=0., periods=TRADING_DAYS):
+    """ Compute the annualized Sortino ratio of daily returns: like sharpe_ratio() but divided by the downside
+    deviation sqrt(mean(min(excess return, 0) ** 2)): only the losses are a risk
+
+    Return a float for a 1-D array, an array for a 2-D array. The ratio is 0 without loss, nan without returns.
+    """
+    adj_returns = excess_returns(returns, risk_free, periods)
+    return ratio(adj_returns.mean(axis=-1), downside_deviation(adj_returns), periods)
+
+
+def rolling_sharpe_ratio(returns, window, risk_free=0., periods=TRADING_DAYS):
+    """ Compute the Sharpe ratio (see sharpe_ratio) of the window last returns for each day
+
+    Return an array of the shape of returns: the ratio of the returns from day - window + 1 to day, nan for the
+    window - 1 first days
+    """
+    adj_returns = excess_returns(returns, risk_free, periods)
+    windows = rolling_windows(adj_returns, window)
+    return pad_rolling(ratio(windows.mean(axis=-1), standard_deviation(windows), periods), adj_returns.shape[-1])
+
+
+def rolling_sortino_ratio(returns, window, risk_free=0., periods=TRADING_DAYS):
+    """ Compute the Sortino ratio (see sortino_ratio) of the window last returns for each day, like
+    rolling_sharpe_ratio() """
+    adj_returns = excess_returns(returns, risk_free, periods)
+    windows = rolling_windows(adj_returns, window)
+    return pad_rolling(ratio(windows.mean(axis=-1), downside_deviation(windows), periods), adj_returns.shape[-1])
+
+
+def standard_deviation(returns):
+    """ Standard deviation (ddof=1) on the last axis, nan with less than 2 values """
+    if returns.shape[-1] < 2:
+        return np.full(returns.shape[:-1], np.nan)[()]
+    # exactly 0 when all the values are equal (the rounding of the mean would give a tiny deviation)
+    return np.where(returns.max(axis=-1) == returns.min(axis=-1), 0., returns.std(axis=-1, ddof=1))
+
+
+def downside_deviation(returns):
+    """ sqrt(mean(min(returns, 0) ** 2)) on the last axis, nan without value """
+    if returns.shape[-1] == 0:
+        return np.full(returns.shape[:-1], np.nan)[()]
+    return np.sqrt(np.mean(np.minimum(returns, 0.) ** 2, axis=-1))
+
+
+def ratio(means, deviations, periods):
+    """ sqrt(periods) * means / deviations, 0 where deviations is 0 """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(deviations == 0, 0., np.sqrt(periods) * means / deviations)
+    return ratios[()] if np.ndim(ratios) == 0 else ratios
+
+
+def rolling_windows(values, window):
+    """ Return the read-only views of the windows of values on the last axis (no copy) """
+    if window < 1:
+        raise ValueError("the window must be at least 1, not {0}".format(window))
+    if values.shape[-1] < window:
+        return np.empty(values.shape[:-1] + (0, window))
+    return np.lib.stride_tricks.sliding_window_view(values, window, axis=-1)
+
+
+def pad_rolling(results, length):
+    """ Add nan at the beginning of the last axis up to length (the days without a full window): the result of a day
+    is at the index of the day """
+    results = np.asarray(results, dtype=np.float64)
+    padding = np.full(results.shape[:-1] + (length - results.shape[-1],), np.nan)
+    return np.concatenate([padding, results], axis=-1)
@@ -0,0 +1,169 @@
+from source.Backtest import *
+import argparse
+import io
+import json
+import pickle
+
+# A checkpoint is the state of a market after a simulation, to continue it later with new days (daily runs):
+#   CHECKPOINT_MAGIC (8 bytes), the length of the header (uint64), the header (json, see checkpoint_info()), then the
+#   pickle of the market. The assets are not in the file (only their names): the market is restored with the assets
+#   of the new run, loaded again from their files, with the new days.
+CHECKPOINT_MAGIC = b"BTCHKPT1"
+CHECKPOINT_VERSION = 1
+
+
+def new_object(the_class):
+    return the_class.__new__(the_class)
+
+
+def set_packed_state(obj, state):
+    """ Restore the attributes of an object pickled by CheckpointPickler.reducer_override """
+    state = dict(state)
+    for name, (values, numpy_floats) in state.pop(PACKED_LISTS).items():
+        state[name] = list(values) if numpy_floats else values.tolist()
+    obj.__dict__.update(state)
+
+
+# the key of the lists of floats saved as arrays in the state of an object (see CheckpointPickler)
+PACKED_LISTS = "__packedLists__"
+
+
+class CheckpointPickler(pickle.Pickler):
+    """ Pickle a market without its assets, its AssetMemory and its IndicatorCache: they are saved by name
+    (persistent ids)
+
+    The lists of floats of the portfolios, strategies and experts (valueHistory, pastShortSum, pastLongSum...) are
+    saved as arrays: 8 bytes per value. Their read-only arrays (indicators of the market) are not saved: None
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (Portfolio, Strategy, Expert)):
+            state = {PACKED_LISTS: {}}
+            for name, value in obj.__dict__.items():
+                kinds = set(map(type, value)) if type(value) is list and len(value) > 0 else None
+                if kinds == {float} or kinds == {np.float64}:
+                    state[PACKED_LISTS][name] = (np.array(value, dtype=np.float64), kinds == {np.float64})
+                elif isinstance(value, np.ndarray) and not value.flags.writeable:
+                    # an indicator of the market (see Market.indicator): asked again to the market after the loading
+                    state[name] = None
+                else:
+                    state[name] = value
+            # the state is pickled after the object: the references to the object in its state are kept
+            return new_object, (obj.__class__,), state, None, None, set_packed_state
+        return NotImplemented
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Asset):
+            return "asset", obj.name
+        if isinstance(obj, AssetMemory):
+            return "memory", None
+        if isinstance(obj, IndicatorCache):
+            return "indicators", None
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    """ Restore a market with the assets of an other market (by name), its AssetMemory and its IndicatorCache """
+
+    def __init__(self, file, market):
+        super().__init__(file)
+        self.market = market
+        self.assets = {asset.name: asset for asset in market.assetList}
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind == "memory":
+            return self.market.assetMemory
+        if kind == "indicators":
+            return self.market.indicatorCache
+        if name not in self.assets:
+            raise ValueError("the asset {0!r} of the checkpoint is not in the market".format(name))
+        return self.assets[name]
+
+
+def save_checkpoint(market, file_name):
+    """ Write the state of a market in a checkpoint: cash, positions, strategies and experts (with their own
+    attributes, like pastShortSum/pastLongSum), pending predictions and the ledger (see load_checkpoint())
+
+    The strategies and experts must be picklable (no lambda, no open file...). The file is written in a temporary
+    file and then renamed: a checkpoint is never half written.
+    """
+    if len(set(asset.name for asset in market.assetList)) != len(market.assetList):
+        raise ValueError("the assets of a checkpoint are saved by name: their names must be different")
+    payload = io.BytesIO()
+    CheckpointPickler(payload, protocol=pickle.HIGHEST_PROTOCOL).dump(market)
+    header = {"version": CHECKPOINT_VERSION, "theDay": market.theDay,
+              "assets": [[asset.name, asset.length] for asset in market.assetList],
+              "calendar": [str(market.calendar[0]), str(market.calendar[-1])]
+              if market.calendar is not None and len(market.calendar) > 0 else None,
+              "portfolios": len(market.portfolioList), "strategies": len(market.strategyList),
+              "experts": len(market.expertList), "pendingPredictions": len(market.predictionList),
+              "trades": len(market.ledger.trades), "payload": payload.tell()}
+    header = json.dumps(header).encode()
+
+    temp_name = "{0}.{1}.tmp".format(file_name, os.getpid())
+    with open(temp_name, "wb") as file:
+        file.write(CHECKPOINT_MAGIC)
+        file.write(np.uint64(len(header)).tobytes())
+        file.write(header)
+        file.write(payload.getbuffer())
+    os.replace(temp_name, file_name)
+
+
+def read_checkpoint_header(file):
+    if file.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+        raise ValueError("{0} is not a checkpoint".format(file.name))
+    header = json.loads(file.read(int(np.frombuffer(file.read(8), dtype=np.uint64)[0])).decode())
+    if header["version"] != CHECKPOINT_VERSION:
+        raise ValueError("the version {0} of the checkpoint {1} is not supported (version {2})".format(
+            header["version"], file.name, CHECKPOINT_VERSION))
+    return header
+
+
+def checkpoint_info(file_name):
+    """ Return the header of a checkpoint (dict): the day to simulate next (theDay), the assets with their number
+    of days, the first and last dates of the calendar, the number of portfolios, strategies, experts... """
+    with open(file_name, "rb") as file:
+        return read_checkpoint_header(file)
+
+
+def load_checkpoint(file_name, backtest):
+    """ Replace the market of the backtest by the market saved in a checkpoint, and return it
+
+    The assets of the checkpoint are the ones already registered in backtest.market (found by name), with their
+    new days; the other assets of backtest.market are added after them. The new days must be after the days of the
+    checkpoint (same calendar, extended): the days of the checkpoint keep their number. Then only the new days are
+    simulated with backtest.simule(resume=True), the results are the same as a simulation of the whole history.
+    New days can also be added after the loading with market.append_bars().
+    """
+    new_market = backtest.market
+    with open(file_name, "rb") as file:
+        header = read_checkpoint_header(file)
+        market = CheckpointUnpickler(file, new_market).load()
+
+    old_calendar = market.calendar
+    for index, asset in enumerate(market.assetList):
+        asset.index = index
+    for asset in new_market.assetList:
+        if asset not in market.assetList:
+            market.register_asset(asset)
+    market.resize_holdings()
+    market.align_assets()
+
+    if market.maximumDay + 1 < header["theDay"]:
+        raise ValueError("the market has {0} days, less than the {1} days simulated in the checkpoint {2}".format(
+            market.maximumDay + 1, header["theDay"], file_name))
+    if old_calendar is not None and (market.calendar is None or len(market.calendar) < len(old_calendar) or
+                                     not np.array_equal(market.calendar[:len(old_calendar)], old_calendar)):
+        raise ValueError("the days of the checkpoint {0} are not the first days of the market: only new days can "
+                         "be added after them".format(file_name))
+    backtest.market = market
+    return market
+
+
+if __name__ == "__main__":
+    # python -m source.checkpoint state.btc
+    parser = argparse.ArgumentParser(description="Print the header of a checkpoint")
+    parser.add_argument("file_name")
+    arguments = parser.parse_args()
+    print(json.dumps(checkpoint_info(arguments.file_name), indent=1))
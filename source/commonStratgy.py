@@ -1,5 +1,3 @@
-import statistics
-import math
 from source.Backtest import *
 
 
@@ -28,10 +26,8 @@ class SharpeRatio:
         self.sharpe = 0
 
     def getSharpe(self, returns, risk_free):
-        adj_returns = []
-        for i in range(len(returns)):
-            adj_returns += [returns[i] - (risk_free / 252)]
-        self.sharpe = math.sqrt(252) * statistics.mean(adj_returns) / statistics.stdev(adj_returns)
+        # see analyticsTools.sharpe_ratio
+        self.sharpe = sharpe_ratio(returns, risk_free)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,12 @@
 import statistics
 import math
 import numpy as np
+from source.analyticsTools import *
 
 def get_returns(data):
-    """ Compute daily returns of an asset"""
+    """ Compute daily returns of an asset (see analyticsTools.simple_returns)"""
 
-    returns = []
-    for i in range(1, len(data)):
-        returns += [(data[i] - data[i - 1]) / data[i - 1]]
-    return returns
+    return simple_returns(data).tolist()
 
 
 ###############################
@@ -17,23 +15,15 @@ def get_returns(data):
 
 
 def compute_returns(data):
-    """ Compute daily returns of an asset"""
+    """ Compute daily returns of an asset (see analyticsTools.simple_returns)"""
 
-    returns = []
-    for i in range(1, len(data)):
-        returns += [(data[i] - data[i - 1]) / data[i - 1]]
-    return returns
+    return simple_returns(data).tolist()
 
 def compute_sharpe(returns, risk_free):
-    """ Compute annualized Sharpe Ratio based on daily returns (252 trading days / year)"""
+    """ Compute annualized Sharpe Ratio based on daily returns (252 trading days / year), 0 if the returns do not
+    change (see analyticsTools.sharpe_ratio, returns can be strategies x days: one ratio per strategy)"""
 
-    adj_returns = []
-    for i in range(len(returns)):
-        adj_returns += [returns[i] - (risk_free / 252)]
-    if statistics.stdev(adj_returns) == 0:
-        return 0
-    sharpe = math.sqrt(252) * statistics.mean(adj_returns) / statistics.stdev(adj_returns)
-    return sharpe
+    return sharpe_ratio(returns, risk_free)
 
 def correlation(data1, data2, start, time_frame, time_shift):
     """ Compute  correlation coefficient between 2 sets of data
@@ -54,22 +44,78 @@ def moving_average(data, time_frame):
     data_adj  = data[(len(data)-time_frame):len(data)]
     return statistics.mean(data_adj)
 
-def SMA(data,l,p1,p2):
-        Data = data
+# the relative error accepted on the moving averages computed from a cumulative sum (see SMA)
+SMA_TOLERANCE = 1e-10
 
-        MA=[]
 
-        MA[p1]=[]
+def SMA(data, l=None, p1=10, p2=250):
+    """ Compute the simple moving averages of data for all the windows from p1 to p2 (included)
+    data (list or array): set of data
+    l (int): number of values used (the first ones), all of them if None
+    p1, p2 (int): the smallest and the biggest windows, by default the windows of the grids of medians of
+        strategy_JM (do_a_full_strategy_simulation, 10 to 250)
 
-        for j in range(1,p1+1):
-            a+=Data[j]
-
-        MA[p1][p1]=a/p1
-
-        for i in range(1,l-p1-1):
-            a=MA[p1][p1+i]*p1+Data[p1+i+1]-Data[i-1]
-            MA[p1][p1+i]=a/p1
-
-        for p in range(p1,p2):
-            for i in range(1,l-p-1):
-                MA[p+1][p+i]=(MA[p][p+i]*p+Data[p+i+1])/(p+1)
\ No newline at end of file
+    Return a matrix windows x days: M[p - p1, day] is the mean of data[day - p + 1:day + 1], nan for day < p - 1.
+    The means of a couple of medians [long, short] are M[long - p1] and M[short - p1].
+    All the windows are computed from one cumulative sum of the centered values. The error of a cumulative sum grows
+    with the length of the data: the means are checked against the ones computed directly at the days where the error
+    can be the biggest, and computed directly (slower) if the relative difference is more than SMA_TOLERANCE
+    """
+    values = np.asarray(data, dtype=np.float64)[:l]
+    windows = np.arange(p1, p2 + 1)
+    days = np.arange(len(values))
+    matrix = np.full((len(windows), len(values)), np.nan)
+    if len(values) < p1:
+        return matrix
+
+    # centered: the cumulative sum stays small when the values are far from 0 (prices)
+    offset = values.mean()
+    cumulative_sum = np.concatenate([[0.], np.cumsum(values - offset)])
+    starts = days[None, :] + 1 - windows[:, None]  # first day of each window
+    valid = starts >= 0
+    ends = np.broadcast_to(days + 1, matrix.shape)
+    matrix[valid] = ((cumulative_sum[ends[valid]] - cumulative_sum[starts[valid]]) /
+                     np.broadcast_to(windows[:, None], matrix.shape)[valid] + offset)
+
+    # accuracy guard: the last day and the day where the cumulative sum is the biggest
+    scale = max(np.abs(values).max(), np.finfo(np.float64).tiny)
+    for day in {len(values) - 1, min(int(np.abs(cumulative_sum).argmax()), len(values) - 1)}:
+        for row, window in enumerate(windows[windows <= day + 1].tolist()):
+            exact = math.fsum(values[day - window + 1:day + 1].tolist()) / window
+            if abs(matrix[row, day] - exact) > SMA_TOLERANCE * scale:
+                print("-!- SMA: CUMULATIVE SUM NOT ACCURATE ENOUGH, THE MEANS ARE COMPUTED WINDOW BY WINDOW -!-")
+                for other_row, other_window in enumerate(windows.tolist()):
+                    if other_window <= len(values):
+                        matrix[other_row, other_window - 1:] = np.lib.stride_tricks.sliding_window_view(
+                            values, other_window).mean(axis=1)
+                return matrix
+    return matrix
+
+
+def EMA(data, l=None, p1=10, p2=250):
+    """ Compute the exponential moving averages of data for all the windows from p1 to p2 (included)
+    data (list or array): set of data
+    l (int): number of values used (the first ones), all of them if None
+    p1, p2 (int): the smallest and the biggest windows (see SMA)
+
+    Return a matrix windows x days: M[p - p1, day] is the EMA of window p (alpha = 2 / (p + 1)), it starts the day
+    p - 1 with the simple moving average of the p first values (nan before). All the windows are updated together day
+    after day.
+    """
+    values = np.asarray(data, dtype=np.float64)[:l]
+    windows = np.arange(p1, p2 + 1)
+    matrix = np.full((len(windows), len(values)), np.nan)
+    if len(values) < p1:
+        return matrix
+
+    first_means = SMA(values, None, p1, p2)
+    alphas = 2 / (windows + 1)
+    ema = np.full(len(windows), np.nan)
+    for day in range(p1 - 1, len(values)):
+        started = windows - 1 < day
+        ema[started] += alphas[started] * (values[day] - ema[started])
+        if day - p1 + 1 < len(windows):
+            # the window day + 1 starts today
+            ema[day - p1 + 1] = first_means[day - p1 + 1, day]
+        matrix[:, day] = ema
+    return matrix
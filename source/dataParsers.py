@@ -0,0 +1,266 @@
+import numpy as np
+from itertools import islice
+from time import perf_counter
+
+# name of the pseudo field of the dates, given to CsvParser.parse() to read the dates of a file
+DATE_FIELD = "date"
+
+# the parsers known, by name (the sort_type given to Backtest.add_asset_from_csv), in the order they are sniffed
+PARSER_REGISTRY = {}
+
+
+def register_parser(parser_class):
+    """ Class decorator: register an instance of a CsvParser subclass in PARSER_REGISTRY
+
+    A new format of file only needs a new registered parser, it can then be used by name or found by sniff_parser()
+    """
+    PARSER_REGISTRY[parser_class.name] = parser_class()
+    return parser_class
+
+
+def get_parser(sort_type):
+    """ Return the parser registered with the name sort_type, raise a ValueError if it is unknown """
+    if sort_type not in PARSER_REGISTRY:
+        raise ValueError("wrong sort_type {0!r}, known ones: {1}".format(sort_type, list(PARSER_REGISTRY)))
+    return PARSER_REGISTRY[sort_type]
+
+
+def sniff_parser(path_name):
+    """ Return (the name of the parser, the delimiter) of a file, found with its first lines
+
+    The parsers are tried in the order of PARSER_REGISTRY, the first one that recognizes the file is chosen
+    """
+    with open(path_name) as file:
+        lines = [line.strip() for line in islice(file, 2)]
+    for name, parser in PARSER_REGISTRY.items():
+        delimiter = parser.sniff(lines)
+        if delimiter is not None:
+            return name, delimiter
+    raise ValueError("the format of {0} is unknown, first line: {1!r}".format(path_name, lines[:1]))
+
+
+def parser_report(string_mode=True):
+    """ Return the statistics of the parsers that have parsed files: [name, rows, seconds, rows per second] """
+    the_list = [[name, parser.rowsParsed, parser.timeSpent, parser.rows_per_second()]
+                for name, parser in PARSER_REGISTRY.items() if parser.rowsParsed > 0]
+    if not string_mode:
+        return the_list
+    return "\n".join("{0}: {1} rows in {2:.3f}s, {3:.0f} rows/s".format(*line) for line in the_list)
+
+
+class CsvParser:
+    """ Represent a format of csv file, is made to be a super class (see register_parser)
+
+    The file is streamed by chunks of CHUNK_SIZE lines, each chunk is split by numpy.loadtxt and converted by
+    columns (vectorized), then written directly at its place in preallocated buffers (one contiguous buffer per
+    field): the peak memory is one value per day and per field read (plus one chunk of lines)
+
+    name: (str) the name of the format, used as sort_type
+    delimiter: (str) the delimiter used if none is given to parse()
+    fields: (dict) field -> column
+    default: (str) the field used as Asset.data
+    date: (tuple) the column of the date and its format ("iso": yyyy-mm-dd, "dmy": dd/mm/yyyy, see parse_dates())
+    header: (boolean) True if the first line must be skipped
+    reverse: (boolean) True if the file is sorted from the newest to the oldest day
+
+    rowsParsed, timeSpent: (int, float) statistics of all the files parsed, see rows_per_second()
+    """
+    CHUNK_SIZE = 2 ** 16
+
+    name = None
+    delimiter = ","
+    fields = {}
+    default = "close"
+    date = (0, "iso")
+    header = True
+    reverse = True
+
+    def __init__(self):
+        self.rowsParsed = 0
+        self.timeSpent = 0.
+
+    def __repr__(self):
+        return "<CsvParser {0}>".format(self.name)
+
+    def sniff(self, lines):
+        """ Return the delimiter if the first lines (list of str) of a file are in this format, else None """
+        return None
+
+    def rows_per_second(self):
+        return self.rowsParsed / max(self.timeSpent, 1e-9)
+
+    def convert(self, field, column):
+        """ Convert a column of strings of the field into float64 (vectorized) """
+        return column.astype(np.float64)
+
+    def parse(self, path_name, fields=None, delimiter=None):
+        """ Return a dict field -> numpy array, the oldest day first
+
+        fields: (list of str) the fields read in one pass (may contain DATE_FIELD), only self.default if None.
+            The DATE_FIELD is an array of datetime64[D], or None if the dates of the file can not be parsed
+        """
+        beginning_time = perf_counter()
+        if fields is None:
+            fields = [self.default]
+        if delimiter is None:
+            delimiter = self.delimiter
+        use_columns = []
+        for field in fields:
+            if field == DATE_FIELD:
+                use_columns.append(self.date[0])
+            elif field in self.fields:
+                use_columns.append(self.fields[field])
+            else:
+                raise ValueError("no field {0!r} in the format {1!r}".format(field, self.name))
+
+        number_of_rows = max(count_lines(path_name) - self.header, 0)
+        buffers = [np.empty(number_of_rows, dtype="datetime64[D]" if field == DATE_FIELD else np.float64)
+                   for field in fields]
+        valid_dates = True
+        filled = 0
+        with open(path_name) as file:
+            if self.header:
+                file.readline()
+            while True:
+                lines = list(islice(file, self.CHUNK_SIZE))
+                if not lines:
+                    break
+                values = np.loadtxt(lines, delimiter=delimiter, usecols=use_columns, ndmin=2, dtype=str)
+                for field, buffer, column in zip(fields, buffers, values.T):
+                    if field != DATE_FIELD:
+                        column = self.convert(field, column)
+                    elif valid_dates:
+                        try:
+                            column = parse_dates(column, self.date[1])
+                        except ValueError:
+                            # this file has no date (for example a day number): it can only be used by position
+                            valid_dates = False
+                            continue
+                    else:
+                        continue
+                    if self.reverse:
+                        # the oldest days are at the end of the file: the buffer is filled from its end
+                        buffer[number_of_rows - filled - len(column):number_of_rows - filled] = column[::-1]
+                    else:
+                        buffer[filled:filled + len(column)] = column
+                filled += len(values)
+
+        # blank lines are counted by count_lines() but skipped by loadtxt
+        if self.reverse:
+            buffers = [buffer[number_of_rows - filled:] for buffer in buffers]
+        else:
+            buffers = [buffer[:filled] for buffer in buffers]
+        columns = dict(zip(fields, buffers))
+        if DATE_FIELD in columns and not valid_dates:
+            columns[DATE_FIELD] = None
+
+        self.rowsParsed += filled
+        self.timeSpent += perf_counter() - beginning_time
+        return columns
+
+
+@register_parser
+class YahooParser(CsvParser):
+    """ G : Yahoo Finance files: Date,Open,High,Low,Close,Volume,Adj Close, the newest day first """
+    name = "yahoo"
+    fields = {"open": 1, "high": 2, "low": 3, "close": 4, "volume": 5, "adjclose": 6}
+    default = "adjclose"
+
+    def sniff(self, lines):
+        if lines[0].lower() == "date,open,high,low,close,volume,adj close":
+            return ","
+
+
+@register_parser
+class LtcParser(CsvParser):
+    """ Date,Low,High,Open,Close,Volume, the newest day first (ex: LTC_daily.csv) """
+    name = "ltc"
+    fields = {"low": 1, "high": 2, "open": 3, "close": 4, "volume": 5}
+
+    def sniff(self, lines):
+        if lines[0].lower() == "date,low,high,open,close,volume":
+            return ","
+
+
+@register_parser
+class InvestingParser(CsvParser):
+    """ date,close,open,high,low,change,close with european dates (dd/mm/yyyy), the newest day first
+
+    ex: eurusd-01.01.00.csv, oil-01.02.06.csv
+    change: the 6th column, in % for the currencies ("-0.49%" is read -0.0049), "-" is read as nan
+    """
+    name = "investing"
+    fields = {"close": 1, "open": 2, "high": 3, "low": 4, "change": 5}
+    date = (0, "dmy")
+
+    def sniff(self, lines):
+        if lines[0].lower().startswith("date,close,"):
+            return ","
+
+    def convert(self, field, column):
+        column = np.where(column == "-", "nan", column)
+        if field == "change":
+            is_percent = np.char.endswith(column, "%")
+            values = np.char.rstrip(column, "%").astype(np.float64)
+            return np.where(is_percent, values / 100, values)
+        return column.astype(np.float64)
+
+
+@register_parser
+class PropreParser(CsvParser):
+    """ day;value without header, the oldest day first (ex: ibm_propre.csv, uniformtest.csv, and BTC_daily.csv
+    with the delimiter ',')
+
+    the day may be a date dd/mm/yyyy (followed or not by an hour), or a number (no calendar then)
+    """
+    name = "propre"
+    delimiter = ";"
+    fields = {"close": 1}
+    date = (0, "dmy")
+    header = False
+    reverse = False
+
+    def sniff(self, lines):
+        for delimiter in (";", ","):
+            row = lines[0].split(delimiter)
+            if len(row) == 2:
+                try:
+                    float(row[1])
+                except ValueError:
+                    continue
+                return delimiter
+
+
+def parse_dates(strings, date_format):
+    """ Convert an array of strings into an array of datetime64[D] (vectorized), raise a ValueError if impossible
+
+    date_format: "iso" (yyyy-mm-dd) or "dmy" (dd/mm/yyyy), what follows the 10 first characters (hour) is ignored
+    """
+    strings = np.asarray(strings).astype("U10")
+    if date_format == "dmy":
+        # the characters are moved by columns to get yyyy-mm-dd
+        characters = strings.view("U1").reshape(len(strings), 10)
+        iso_characters = np.full((len(strings), 10), "-", dtype="U1")
+        iso_characters[:, 0:4] = characters[:, 6:10]
+        iso_characters[:, 5:7] = characters[:, 3:5]
+        iso_characters[:, 8:10] = characters[:, 0:2]
+        strings = iso_characters.view("U10").ravel()
+    elif date_format != "iso":
+        raise ValueError("unknown date format {0!r}".format(date_format))
+    dates = strings.astype("datetime64[D]")
+    if np.isnat(dates).any():
+        raise ValueError("some dates can not be read with the format {0!r}".format(date_format))
+    return dates
+
+
+def count_lines(path_name):
+    """ Count the lines of a file reading it by binary blocks (a last line without '\\n' is counted) """
+    number_of_lines = 0
+    last_block = b"\n"
+    with open(path_name, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            number_of_lines += block.count(b"\n")
+            last_block = block
+    if not last_block.endswith(b"\n"):
+        number_of_lines += 1
+    return number_of_lines
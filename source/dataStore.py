@@ -0,0 +1,300 @@
+from source.Backtest import *
+import argparse
+import json
+
+# name of the manifest file of a data directory, see build_manifest()
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# A panel is a single binary file holding a whole universe of assets:
+#   PANEL_MAGIC (8 bytes), the length of the header (uint64), the header (json, padded to align the arrays: the names,
+#   the field and the csv format of each asset, the number of days),
+#   the calendar (numberOfDays datetime64[D]), the matrix numberOfDays x numberOfAssets of float64 stored column by
+#   column (Fortran order): the values of an asset are contiguous
+# It is memory-mapped: several processes loading the same panel share one copy of it in the page cache.
+PANEL_MAGIC = b"BTPANEL1"
+PANEL_VERSION = 2
+
+
+def asset_files(asset_directory):
+    """ Return the list of (name, path) of the csv files of a directory, sorted by name
+
+    The name is the beginning of the file name, before the first '-' (ex: "aapl-03.01.95.csv" -> "aapl")
+    """
+    file_names = sorted(name for name in os.listdir(asset_directory) if name.endswith(".csv"))
+    return [(name.split('-')[0], os.path.join(asset_directory, name)) for name in file_names]
+
+
+class Panel:
+    """ Represent a panel file, memory-mapped (see PANEL_MAGIC for the format)
+
+    Constructor : Panel(the path of the panel file)
+
+    names: (list of str) the name of each asset (one by column of the matrix)
+    calendar: (numpy memmap of datetime64[D]) the date of each day
+    matrix: (numpy memmap of float64) numberOfDays x numberOfAssets, read-only
+    fields: (list of str) the field stored for each asset (the assets may come from csv of different formats)
+    formats: (list of str) the parser (sort_type, see dataParsers) of the csv of each asset, None if unknown
+    """
+
+    def __init__(self, panel_name):
+        with open(panel_name, "rb") as file:
+            if file.read(len(PANEL_MAGIC)) != PANEL_MAGIC:
+                raise ValueError("{0} is not a panel file".format(panel_name))
+            header_length = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+            header = json.loads(file.read(header_length).decode())
+        if header["version"] != PANEL_VERSION:
+            raise ValueError("{0} has the version {1} of the panel format, "
+                             "{2} expected".format(panel_name, header["version"], PANEL_VERSION))
+
+        self.names = header["names"]
+        self.fields = header["fields"]
+        self.formats = header["formats"]
+        number_of_days = header["numberOfDays"]
+        calendar_offset = len(PANEL_MAGIC) + 8 + header_length
+        self.calendar = np.memmap(panel_name, dtype="datetime64[D]", mode="r",
+                                  offset=calendar_offset, shape=(number_of_days,))
+        self.matrix = np.memmap(panel_name, dtype=np.float64, mode="r", offset=calendar_offset + 8 * number_of_days,
+                                shape=(number_of_days, len(self.names)), order="F")
+
+    def __repr__(self):
+        return "<Panel of {0} assets, {1} days>".format(len(self.names), len(self.calendar))
+
+    def get_column(self, name):
+        """ Return the values of an asset (a contiguous read-only view on the matrix) """
+        return self.matrix[:, self.names.index(name)]
+
+
+def write_panel(panel_name, market, field=None, formats=None):
+    """ Write the assets of a market in a panel file, the assets are aligned on the calendar of the market first
+
+    field: (str) the field of the assets written (the default field of each asset if None)
+    formats: (list of str) the parser (sort_type) of the csv of each asset, recorded in the panel (None if unknown)
+    """
+    number_of_days = market.maximumDay + 1  # the assets are aligned here
+    if market.calendar is None:
+        raise ValueError("the assets of the market have no common calendar, they can not be stored in a panel")
+    if formats is None:
+        formats = [None] * len(market.assetList)
+    if len(formats) != len(market.assetList):
+        raise ValueError("{0} formats given for {1} assets".format(len(formats), len(market.assetList)))
+    header = {"version": PANEL_VERSION, "names": [asset.name for asset in market.assetList],
+              "fields": [field if field is not None else asset.defaultField for asset in market.assetList],
+              "formats": list(formats), "numberOfDays": number_of_days}
+    header = json.dumps(header).encode()
+    # the arrays start on a multiple of 64 bytes
+    header += b" " * (-(len(PANEL_MAGIC) + 8 + len(header)) % 64)
+
+    temp_name = "{0}.{1}.tmp".format(panel_name, os.getpid())
+    with open(temp_name, "wb") as file:
+        file.write(PANEL_MAGIC)
+        file.write(np.uint64(len(header)).tobytes())
+        file.write(header)
+        file.write(np.ascontiguousarray(market.calendar[:number_of_days], dtype="datetime64[D]").tobytes())
+        for asset in market.assetList:
+            file.write(np.ascontiguousarray(asset.get_column(field)[:number_of_days], dtype=np.float64).tobytes())
+    os.replace(temp_name, panel_name)
+
+
+def resolve_parser(path_name, sort_type, delimiter):
+    """ Return (sort_type, delimiter) of a file: sniffed if sort_type is "auto", the delimiter of the parser if None """
+    if sort_type == "auto":
+        return sniff_parser(path_name)
+    if delimiter is None:
+        delimiter = get_parser(sort_type).delimiter
+    return sort_type, delimiter
+
+
+def build_panel(asset_directory, panel_name, sort_type="auto", delimiter=None, how="intersection", field=None):
+    """ Load all the csv files of a directory, align them (see Market.align_assets) and write them in a panel
+
+    sort_type: (str) the parser of the files, "auto" to sniff it for each file (see Backtest.add_asset_from_csv)
+    field: (str) the field stored, the default field of the parser of each file if None
+    """
+    market = Market()
+    formats = []
+    for name, path_name in asset_files(asset_directory):
+        file_sort_type, file_delimiter = resolve_parser(path_name, sort_type, delimiter)
+        formats.append(file_sort_type)
+        file_field = field if field is not None else get_parser(file_sort_type).default
+        columns = load_csv_columns(path_name, file_delimiter, file_sort_type, [file_field, DATE_FIELD])
+        if columns[DATE_FIELD] is None:
+            raise ValueError("{0} has no dates, it can not be stored in a panel".format(path_name))
+        market.register_asset(Asset(name, columns[file_field], default_field=file_field, dates=columns[DATE_FIELD]))
+    market.align_assets(how)
+    write_panel(panel_name, market, field, formats)
+    print("+ Panel written : {0}, {1} assets, {2} days".format(panel_name, len(market.assetList),
+                                                               market.maximumDay + 1))
+
+
+def file_checksum(path_name):
+    """ Return the sha1 of the content of a file, read by binary blocks """
+    checksum = hashlib.sha1()
+    with open(path_name, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def manifest_entry(name, path_name, sort_type, delimiter):
+    """ Return the description of a csv file stored in the manifest (only the dates are parsed, with the cache) """
+    sort_type, delimiter = resolve_parser(path_name, sort_type, delimiter)
+    stat = os.stat(path_name)
+    dates = load_csv_columns(path_name, delimiter, sort_type, [DATE_FIELD])[DATE_FIELD]
+    if dates is not None:
+        number_of_rows = len(dates)
+        first_date, last_date = str(dates[0]), str(dates[-1])
+    else:
+        number_of_rows = max(count_lines(path_name) - get_parser(sort_type).header, 0)
+        first_date, last_date = None, None
+    return {"name": name, "file": os.path.basename(path_name), "rows": number_of_rows,
+            "firstDate": first_date, "lastDate": last_date, "sort_type": sort_type, "delimiter": delimiter,
+            "size": stat.st_size, "mtime": stat.st_mtime_ns, "checksum": file_checksum(path_name)}
+
+
+def is_entry_up_to_date(entry, stat, sort_type, delimiter):
+    """ True if the entry of a manifest still describes the file of stat (os.stat), read with sort_type and delimiter
+
+    With sort_type "auto" (or delimiter None), the parser (or delimiter) recorded in the entry is accepted
+    """
+    return (entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns and
+            sort_type in ("auto", entry["sort_type"]) and delimiter in (None, entry["delimiter"]))
+
+
+def build_manifest(asset_directory, sort_type="auto", delimiter=None, manifest=None):
+    """ Write (and return) the manifest of a data directory: the description of each csv file (see manifest_entry)
+
+    sort_type: (str) the parser of the files, "auto" to sniff it for each file (see Backtest.add_asset_from_csv)
+    manifest: (dict) a previous manifest, the entries of the files not modified since (same size and mtime) are kept
+    """
+    old_entries = manifest["files"] if manifest is not None else {}
+    entries = {}
+    for name, path_name in asset_files(asset_directory):
+        file_name = os.path.basename(path_name)
+        stat = os.stat(path_name)
+        old_entry = old_entries.get(file_name)
+        if old_entry is not None and is_entry_up_to_date(old_entry, stat, sort_type, delimiter):
+            entries[file_name] = old_entry
+        else:
+            entries[file_name] = manifest_entry(name, path_name, sort_type, delimiter)
+
+    manifest = {"version": MANIFEST_VERSION, "files": entries}
+    manifest_name = os.path.join(asset_directory, MANIFEST_NAME)
+    temp_name = "{0}.{1}.tmp".format(manifest_name, os.getpid())
+    with open(temp_name, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temp_name, manifest_name)
+    return manifest
+
+
+def load_manifest(asset_directory, sort_type="auto", delimiter=None, update=True):
+    """ Return the manifest of a data directory
+
+    If update, the manifest is created if missing, and updated if a csv was added, removed or modified (checked with
+    the size and the modification time, only the modified files are read)
+    """
+    manifest_name = os.path.join(asset_directory, MANIFEST_NAME)
+    manifest = None
+    if os.path.isfile(manifest_name):
+        with open(manifest_name) as file:
+            manifest = json.load(file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            manifest = None
+    if not update:
+        if manifest is None:
+            raise ValueError("no valid manifest in {0}".format(asset_directory))
+        return manifest
+
+    if manifest is not None:
+        files = {os.path.basename(path_name): os.stat(path_name) for name, path_name in asset_files(asset_directory)}
+        up_to_date = files.keys() == manifest["files"].keys() and all(
+            is_entry_up_to_date(entry, files[file_name], sort_type, delimiter)
+            for file_name, entry in manifest["files"].items())
+        if up_to_date:
+            return manifest
+    return build_manifest(asset_directory, sort_type, delimiter, manifest)
+
+
+def manifest_entries(manifest):
+    """ Return the list of the entries of a manifest, sorted by file name (same order as asset_files()) """
+    return [manifest["files"][file_name] for file_name in sorted(manifest["files"])]
+
+
+def manifest_calendar(asset_directory, entries, how="intersection"):
+    """ Return the calendar of the files of the entries of a manifest (see Market.align_assets)
+
+    Only the dates are loaded (memory-mapped from the cache), no price
+    """
+    calendar = None
+    first_date, last_date = None, None
+    for entry in entries:
+        if entry["firstDate"] is None:
+            raise ValueError("{0} has no dates, there is no calendar".format(entry["file"]))
+        dates = load_csv_columns(os.path.join(asset_directory, entry["file"]), entry["delimiter"], entry["sort_type"],
+                                 [DATE_FIELD])[DATE_FIELD]
+        if calendar is None:
+            calendar = np.asarray(dates)
+        elif how == "intersection":
+            calendar = np.intersect1d(calendar, dates, assume_unique=True)
+        else:
+            calendar = np.union1d(calendar, dates)
+        first_date = max(first_date, dates[0]) if first_date is not None else dates[0]
+        last_date = min(last_date, dates[-1]) if last_date is not None else dates[-1]
+    if calendar is None:
+        return np.array([], dtype="datetime64[D]")
+    return calendar[(calendar >= first_date) & (calendar <= last_date)]
+
+
+def validate_manifest(entries, minimum_rows=1):
+    """ Print the problems found in the entries of a manifest, return True if there is none """
+    valid = True
+    for entry in entries:
+        if entry["rows"] < minimum_rows:
+            print("!!! {0} HAS ONLY {1} ROWS, {2} NEEDED !!!".format(entry["file"], entry["rows"], minimum_rows))
+            valid = False
+        if entry["firstDate"] is None:
+            print("!!! {0} HAS NO DATES !!!".format(entry["file"]))
+            valid = False
+    return valid
+
+
+def load_panel(market, panel_name):
+    """ Register all the assets of a panel in the market, without any parsing (the values are memory-mapped)
+
+    Return the list of the Asset created
+    """
+    panel = Panel(panel_name)
+    asset_list = []
+    for i, name in enumerate(panel.names):
+        the_asset = Asset(name, panel.matrix[:, i], default_field=panel.fields[i], dates=panel.calendar)
+        market.register_asset(the_asset)
+        asset_list.append(the_asset)
+    return asset_list
+
+
+if __name__ == "__main__":
+    # ex: python -m source.dataStore panel source/Data/MAdata95/ source/Data/MAdata95.panel
+    #     python -m source.dataStore manifest source/Data/MAdata95/
+    parser = argparse.ArgumentParser(description="Build the binary stores of a directory of csv files")
+    subparsers = parser.add_subparsers(dest="command")
+    panel_parser = subparsers.add_parser("panel", help="build a memory-mapped panel of all the assets")
+    panel_parser.add_argument("asset_directory")
+    panel_parser.add_argument("panel_name")
+    panel_parser.add_argument("--sort_type", default="auto")
+    panel_parser.add_argument("--delimiter", default=None)
+    panel_parser.add_argument("--how", default="intersection", choices=["intersection", "union"])
+    panel_parser.add_argument("--field", default=None)
+    manifest_parser = subparsers.add_parser("manifest", help="build the manifest of the directory")
+    manifest_parser.add_argument("asset_directory")
+    manifest_parser.add_argument("--sort_type", default="auto")
+    manifest_parser.add_argument("--delimiter", default=None)
+    arguments = parser.parse_args()
+
+    if arguments.command == "panel":
+        build_panel(arguments.asset_directory, arguments.panel_name, arguments.sort_type, arguments.delimiter,
+                    arguments.how, arguments.field)
+    elif arguments.command == "manifest":
+        the_manifest = build_manifest(arguments.asset_directory, arguments.sort_type, arguments.delimiter)
+        print("+ Manifest written : {0} files".format(len(the_manifest["files"])))
+    else:
+        parser.print_help()
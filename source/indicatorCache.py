@@ -0,0 +1,127 @@
+import numpy as np
+from collections import OrderedDict
+
+# name -> function(data, first_day, *params) returning an array of len(data): the value of the indicator for each day,
+# computed only with the values until this day (included), nan before first_day and before the first day it can be
+# computed (see register_indicator)
+INDICATOR_REGISTRY = {}
+
+
+def register_indicator(name, function=None):
+    """ Register an indicator function in INDICATOR_REGISTRY, can be used as a decorator: @register_indicator("sma") """
+    def register(the_function):
+        INDICATOR_REGISTRY[name] = the_function
+        return the_function
+    if function is not None:
+        return register(function)
+    return register
+
+
+def get_indicator(name):
+    """ Return the function of the indicator registered as name """
+    if name not in INDICATOR_REGISTRY:
+        raise ValueError("wrong indicator {0!r}, known ones: {1}".format(name, list(INDICATOR_REGISTRY)))
+    return INDICATOR_REGISTRY[name]
+
+
+@register_indicator("sma")
+def simple_moving_average(data, first_day, window):
+    """ Mean of the window last values (the day included), from the day max(first_day, window - 1) """
+    values = np.full(len(data), np.nan)
+    first_day = max(first_day, window - 1)
+    if first_day < len(data):
+        windows = np.lib.stride_tricks.sliding_window_view(np.asarray(data, dtype=np.float64)[first_day - window + 1:],
+                                                           window)
+        values[first_day:] = windows.mean(axis=1)
+    return values
+
+
+@register_indicator("ema")
+def exponential_moving_average(data, first_day, window):
+    """ Exponential moving average (alpha = 2 / (window + 1)), starting at first_day with the value of the day """
+    values = np.full(len(data), np.nan)
+    alpha = 2 / (window + 1)
+    if first_day < len(data):
+        mean = float(data[first_day])
+        values[first_day] = mean
+        for day, value in enumerate(np.asarray(data[first_day + 1:], dtype=np.float64).tolist(), first_day + 1):
+            mean += alpha * (value - mean)
+            values[day] = mean
+    return values
+
+
+class IndicatorCache:
+    """ Keep the indicators computed for the strategies and experts of a market (see Market.indicator)
+
+    An indicator is computed once for all the days of an asset (one array) and shared by all the strategies and
+    experts asking for it with the same parameters: in a grid of strategies (see Backtest.simule_batch) the moving
+    average of a window is computed once, not once per strategy. The arrays are *read-only*. When the budget is
+    exceeded, the least recently used arrays are removed (they are computed again if they are asked again).
+
+    Constructor : IndicatorCache(the budget in bytes (optional, None for no limit))
+
+    budget: (int) the number of bytes that can be used by the arrays, None for no limit
+    indicators: (OrderedDict) key -> array, the least recently used first. The key is
+        (asset, name of the indicator, params, field, (first_day, last day of the asset))
+    size: (int) the bytes used by all the arrays
+    hits, misses, evictions: (int) number of indicators found in the cache, computed, and removed
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.indicators = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __deepcopy__(self, memo):
+        # shared by the copies of a market, like the assets the indicators are computed from
+        return self
+
+    def __repr__(self):
+        return "<IndicatorCache: {0} indicators, {1} bytes, budget: {2}, hits: {3}, misses: {4}>".format(
+            len(self.indicators), self.size, self.budget, self.hits, self.misses)
+
+    def get(self, asset, name, params=(), first_day=0, field=None):
+        """ Return the read-only array of the indicator name(params) of a field of the asset (data if field is None),
+        one value per day of the asset: array[day] """
+        key = (asset, name, tuple(params), field, (first_day, asset.length - 1))
+        values = self.indicators.get(key)
+        if values is not None:
+            self.hits += 1
+            self.indicators.move_to_end(key)
+            return values
+
+        self.misses += 1
+        values = np.ascontiguousarray(get_indicator(name)(asset.get_column(field), first_day, *params),
+                                      dtype=np.float64)
+        values.flags.writeable = False
+        self.indicators[key] = values
+        self.size += values.nbytes
+        self.shrink()
+        return values
+
+    def shrink(self):
+        """ Remove the least recently used arrays while the budget is exceeded (the last used one is kept) """
+        if self.budget is None:
+            return
+        while self.size > self.budget and len(self.indicators) > 1:
+            old_key, old_values = self.indicators.popitem(last=False)
+            self.size -= old_values.nbytes
+            self.evictions += 1
+
+    def set_budget(self, budget):
+        """ Change the budget (bytes, None for no limit), remove arrays if needed """
+        self.budget = budget
+        self.shrink()
+
+    def clear(self):
+        """ Remove all the arrays, called when the values of the assets change (see Market.align_assets) """
+        self.indicators.clear()
+        self.size = 0
+
+    def hit_rate(self):
+        """ Return the part of the requests found in the cache (0 if nothing was asked) """
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Lead-lag scanner: the correlations between every pair of series for all the shifts from -max_lag to max_lag, with
+# the convention of commonTools.correlation(data1, data2, start, time_frame, time_shift):
+#     corrcoef(data1[start:start + time_frame], data2[start + time_shift:start + time_frame + time_shift])
+# A positive shift with a high correlation means that data1 leads data2 (data2 follows with time_shift days).
+# All the shifts of a pair are computed with one FFT (cross-correlation) and cumulative sums, instead of one corrcoef
+# per shift.
+
+# the number of complex values computed at once (pairs x FFT size), bounds the memory used by the scan
+LEAD_LAG_CHUNK = 2 ** 22
+
+
+def all_pairs(number_of_series):
+    """ Return the list of the pairs (i, j) with i < j: the negative shifts give the other direction (j leads i) """
+    return [(i, j) for i in range(number_of_series) for j in range(i + 1, number_of_series)]
+
+
+def lead_lag_scan(data, max_lag, time_frame=None, start=None, pairs=None):
+    """ Compute the correlations of the pairs of series of data for all the shifts from -max_lag to max_lag
+
+    data: (2-D array or list of series of the same length) series x days (the values of the assets, or their returns)
+    max_lag: (int) the biggest shift (in days)
+    start: (int) the first day of the window of the first series of a pair, max_lag by default
+    time_frame: (int) the number of days of the window, all the days after start with max_lag days left by default
+    pairs: (list of (i, j)) the pairs of series, all_pairs() by default
+
+    Return (pairs, lags, matrix): matrix[p, k] is correlation(data[i], data[j], start, time_frame, lags[k]) for the
+    pair p = (i, j), lags = -max_lag..max_lag. A shift out of the days of the data gives nan, like a constant window.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if start is None:
+        start = max_lag
+    if time_frame is None:
+        time_frame = data.shape[1] - start - max_lag
+    if pairs is None:
+        pairs = all_pairs(data.shape[0])
+    lags = np.arange(-max_lag, max_lag + 1)
+    return pairs, lags, window_correlations(data, start, time_frame, max_lag, pairs)
+
+
+def rolling_lead_lag_scan(data, max_lag, time_frame, step=None, pairs=None):
+    """ Compute lead_lag_scan() on windows of time_frame days, starting every step days (time_frame by default)
+
+    Return (pairs, lags, starts, matrix): matrix[w, p, k] is the correlation of the pair p with the shift lags[k] on
+    the window w starting the day starts[w] (see lead_lag_scan)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if step is None:
+        step = time_frame
+    if pairs is None:
+        pairs = all_pairs(data.shape[0])
+    lags = np.arange(-max_lag, max_lag + 1)
+    starts = np.arange(max_lag, data.shape[1] - time_frame - max_lag + 1, step)
+    matrix = np.full((len(starts), len(pairs), len(lags)), np.nan)
+    for window, start in enumerate(starts.tolist()):
+        matrix[window] = window_correlations(data, start, time_frame, max_lag, pairs)
+    return pairs, lags, starts, matrix
+
+
+def window_correlations(data, start, time_frame, max_lag, pairs):
+    """ Return the pairs x lags matrix of the correlations of one window (see lead_lag_scan) """
+    number_of_days = data.shape[1]
+    matrix = np.full((len(pairs), 2 * max_lag + 1), np.nan)
+    if time_frame < 2 or start < 0 or start + time_frame > number_of_days or len(pairs) == 0:
+        return matrix
+    # the shifts with all their days in the data
+    first_lag = max(-max_lag, -start)
+    last_lag = min(max_lag, number_of_days - start - time_frame)
+
+    # the windows of the first series (centered: the sum of a product with them does not depend on the mean of the
+    # other series) and the segments of the second series covering all the shifts
+    windows = data[:, start:start + time_frame]
+    # exactly 0 for a constant window (the rounding of the mean would give a tiny sum)
+    constant = windows.max(axis=1) == windows.min(axis=1)
+    windows = windows - windows.mean(axis=1)[:, None]
+    window_squares = np.where(constant, 0., (windows ** 2).sum(axis=1))
+    segments = data[:, start + first_lag:start + time_frame + last_lag]
+    segments = segments - segments.mean(axis=1)[:, None]
+    number_of_lags = last_lag - first_lag + 1
+
+    # sums and sums of squares of the second series for each shift (cumulative sums of the centered segments)
+    sums = np.concatenate([np.zeros((len(data), 1)), np.cumsum(segments, axis=1)], axis=1)
+    square_sums = np.concatenate([np.zeros((len(data), 1)), np.cumsum(segments ** 2, axis=1)], axis=1)
+    segment_squares = ((square_sums[:, time_frame:time_frame + number_of_lags] - square_sums[:, :number_of_lags]) -
+                       (sums[:, time_frame:time_frame + number_of_lags] - sums[:, :number_of_lags]) ** 2 / time_frame)
+    # under the rounding errors of the cumulative sums: a constant window
+    rounding = np.finfo(np.float64).eps * segments.shape[1] * (segments ** 2).max(axis=1, initial=0.)
+    segment_squares[segment_squares <= rounding[:, None]] = 0.
+
+    # cross-correlations of all the shifts: sum(window[t] * segment[t + lag - first_lag]) for every lag, by FFT
+    size = 1 << int(segments.shape[1] + time_frame - 1).bit_length()
+    window_spectra = np.conj(np.fft.rfft(windows, size, axis=1))
+    segment_spectra = np.fft.rfft(segments, size, axis=1)
+
+    pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+    chunk = max(1, LEAD_LAG_CHUNK // size)
+    for first in range(0, len(pairs), chunk):
+        firsts, seconds = pairs[first:first + chunk, 0], pairs[first:first + chunk, 1]
+        products = np.fft.irfft(window_spectra[firsts] * segment_spectra[seconds], size, axis=1)[:, :number_of_lags]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlations = products / np.sqrt(window_squares[firsts][:, None] * segment_squares[seconds])
+        matrix[first:first + chunk, first_lag + max_lag:last_lag + max_lag + 1] = correlations
+    # a constant window has no correlation (like numpy.corrcoef)
+    matrix[~np.isfinite(matrix)] = np.nan
+    return matrix
@@ -0,0 +1,300 @@
+import copy
+import numpy as np
+
+# the columns of the tables of a Ledger: (name, dtype, value of a new row when not given)
+#   trades: one row per Trade, asset and portfolio are the index of the asset / portfolio in the ledger
+#   positions: one row per Position, open and close are rows of the trades (close is -1 while the position is open),
+#       long is a code of POSITION_TYPES, the gain and the result are computed from the prices of the trades
+#   predictions: one row per Prediction, expert is the index of the expert in the ledger
+TRADE_COLUMNS = [("day", np.int32, 0), ("asset", np.int32, -1), ("volume", np.float64, 0.),
+                 ("price", np.float64, np.nan), ("portfolio", np.int32, -1)]
+POSITION_COLUMNS = [("open", np.int32, -1), ("close", np.int32, -1), ("long", np.int8, 0)]
+PREDICTION_COLUMNS = [("day", np.int32, 0), ("final_term", np.int32, 0), ("asset", np.int32, -1),
+                      ("expert", np.int32, -1), ("isTrue", np.bool_, False), ("result", np.float64, -1.)]
+
+# the values of Position.long: True for LONG, False for SHORT, and "SHORT" given by Market.open() (not yet implemented)
+POSITION_TYPES = (False, True, "SHORT")
+
+
+class LedgerRecord:
+    """ Represent a record of a ledger (Trade, Position, Prediction in Market.py): only the ledger and the row are
+    stored, the attributes are read from the tables of the ledger
+
+    ledger: (Ledger) the ledger where the record is stored
+    id: (int) the row of the record in its table
+    """
+    __slots__ = ("ledger", "id")
+
+    def __eq__(self, other):
+        # the same record may be read several times from the ledger (see LedgerList)
+        return type(other) is type(self) and other.ledger is self.ledger and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.ledger), self.id))
+
+    @classmethod
+    def view(cls, ledger, row):
+        """ Return the record of a row of the ledger (nothing is added to the ledger) """
+        record = cls.__new__(cls)
+        record.ledger = ledger
+        record.id = row
+        return record
+
+
+class LedgerTable:
+    """ Represent an append-only table stored by columns: one contiguous numpy array per column
+
+    The arrays are allocated with a capacity doubled when they are full (amortized O(1) append), the rows are never
+    moved nor removed: a row number is a stable id
+
+    Constructor : LedgerTable(the columns: list of (name, dtype, default value),
+                              the initial capacity (optional))
+
+    size: (int) the number of rows
+    capacity: (int) the number of rows allocated
+    shared: (boolean) True if the arrays are shared with a copy of the table (copy.deepcopy, see Market.fork): they
+        are copied before the first write (copy-on-write)
+    """
+
+    def __init__(self, columns, capacity=256):
+        self.columnNames = [name for name, dtype, default in columns]
+        self.defaults = {name: default for name, dtype, default in columns}
+        self.size = 0
+        self.capacity = capacity
+        self.arrays = {name: np.full(capacity, default, dtype=dtype) for name, dtype, default in columns}
+        self.shared = False
+
+    def __deepcopy__(self, memo):
+        # copy-on-write: not copy.copy(), which would copy the arrays (see __getstate__)
+        table = self.__class__.__new__(self.__class__)
+        table.__dict__.update(self.__dict__)
+        table.arrays = dict(self.arrays)
+        table.shared = self.shared = True
+        return table
+
+    def __getstate__(self):
+        # pickled without the rows allocated but not used (see checkpoint.py)
+        state = dict(self.__dict__)
+        state["capacity"] = max(self.size, 1)
+        state["arrays"] = {name: array[:state["capacity"]].copy() for name, array in self.arrays.items()}
+        state["shared"] = False
+        return state
+
+    def __repr__(self):
+        return "<LedgerTable {0} rows, columns: {1}>".format(self.size, self.columnNames)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, **values):
+        """ Add a row and return its number, the columns not given get their default value """
+        if self.size == self.capacity:
+            self.grow()
+        elif self.shared:
+            self.unshare()
+        row = self.size
+        for name, value in values.items():
+            self.arrays[name][row] = value
+        self.size += 1
+        return row
+
+    def grow(self):
+        self.capacity *= 2
+        for name, array in self.arrays.items():
+            new_array = np.full(self.capacity, self.defaults[name], dtype=array.dtype)
+            new_array[:self.size] = array[:self.size]
+            self.arrays[name] = new_array
+        self.shared = False
+
+    def unshare(self):
+        """ Copy the arrays shared with a copy of the table (before writing in them) """
+        self.arrays = {name: array.copy() for name, array in self.arrays.items()}
+        self.shared = False
+
+    def get(self, name, row):
+        """ Return the value of a cell as a python value (int, float, bool) """
+        return self.arrays[name].item(row)
+
+    def set(self, name, row, value):
+        if self.shared:
+            self.unshare()
+        self.arrays[name][row] = value
+
+    def column(self, name):
+        """ Return the filled part of a column, read-only view (no copy): used by the analytics """
+        column = self.arrays[name][:self.size]
+        column.flags.writeable = False
+        return column
+
+    def memory_size(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+class Ledger:
+    """ Represent the records of the simulations of a market: trades, positions and predictions, by columns
+
+    Trade, Position and Prediction (see Market.py) only store the ledger and their row, their attributes are read
+    from the tables. The assets, portfolios and experts are stored once in the ledger and referenced by index.
+    A market gets a new ledger when it is reset (see Backtest.soft_reset): the records of the previous simulations
+    are still readable from their own ledger.
+
+    Constructor : Ledger(the list of the assets of the market (shared, not copied))
+
+    trades, positions, predictions: (LedgerTable) see TRADE_COLUMNS, POSITION_COLUMNS, PREDICTION_COLUMNS
+    assets: (list of Asset) the assets of the market, the index of an asset is asset.index
+    portfolios, experts: (list) registered with add_portfolio() and add_expert(), by index
+    evolutions: (list) the evolution of each prediction ("UP", "DOWN"...), by row
+    """
+
+    def __init__(self, asset_list):
+        self.assets = asset_list
+        self.portfolios = []
+        self.experts = []
+        self.evolutions = []
+        self.trades = LedgerTable(TRADE_COLUMNS)
+        self.positions = LedgerTable(POSITION_COLUMNS)
+        self.predictions = LedgerTable(PREDICTION_COLUMNS)
+
+    def __deepcopy__(self, memo):
+        ledger = copy.copy(self)
+        memo[id(self)] = ledger
+        for name in ("assets", "portfolios", "experts", "trades", "positions", "predictions"):
+            setattr(ledger, name, copy.deepcopy(getattr(self, name), memo))
+        # strings, no need to copy them one by one
+        ledger.evolutions = list(self.evolutions)
+        return ledger
+
+    def __repr__(self):
+        return "<Ledger {0} trades, {1} positions, {2} predictions>".format(len(self.trades), len(self.positions),
+                                                                             len(self.predictions))
+
+    def add_portfolio(self, portfolio):
+        """ Register a portfolio and return its index """
+        self.portfolios.append(portfolio)
+        return len(self.portfolios) - 1
+
+    def add_expert(self, expert):
+        """ Register an expert and return its index """
+        self.experts.append(expert)
+        return len(self.experts) - 1
+
+    def add_trade(self, asset, volume, day, portfolio):
+        """ Add a trade and return its row, its price is the value of the asset the day of the trade """
+        return self.trades.append(day=day, asset=asset.index, volume=volume, price=asset.data[day],
+                                  portfolio=portfolio.index)
+
+    def add_position(self, open_trade, long):
+        """ Add an open position (open_trade: the row of its opening trade) and return its row """
+        if long not in POSITION_TYPES:
+            raise ValueError("wrong type of position {0!r}, known ones: {1}".format(long, POSITION_TYPES))
+        return self.positions.append(open=open_trade, long=POSITION_TYPES.index(long))
+
+    def close_position(self, position, close_trade):
+        """ Record the closing of a position (rows of the position and of its closing trade) """
+        self.positions.set("close", position, close_trade)
+
+    def position_gain(self, position):
+        """ Return (gain, result) of a closed position, same operations as Market.close() """
+        open_price = self.trades.get("price", self.positions.get("open", position))
+        close_price = self.trades.get("price", self.positions.get("close", position))
+        gain = (close_price - open_price) * self.trades.get("volume", self.positions.get("open", position))
+        if not POSITION_TYPES[self.positions.get("long", position)]:
+            gain = -gain
+        return gain, close_price / open_price
+
+    def position_gains(self, rows=None):
+        """ Return the arrays (gain, result) of closed positions (all of them if rows is None), vectorized """
+        if rows is None:
+            rows = np.flatnonzero(self.positions.column("close") >= 0)
+        open_rows = self.positions.column("open")[rows]
+        open_prices = self.trades.column("price")[open_rows]
+        close_prices = self.trades.column("price")[self.positions.column("close")[rows]]
+        gains = (close_prices - open_prices) * self.trades.column("volume")[open_rows]
+        gains[self.positions.column("long")[rows] == POSITION_TYPES.index(False)] *= -1
+        return gains, close_prices / open_prices
+
+    def add_prediction(self, asset, evolution, final_term, expert, day):
+        """ Add a prediction not yet verified and return its row """
+        self.evolutions.append(evolution)
+        return self.predictions.append(day=day, final_term=final_term, asset=asset.index, expert=expert.index)
+
+    def memory_size(self):
+        """ Return the bytes used by the tables (allocated capacity included), see also LedgerList """
+        return self.trades.memory_size() + self.positions.memory_size() + self.predictions.memory_size()
+
+
+class LedgerList:
+    """ Represent a list of records of a ledger (Position or Prediction): only their rows are stored
+
+    Used for the long lists (Portfolio.closePositionList, Expert.predictionMadeList): the records are created again
+    (views on the ledger) when they are read, none is kept alive by the list. Like LedgerTable, a copy shares the
+    rows until one of the two lists is appended.
+
+    Constructor : LedgerList(the ledger,
+                             the function returning the record of a row: record_view(ledger, row),
+                             the initial capacity (optional))
+    """
+
+    def __init__(self, ledger, record_view, capacity=16):
+        self.ledger = ledger
+        self.recordView = record_view
+        self.size = 0
+        self.array = np.empty(capacity, dtype=np.int32)
+        self.shared = False
+
+    def __deepcopy__(self, memo):
+        the_list = self.__class__.__new__(self.__class__)
+        the_list.__dict__.update(self.__dict__)
+        the_list.ledger = copy.deepcopy(self.ledger, memo)
+        the_list.shared = self.shared = True
+        return the_list
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["array"] = self.array[:max(self.size, 1)].copy()
+        state["shared"] = False
+        return state
+
+    def __repr__(self):
+        return "<LedgerList of {0} records>".format(self.size)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, record):
+        if record.ledger is not self.ledger:
+            raise ValueError("{0} is not a record of the ledger of this list".format(record))
+        if self.size == len(self.array):
+            self.array = np.concatenate([self.array, np.empty(len(self.array), dtype=np.int32)])
+            self.shared = False
+        elif self.shared:
+            self.array = self.array.copy()
+            self.shared = False
+        self.array[self.size] = record.id
+        self.size += 1
+
+    def rows(self):
+        """ Return the rows of the records (read-only view): the analytics read the columns of the ledger with them """
+        rows = self.array[:self.size]
+        rows.flags.writeable = False
+        return rows
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.recordView(self.ledger, row) for row in self.rows()[item].tolist()]
+        if item < 0:
+            item += self.size
+        if not 0 <= item < self.size:
+            raise IndexError("LedgerList index out of range")
+        return self.recordView(self.ledger, self.array.item(item))
+
+    def __iter__(self):
+        ledger, record_view = self.ledger, self.recordView
+        for row in self.rows().tolist():
+            yield record_view(ledger, row)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
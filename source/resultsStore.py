@@ -0,0 +1,392 @@
+from source.Backtest import *
+import argparse
+import atexit
+import json
+import queue
+import threading
+
+# A results file is a columnar store of the predictions (and closed positions) made during a sweep:
+#   RESULTS_MAGIC (8 bytes), then blocks written one after the other, each one is: the length of its header (uint64),
+#   the header (json: number of rows, categories, columns with their dtype), then the arrays of the columns one after
+#   the other. A query only reads the columns it needs (one seek per column and per block).
+RESULTS_MAGIC = b"BTRESLT1"
+RESULTS_VERSION = 1
+
+# the columns of a results file: (name, dtype), "category" columns are stored as int32 codes + the list of categories
+#   source: the name of the expert (or of the portfolio for a position)
+#   long, short: the medians of the expert or of the strategy owning the portfolio, NO_MEDIANS for a reference without
+#       medians (given explicitly, see result_rows)
+#   asset: the name of the asset
+#   day, term: the day the prediction was made and the day it was verified (opening and closing days of a position)
+#   isTrue: the prediction was true (the gain of the position is >= 0)
+#   result: prediction.result (position.result)
+RESULTS_COLUMNS = [("source", "category"), ("long", np.int32), ("short", np.int32), ("asset", "category"),
+                   ("day", np.int32), ("term", np.int32), ("isTrue", np.bool_), ("result", np.float64)]
+RESULTS_DTYPES = dict(RESULTS_COLUMNS)
+
+# the medians (long, short) written for the results of a reference without medians (JMRandomExpert)
+NO_MEDIANS = (-1, -1)
+
+
+def owner_medians(owner):
+    """ Return (long, short): the medians of an expert or of the strategy owning a portfolio """
+    if isinstance(owner, Portfolio):
+        if owner.owner is None:
+            raise ValueError("{0} has no strategy, the medians of its positions must be given".format(owner))
+        owner = owner.owner
+    if not hasattr(owner, "longMedian") or not hasattr(owner, "shortMedian"):
+        raise ValueError("{0} has no medians, they must be given (NO_MEDIANS for a reference)".format(owner))
+    return owner.longMedian, owner.shortMedian
+
+
+def result_rows(prediction_list, medians=None):
+    """ Return a dict column -> list of the values of a list of Prediction or of closed Position
+
+    medians: (long, short) written for all the rows, if None the medians of the expert of each prediction or of the
+        strategy owning the portfolio of each position (ValueError if it has none)
+    """
+    if isinstance(prediction_list, LedgerList) and prediction_list.recordView == Prediction.view:
+        return prediction_rows(prediction_list.ledger, prediction_list.rows(), medians)
+    if len(prediction_list) > 0 and all(isinstance(item, Prediction) and item.ledger is prediction_list[0].ledger
+                                        for item in prediction_list):
+        return prediction_rows(prediction_list[0].ledger, [prediction.id for prediction in prediction_list], medians)
+    columns = {name: [] for name, dtype in RESULTS_COLUMNS}
+    owner_medians_found = {}  # owner (expert or portfolio) -> its medians
+    for item in prediction_list:
+        if isinstance(item, Position):
+            owner = item.portfolio
+            values = [owner.name, item.openTrade.asset.name, item.openTrade.day, item.closeTrade.day,
+                      item.gain >= 0, item.result]
+        else:
+            owner = item.expert
+            values = [owner.name, item.asset.name, item.day, item.final_term, item.isTrue, item.result]
+        if medians is not None:
+            item_medians = medians
+        else:
+            if owner not in owner_medians_found:
+                owner_medians_found[owner] = owner_medians(owner)
+            item_medians = owner_medians_found[owner]
+        for name, value in zip(("source", "asset", "day", "term", "isTrue", "result"), values):
+            columns[name].append(value)
+        columns["long"].append(item_medians[0])
+        columns["short"].append(item_medians[1])
+    return columns
+
+
+def prediction_rows(ledger, rows, medians=None):
+    """ Same as result_rows() for predictions given by their rows in a ledger: the columns are read directly """
+    table = ledger.predictions
+    rows = np.asarray(rows, dtype=np.int64)
+    experts = table.column("expert")[rows]
+    asset_names = np.array([asset.name for asset in ledger.assets] or [""], dtype=object)
+    expert_names = np.array([expert.name for expert in ledger.experts], dtype=object)
+    if medians is not None:
+        long_medians = np.full(len(rows), medians[0], dtype=np.int64)
+        short_medians = np.full(len(rows), medians[1], dtype=np.int64)
+    else:
+        expert_medians = np.zeros((len(ledger.experts), 2), dtype=np.int64)
+        for index in np.unique(experts).tolist():
+            expert_medians[index] = owner_medians(ledger.experts[index])
+        long_medians, short_medians = expert_medians[experts, 0], expert_medians[experts, 1]
+    return {"source": expert_names[experts].tolist(), "long": long_medians.tolist(),
+            "short": short_medians.tolist(), "asset": asset_names[table.column("asset")[rows]].tolist(),
+            "day": table.column("day")[rows].tolist(), "term": table.column("final_term")[rows].tolist(),
+            "isTrue": table.column("isTrue")[rows].tolist(), "result": table.column("result")[rows].tolist()}
+
+
+class ResultsStore:
+    """ Represent a results file opened to be written (see RESULTS_MAGIC for the format)
+
+    The file stays open during the whole sweep, the rows are kept in memory and written by blocks of batchSize rows
+
+    Constructor : ResultsStore(the path of the file,
+                               True to overwrite the file, False to add the new blocks at its end (optional, True),
+                               the number of rows of a block (optional))
+
+    pendingColumns: (dict) column -> list of the values not yet written
+    pendingRows: (int) the number of rows not yet written
+    rowsWritten, blocksWritten: (int) statistics of the file
+    """
+
+    def __init__(self, file_name, overwrite=True, batch_size=2 ** 16):
+        self.fileName = file_name
+        self.batchSize = batch_size
+        exists = not overwrite and os.path.isfile(file_name) and os.path.getsize(file_name) > 0
+        if exists:
+            with open(file_name, "rb") as file:
+                if file.read(len(RESULTS_MAGIC)) != RESULTS_MAGIC:
+                    raise ValueError("{0} is not a results file".format(file_name))
+        self.file = open(file_name, "ab" if exists else "wb")
+        if not exists:
+            self.file.write(RESULTS_MAGIC)
+        # the pending rows are written if the program stops before close()
+        atexit.register(self.close)
+
+        self.pendingColumns = {name: [] for name, dtype in RESULTS_COLUMNS}
+        self.pendingRows = 0
+        self.rowsWritten = 0
+        self.blocksWritten = 0
+
+    def __repr__(self):
+        return "<ResultsStore {0}: {1} rows written>".format(self.fileName, self.rowsWritten)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, prediction_list, medians=None):
+        """ Add the rows of a list of Prediction or of closed Position, a block is written if batchSize is reached
+        (see result_rows for medians) """
+        self.append_columns(result_rows(prediction_list, medians))
+
+    def append_columns(self, columns):
+        """ Add rows given as a dict column -> list of values (see result_rows) """
+        for name, values in columns.items():
+            self.pendingColumns[name].extend(values)
+        self.pendingRows += len(columns["source"])
+        if self.pendingRows >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        """ Write the pending rows in a new block """
+        if self.pendingRows == 0:
+            return
+        header = {"version": RESULTS_VERSION, "rows": self.pendingRows, "categories": {}, "columns": []}
+        arrays = []
+        for name, dtype in RESULTS_COLUMNS:
+            values = self.pendingColumns[name]
+            if dtype == "category":
+                categories, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+                header["categories"][name] = categories.tolist()
+                array = codes.astype(np.int32)
+            else:
+                array = np.asarray(values, dtype=dtype)
+            header["columns"].append([name, array.dtype.str, array.nbytes])
+            arrays.append(array)
+        header = json.dumps(header).encode()
+
+        self.file.write(np.uint64(len(header)).tobytes())
+        self.file.write(header)
+        for array in arrays:
+            self.file.write(array.tobytes())
+        self.file.flush()
+
+        self.rowsWritten += self.pendingRows
+        self.blocksWritten += 1
+        self.pendingColumns = {name: [] for name, dtype in RESULTS_COLUMNS}
+        self.pendingRows = 0
+
+    def close(self):
+        """ Write the pending rows and close the file """
+        if not self.file.closed:
+            atexit.unregister(self.close)
+            self.flush()
+            self.file.close()
+
+
+class ResultsWriter:
+    """ Write the results of a sweep in a background thread, so that the simulation never waits for the disk
+
+    The batches (csv rows or rows of a ResultsStore) are put in a bounded queue: when the queue is full, the
+    simulation waits (backpressure). The thread takes all the batches waiting in the queue and coalesces them: the
+    consecutive rows added to the same csv are written with one opening of the file.
+    An error of the thread is raised by the next call to the writer (the next batches are dropped). The writer is
+    closed (all the batches written) by close(), at the end of a with block, or at the exit of the program.
+    A ResultsStore given to the writer must only be used through it until the writer is closed.
+
+    Constructor : ResultsWriter(the maximum number of batches waiting in the queue (optional))
+
+    batchesWritten, writes: (int) number of batches received and of writes done (a write can hold several batches)
+    error: (Exception) the error of the thread, None if no error
+    """
+
+    def __init__(self, max_batches=64):
+        self.queue = queue.Queue(maxsize=max_batches)
+        self.batchesWritten = 0
+        self.writes = 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="ResultsWriter", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def __repr__(self):
+        return "<ResultsWriter: {0} batches in {1} writes>".format(self.batchesWritten, self.writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_rows(self, file_name, data, overwrite=False, first_line=None):
+        """ Same as data_writer(), done by the thread """
+        self.put(("csv", file_name, data, overwrite, first_line))
+
+    def write_results(self, store, prediction_list, medians=None):
+        """ Same as store.append(prediction_list, medians), done by the thread (the rows are read now) """
+        self.put(("store", store, result_rows(prediction_list, medians)))
+
+    def put(self, batch):
+        self.check_error()
+        if self.closed:
+            raise ValueError("the results writer is closed")
+        self.queue.put(batch)
+
+    def check_error(self):
+        if self.error is not None:
+            raise RuntimeError("the results writer failed: {0!r}".format(self.error)) from self.error
+
+    def flush(self):
+        """ Wait until all the batches given are written """
+        self.queue.join()
+        self.check_error()
+
+    def close(self):
+        """ Write all the batches given and stop the thread """
+        if not self.closed:
+            self.closed = True
+            atexit.unregister(self.close)
+            self.queue.put(None)
+            self.thread.join()
+        self.check_error()
+
+    def run(self):
+        """ The loop of the thread: take all the batches waiting and write them """
+        running = True
+        while running:
+            batches = [self.queue.get()]
+            while True:
+                try:
+                    batches.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batches[-1] is None:
+                running = False
+                batches.pop()
+            if self.error is None:
+                try:
+                    self.write_batches(batches)
+                except Exception as error:
+                    print("!!! RESULTS WRITER ERROR: {0!r} !!!".format(error))
+                    self.error = error
+            for _ in range(len(batches) + (not running)):
+                self.queue.task_done()
+
+    def write_batches(self, batches):
+        """ Write the batches in order, the consecutive rows added to the same csv are coalesced """
+        pending = None  # [file_name, data, overwrite, first_line] not yet written
+        for batch in batches:
+            self.batchesWritten += 1
+            if batch[0] == "csv":
+                kind, file_name, data, overwrite, first_line = batch
+                if pending is not None and pending[0] == file_name and not overwrite and first_line is None:
+                    pending[1] = pending[1] + list(data)
+                    continue
+                self.write_pending(pending)
+                pending = [file_name, list(data), overwrite, first_line]
+            else:
+                self.write_pending(pending)
+                pending = None
+                kind, store, columns = batch
+                store.append_columns(columns)
+                self.writes += 1
+        self.write_pending(pending)
+
+    def write_pending(self, pending):
+        if pending is not None:
+            data_writer(pending[0], pending[1], overwrite=pending[2], first_line=pending[3])
+            self.writes += 1
+
+
+def result_blocks(file):
+    """ Generator of (header, offset of the first array) of the blocks of an opened results file """
+    if file.read(len(RESULTS_MAGIC)) != RESULTS_MAGIC:
+        raise ValueError("{0} is not a results file".format(file.name))
+    while True:
+        length = file.read(8)
+        if len(length) < 8:
+            return
+        header = json.loads(file.read(int(np.frombuffer(length, dtype=np.uint64)[0])).decode())
+        if header["version"] != RESULTS_VERSION:
+            raise ValueError("{0} has the version {1} of the results format, "
+                             "{2} expected".format(file.name, header["version"], RESULTS_VERSION))
+        offset = file.tell()
+        yield header, offset
+        file.seek(offset + sum(column[2] for column in header["columns"]))
+
+
+def read_results(file_name, columns=None, where=None):
+    """ Return a dict column -> numpy array of the rows of a results file, only the needed columns are read
+
+    columns: (list of str) the columns returned, all of them if None (see RESULTS_COLUMNS)
+    where: (dict) column -> value or list of values, only the rows matching all the conditions are returned
+        ex: read_results("results.btr", ["result"], where={"asset": "aapl", "long": 45, "short": [20, 22]})
+    The category columns are returned as arrays of str
+    """
+    if columns is None:
+        columns = [name for name, dtype in RESULTS_COLUMNS]
+    where = where if where is not None else {}
+    for name in list(columns) + list(where):
+        if name not in RESULTS_DTYPES:
+            raise ValueError("no column {0!r} in a results file, known ones: {1}".format(name, list(RESULTS_DTYPES)))
+    needed_columns = list(dict.fromkeys(list(columns) + list(where)))
+
+    parts = {name: [] for name in columns}
+    with open(file_name, "rb") as file:
+        for header, offset in result_blocks(file):
+            position = offset
+            block = {}
+            for name, dtype, number_of_bytes in header["columns"]:
+                if name in needed_columns:
+                    file.seek(position)
+                    array = np.fromfile(file, dtype=np.dtype(dtype), count=header["rows"])
+                    if name in header["categories"]:
+                        array = np.asarray(header["categories"][name], dtype=str)[array]
+                    block[name] = array
+                position += number_of_bytes
+            mask = np.ones(header["rows"], dtype=bool)
+            for name, value in where.items():
+                mask &= np.isin(block[name], value)
+            for name in columns:
+                parts[name].append(block[name][mask])
+
+    results = {}
+    for name in columns:
+        if parts[name]:
+            results[name] = np.concatenate(parts[name])
+        else:
+            results[name] = np.array([], dtype=str if RESULTS_DTYPES[name] == "category" else RESULTS_DTYPES[name])
+    return results
+
+
+def export_results_csv(file_name, csv_name, columns=None, where=None):
+    """ Write the rows of a results file (see read_results for columns and where) in a csv, with a header line """
+    results = read_results(file_name, columns, where)
+    columns = list(results)
+    data = [columns] + list(zip(*(results[name].tolist() for name in columns)))
+    data_writer(csv_name, data)
+
+
+if __name__ == "__main__":
+    # ex: python -m source.resultsStore Results/S5_up_fullstrat_95/results.btr results.csv --where asset=aapl
+    parser = argparse.ArgumentParser(description="Export a results file in a csv")
+    parser.add_argument("file_name")
+    parser.add_argument("csv_name")
+    parser.add_argument("--columns", nargs="*", default=None)
+    parser.add_argument("--where", nargs="*", default=[], help="conditions column=value")
+    arguments = parser.parse_args()
+
+    conditions = {}
+    for condition in arguments.where:
+        name, value = condition.split("=", 1)
+        dtype = RESULTS_DTYPES.get(name)
+        if dtype == "category":
+            conditions[name] = value
+        elif dtype == np.bool_:
+            conditions[name] = value.lower() in ("true", "1")
+        else:
+            conditions[name] = np.dtype(dtype).type(value)
+    export_results_csv(arguments.file_name, arguments.csv_name, arguments.columns, conditions)
@@ -0,0 +1,237 @@
+import math
+from collections import deque
+
+# Rolling statistics updated value by value in O(1), with a memory bounded by their window: used in the new_day() of
+# the strategies and experts instead of a new computation on the window every day (from source.rollingTools import
+# RollingMean...), for example
+#     self.mean = RollingMean(20)                                            (in __init__)
+#     mean = self.mean.update(self.market.get_asset_data(self.asset)[-1])   (in new_day, once per day)
+# The sums are compensated (Neumaier) and the variance is updated with Welford's method: a simulation of many days does
+# not drift from the statistics computed directly.
+
+
+class CompensatedSum:
+    """ Represent a sum of floats with the compensation of the rounding errors (Neumaier summation)
+
+    Constructor : CompensatedSum()
+
+    total: (float) the rounded sum
+    compensation: (float) the sum of the rounding errors, value = total + compensation
+    """
+
+    def __init__(self):
+        self.total = 0.
+        self.compensation = 0.
+
+    def __repr__(self):
+        return "<CompensatedSum: {0}>".format(self.value)
+
+    def add(self, value):
+        new_total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - new_total) + value
+        else:
+            self.compensation += (value - new_total) + self.total
+        self.total = new_total
+
+    @property
+    def value(self):
+        return self.total + self.compensation
+
+
+class RollingStatistic:
+    """ Represent a statistic of the window last values, updated in O(1) by update(value): add the value of the day
+    and return the statistic (implemented by each statistic)
+
+    Constructor : RollingStatistic(the number of values of the window)
+
+    window: (int) the number of values of the window
+    count: (int) the number of values given to update() since the creation
+    value: (float) the statistic of the values of the window, nan while the window is not full (see ready)
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("the window of a rolling statistic must be at least 1, not {0}".format(window))
+        self.window = window
+        self.count = 0
+        self.value = math.nan
+
+    def __repr__(self):
+        return "<{0}({1}): {2}>".format(self.__class__.__name__, self.window, self.value)
+
+    @property
+    def ready(self):
+        """ True when the window is full """
+        return self.count >= self.window
+
+
+class RollingSum(RollingStatistic):
+    """ Represent the sum of the window last values (compensated sum), base of the statistics computed from sums on
+    the window: the values are stored to be removed from the sums when they leave the window
+
+    values: (deque) the values of the window, the oldest first (at most window values)
+    sum: (CompensatedSum) the sum of the values of the window
+    """
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.values = deque(maxlen=window)
+        self.sum = CompensatedSum()
+
+    def update(self, value):
+        """ Add the value of the day (the oldest value leaves the window if it is full), return the statistic """
+        value = float(value)
+        old_value = self.values[0] if len(self.values) == self.window else None
+        self.values.append(value)
+        self.count += 1
+        self.value = self.push(value, old_value)
+        return self.value
+
+    def push(self, value, old_value):
+        """ Update the sums with the new value and the value leaving the window (None if the window was not full),
+        return the statistic (nan if not ready) """
+        self.sum.add(value)
+        if old_value is not None:
+            self.sum.add(-old_value)
+        return self.sum.value if self.ready else math.nan
+
+
+class RollingMean(RollingSum):
+    """ Represent the mean of the window last values (compensated sum) """
+
+    def push(self, value, old_value):
+        return super().push(value, old_value) / self.window
+
+
+class RollingVariance(RollingSum):
+    """ Represent the variance of the window last values (ddof=1 like statistics.variance, 0 for the population)
+
+    The mean and the sum of the squared deviations are updated when a value enters or leaves the window (Welford), so
+    that the variance of values far from 0 (prices) or trending does not lose its precision. They are computed again
+    from the values of the window once every window values: the rounding errors do not add up on long simulations.
+
+    Constructor : RollingVariance(the number of values of the window, ddof (optional, 1 by default))
+
+    mean: (float) the mean of the window (nan while not ready)
+    squareSum: (float) the sum of the squared deviations from the mean of the values of the window
+    std: (float) the standard deviation of the window (property)
+    """
+
+    def __init__(self, window, ddof=1):
+        super().__init__(window)
+        if window <= ddof:
+            raise ValueError("the window ({0}) of a variance must be bigger than ddof ({1})".format(window, ddof))
+        self.ddof = ddof
+        self.windowMean = 0.
+        self.squareSum = 0.
+        self.mean = math.nan
+
+    def push(self, value, old_value):
+        if self.count % self.window == 0:
+            # computed again from the values of the window (math.fsum: exact sums)
+            self.windowMean = math.fsum(self.values) / len(self.values)
+            self.squareSum = math.fsum((window_value - self.windowMean) ** 2 for window_value in self.values)
+        elif old_value is None:
+            delta = value - self.windowMean
+            self.windowMean += delta / len(self.values)
+            self.squareSum += delta * (value - self.windowMean)
+        else:
+            # old_value is replaced by value: the size of the window does not change
+            old_mean = self.windowMean
+            self.windowMean += (value - old_value) / self.window
+            self.squareSum += (value - old_value) * (value - self.windowMean + old_value - old_mean)
+        if not self.ready:
+            return math.nan
+        self.mean = self.windowMean
+        # max(): the rounding errors can not give a negative variance
+        return max(self.squareSum, 0.) / (self.window - self.ddof)
+
+    @property
+    def std(self):
+        return math.sqrt(self.value)
+
+
+class RollingStd(RollingVariance):
+    """ Represent the standard deviation of the window last values (see RollingVariance) """
+
+    def push(self, value, old_value):
+        return math.sqrt(super().push(value, old_value))
+
+    @property
+    def std(self):
+        return self.value
+
+
+class RollingZScore(RollingVariance):
+    """ Represent the z-score of the last value: (value - mean of the window) / standard deviation of the window
+
+    The window includes the last value. The z-score is 0 when all the values of the window are equal.
+    """
+
+    def push(self, value, old_value):
+        variance = super().push(value, old_value)
+        if not self.ready:
+            return math.nan
+        return (value - self.mean) / math.sqrt(variance) if variance > 0 else 0.
+
+
+class RollingEMA(RollingStatistic):
+    """ Represent the exponential moving average of the values (alpha = 2 / (window + 1), or alpha if given)
+
+    Only the sum of the first values and the last average are stored (not the values). Like commonTools.EMA, it
+    starts with the mean of the window first values.
+
+    Constructor : RollingEMA(the window, alpha (optional))
+    """
+
+    def __init__(self, window, alpha=None):
+        super().__init__(window)
+        self.alpha = alpha if alpha is not None else 2 / (window + 1)
+        self.firstSum = CompensatedSum()
+
+    def update(self, value):
+        value = float(value)
+        self.count += 1
+        if self.count < self.window:
+            self.firstSum.add(value)
+        elif self.count == self.window:
+            self.firstSum.add(value)
+            self.value = self.firstSum.value / self.window
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class RollingMin(RollingStatistic):
+    """ Represent the minimum of the window last values (monotonic deque: amortized O(1) per value)
+
+    The values are not stored, only the candidates
+    candidates: (deque) (number of the value, value) that can still be the minimum, increasing values
+    """
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.candidates = deque()
+
+    def update(self, value):
+        value = float(value)
+        while self.candidates and not self.is_before(self.candidates[-1][1], value):
+            self.candidates.pop()
+        self.candidates.append((self.count, value))
+        self.count += 1
+        if self.candidates[0][0] <= self.count - 1 - self.window:
+            self.candidates.popleft()
+        self.value = self.candidates[0][1] if self.ready else math.nan
+        return self.value
+
+    def is_before(self, candidate, value):
+        """ True if candidate stays before value in the candidates """
+        return candidate < value
+
+
+class RollingMax(RollingMin):
+    """ Represent the maximum of the window last values (see RollingMin), candidates: decreasing values """
+
+    def is_before(self, candidate, value):
+        return candidate > value
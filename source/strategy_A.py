@@ -19,22 +19,24 @@ class GTestStrat2(Strategy):
         data = self.market.get_asset_data(asset)
 
         if self.market.theDay >= self.start_date + self.long_frame and self.market.theDay <= self.start_date+self.length_data:
-            short = moving_average(data, self.short_frame)
-            long = moving_average(data, self.long_frame)
+            # the moving averages are computed once for all the days and shared by the strategies (see Market.indicator)
+            short = self.market.indicator(asset, "sma", (self.short_frame,))[self.market.theDay]
+            long = self.market.indicator(asset, "sma", (self.long_frame,))[self.market.theDay]
             if short > long and self.portfolio.cash > 0:
                 volume = self.portfolio.cash / data[self.market.theDay] - 1
                 self.market.open(self.portfolio, asset, volume, "LONG")
             elif short < long:
-                for position in self.portfolio.openPositionList:
-                    if not position.closed:
-                        self.market.close(position)
+                # all the positions are closed (the first version skipped every other one: it removed them from the
+                # list it was iterating on)
+                for position in self.portfolio.open_positions(asset):
+                    self.market.close(position)
 
 
     def get_returns(self):
         for i in range(self.market.maximumDay):
             self.daily_returns += [0]
         for i in range(self.market.maximumDay):
-            for position in self.portfolio.openPositionList:
+            for position in self.portfolio.openPositions.values():
                 if i == position.openTrade.day:
                     current_position_return = position.get_returns()
                     for j in range(len(current_position_return)):
@@ -68,11 +70,20 @@ if __name__ == "__main__":
         long_opt += [0]
         short_opt += [0]
 
+        # the strategies do nothing before the day k + long_frame: the days before k + 20 are simulated once, then
+        # each (short_frame, long_frame) continues from the snapshot of this day
+        theBacktest.soft_reset()
+        GTestStrat2(theBacktest.market, 5, 20, 300, k, "TEST")
+        theBacktest.simule(first_day=0, last_day=k + 20 - 1, string_mode=False)
+        snapshot = theBacktest.snapshot()
+
         for i in range(5, 20):
             print(k, i, (clock() - beginning_time), "s")
             for j in range(20, 30):
-                stratG = GTestStrat2(theBacktest.market, i, j, 300, k, "TEST")
-                theBacktest.simule(first_day=0, string_mode=False)
+                theBacktest.restore(snapshot)
+                stratG = theBacktest.market.strategyList[0]
+                stratG.short_frame, stratG.long_frame = i, j
+                theBacktest.simule(resume=True, string_mode=False)
                 stratG.get_returns()
                 sharpe = stratG.get_sharpe(0.04)
                 if sharpe > sharpe_max:
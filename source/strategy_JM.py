@@ -1,13 +1,44 @@
-from source.Backtest import *
+from source.dataStore import *
+from source.resultsStore import *
 from mpl_toolkits.mplot3d import Axes3D
 from scipy import interpolate
 import numpy as np
 from matplotlib.widgets import Slider, RadioButtons
-from os import listdir, makedirs
+from os import makedirs
 
 
 # STRATEGIES
 
+def running_mean(data, median, init_day):
+    """ Return the means of the median last values of data, for the days from init_day to the last one
+
+    Same floating point operations as the running sums of JMMobileStrategy.new_day(): the mean of init_day is summed
+    from the last value to the oldest one and divided, then each day adds data[day] / median and subtracts
+    data[day - median] / median (np.cumsum adds in order)
+    """
+    window = np.asarray(data[init_day - median + 1:init_day + 1])
+    first_mean = np.cumsum(window[::-1])[-1] / median
+    steps = np.empty(2 * (len(data) - 1 - init_day) + 1)
+    steps[0] = first_mean
+    steps[1::2] = data[init_day + 1:] / median
+    steps[2::2] = -(data[init_day + 1 - median:len(data) - median] / median)
+    return np.cumsum(steps)[::2]
+
+
+@register_indicator("running_mean")
+def running_mean_indicator(data, first_day, median):
+    """ Indicator (see Market.indicator) of running_mean(): the means from the day max(first_day, median - 1)
+
+    The means depend on their first day (the floating point operations are not the same): first_day is the day
+    when the strategy or the expert initialises its means
+    """
+    values = np.full(len(data), np.nan)
+    init_day = max(first_day, median - 1)
+    if init_day < len(data):
+        values[init_day:] = running_mean(data, median, init_day)
+    return values
+
+
 class JMTendanceStrat(Strategy):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -32,10 +63,10 @@ class JMTestStrat(Strategy):
         if self.market.theDay == 0:
             self.market.open(self.portfolio, the_asset, 1, "LONG")
         if self.market.theDay == 1:
-            self.market.close(self.portfolio.openPositionList[0])
+            self.market.close(self.portfolio.first_open_position())
             self.market.open(self.portfolio, the_asset, 1, "LONG")
         if self.market.theDay == 5:
-            self.market.close(self.portfolio.openPositionList[0])
+            self.market.close(self.portfolio.first_open_position())
 
 
 class JMMobileStrategy(Strategy):
@@ -60,6 +91,9 @@ class JMMobileStrategy(Strategy):
         self.pastShortSum = []
         self.pastLongSum = []
         self.initialised = False
+        self.initDay = None  # the day when the means are initialised (see new_day)
+        self.shortMeans = None  # read-only arrays, one mean per day from initDay (see update_means)
+        self.longMeans = None
 
         if "asset" in temp_kwargs and temp_kwargs["asset"] is not None:
             self.asset = temp_kwargs["asset"]
@@ -67,27 +101,30 @@ class JMMobileStrategy(Strategy):
             self.asset = self.market.assetList[0]
 
     def new_day(self):
-        """ Called each day by the market to ask the expert to make its predictions """
+        """ Called each day by the market to ask the expert to make its predictions
+
+        The means are read from the running means of the market (see Market.indicator), computed once for all the
+        strategies and experts with the same median and the same first day: same values as the running sums
+        computed day by day
+        """
         if self.initialised:
             data = self.market.get_asset_data(self.asset)
 
-            short_sum = self.pastShortSum[-1]
-            long_sum = self.pastLongSum[-1]
-
-            short_sum += data[-1] / self.shortMedian  # -1 because i start at 0
-            short_sum -= data[-1 - self.shortMedian] / self.shortMedian  # -1 because i start at 0
-            long_sum += data[-1] / self.longMedian  # -1 because i start at 0
-            long_sum -= data[-1 - self.longMedian] / self.longMedian  # -1 because i start at 0
+            if self.longMeans is None or self.market.theDay >= len(self.longMeans):
+                # loaded from a checkpoint, or new days were added to the asset (see Market.append_bars)
+                self.update_means()
+            short_sum = self.shortMeans[self.market.theDay]
+            long_sum = self.longMeans[self.market.theDay]
 
             # it's important to close the prediction before opening the new ones
             # UP: if short go under long, we close the previously opened position
             if short_sum < long_sum and self.pastLongSum[-1] < self.pastShortSum[-1] and "UP" in self.typeOfPred:
-                if len(self.portfolio.openPositionList) > 0:
-                    self.market.close(self.portfolio.openPositionList[0])
+                if len(self.portfolio.openPositions) > 0:
+                    self.market.close(self.portfolio.first_open_position())
             # DOWN: if short go above long, we close the previously opened position
             if short_sum > long_sum and self.pastLongSum[-1] > self.pastShortSum[-1] and "DOWN" in self.typeOfPred:
-                if len(self.portfolio.openPositionList) > 0:
-                    self.market.close(self.portfolio.openPositionList[0])
+                if len(self.portfolio.openPositions) > 0:
+                    self.market.close(self.portfolio.first_open_position())
 
             # UP: if short go above long, we open a position
             if short_sum > long_sum and self.pastLongSum[-1] > self.pastShortSum[-1] and "UP" in self.typeOfPred:
@@ -102,19 +139,45 @@ class JMMobileStrategy(Strategy):
         # if it is the first time self.market.theDay > self.longMedian, the median value are initialised
         elif self.market.theDay >= self.longMedian - 1:
             self.initialised = True
-            data = self.market.get_asset_data(self.asset)
-            # print("data sent", data, self.market.theDay)
-            short_sum = 0
-            long_sum = 0
-            for i in range(self.longMedian):
-                # print(-i-1)
-                long_sum += data[-i - 1]  # -1 because i start at 0
-            long_sum /= self.longMedian
-            for i in range(self.shortMedian):
-                short_sum += data[-i - 1]  # -1 because i start at 0
-            short_sum /= self.shortMedian
-            self.pastLongSum.append(long_sum)
-            self.pastShortSum.append(short_sum)
+            self.initDay = self.market.theDay
+            self.update_means()
+            self.pastLongSum.append(self.longMeans[self.initDay])
+            self.pastShortSum.append(self.shortMeans[self.initDay])
+
+    def update_means(self):
+        """ Get the running means from initDay (see Market.indicator), shared with the other strategies and experts """
+        self.shortMeans = self.market.indicator(self.asset, "running_mean", (self.shortMedian,), self.initDay)
+        self.longMeans = self.market.indicator(self.asset, "running_mean", (self.longMedian,), self.initDay)
+
+    def signals(self, first_day):
+        """ Vectorized mode (see Strategy.signals): the same trades as new_day() computed with arrays
+
+        The running means are computed with a cumulative sum of the same additions as new_day() (in the same order),
+        so the crossings found are exactly the same
+        """
+        data = self.market.get_asset_data(self.asset)
+        number_of_days = len(data)
+        opens = np.zeros(number_of_days, dtype=bool)
+        closes = np.zeros(number_of_days, dtype=bool)
+        volumes = 1 / np.asarray(data)
+
+        # the first day where the means are initialised (without trade)
+        init_day = max(first_day, self.longMedian - 1)
+        if init_day + 1 < number_of_days:
+            short_mean = self.market.indicator(self.asset, "running_mean", (self.shortMedian,),
+                                               init_day)[init_day:number_of_days]
+            long_mean = self.market.indicator(self.asset, "running_mean", (self.longMedian,),
+                                              init_day)[init_day:number_of_days]
+            # crossings between the day before and the day (for the days after init_day)
+            cross_up = (short_mean[1:] > long_mean[1:]) & (long_mean[:-1] > short_mean[:-1])
+            cross_down = (short_mean[1:] < long_mean[1:]) & (long_mean[:-1] < short_mean[:-1])
+            if "UP" in self.typeOfPred:
+                closes[init_day + 1:] |= cross_down
+                opens[init_day + 1:] |= cross_up
+            if "DOWN" in self.typeOfPred:
+                closes[init_day + 1:] |= cross_up
+                opens[init_day + 1:] |= cross_down
+        return [(self.asset, opens, closes, volumes)]
 
     def plot_medians(self, offset=0):
         size = min(len(self.pastShortSum) + self.longMedian - 1, len(self.asset.data))
@@ -192,6 +255,9 @@ class JMMobileExpert(Expert):
         self.pastShortSum = []
         self.pastLongSum = []
         self.initialised = False
+        self.initDay = None  # the day when the means are initialised (see new_day)
+        self.shortMeans = None  # read-only arrays, one mean per day from initDay (see update_means)
+        self.longMeans = None
 
         if "asset" in temp_kwargs and temp_kwargs["asset"] is not None:
             self.asset = temp_kwargs["asset"]
@@ -199,27 +265,16 @@ class JMMobileExpert(Expert):
             self.asset = self.market.assetList[0]
 
     def new_day(self):
-        """ Called each day by the market to ask the expert to make its predictions """
-        if self.initialised:
-            data = self.market.get_asset_data(self.asset)
-
-            # old methode, unefficient
-            # short_sum = 0
-            # long_sum = 0
-            # for i in range(self.longMedian):
-            #     long_sum += data[-i - 1]  # -1 because i start at 0
-            # long_sum /= self.longMedian
-            # for i in range(self.shortMedian):
-            #     short_sum += data[-i - 1]  # -1 because i start at 0
-            # short_sum /= self.shortMedian
+        """ Called each day by the market to ask the expert to make its predictions
 
-            short_sum = self.pastShortSum[-1]
-            long_sum = self.pastLongSum[-1]
-
-            short_sum += data[-1] / self.shortMedian  # -1 because i start at 0
-            short_sum -= data[-1 - self.shortMedian] / self.shortMedian  # -1 because i start at 0
-            long_sum += data[-1] / self.longMedian  # -1 because i start at 0
-            long_sum -= data[-1 - self.longMedian] / self.longMedian  # -1 because i start at 0
+        The means are read from the running means of the market (see Market.indicator and JMMobileStrategy.new_day)
+        """
+        if self.initialised:
+            if self.longMeans is None or self.market.theDay >= len(self.longMeans):
+                # loaded from a checkpoint, or new days were added to the asset (see Market.append_bars)
+                self.update_means()
+            short_sum = self.shortMeans[self.market.theDay]
+            long_sum = self.longMeans[self.market.theDay]
 
             pred = ["UP", "DOWN"]
             if short_sum > long_sum and self.pastLongSum[-1] > self.pastShortSum[-1] and "UP" in self.typeOfPred:
@@ -235,19 +290,15 @@ class JMMobileExpert(Expert):
         # if it is the first time self.market.theDay > self.longMedian, the median value are initialised
         elif self.market.theDay >= self.longMedian - 1:
             self.initialised = True
-            data = self.market.get_asset_data(self.asset)
-            # print("data sent", data, self.market.theDay)
-            short_sum = 0
-            long_sum = 0
-            for i in range(self.longMedian):
-                # print(-i-1)
-                long_sum += data[-i - 1]  # -1 because i start at 0
-            long_sum /= self.longMedian
-            for i in range(self.shortMedian):
-                short_sum += data[-i - 1]  # -1 because i start at 0
-            short_sum /= self.shortMedian
-            self.pastLongSum.append(long_sum)
-            self.pastShortSum.append(short_sum)
+            self.initDay = self.market.theDay
+            self.update_means()
+            self.pastLongSum.append(self.longMeans[self.initDay])
+            self.pastShortSum.append(self.shortMeans[self.initDay])
+
+    def update_means(self):
+        """ Get the running means from initDay (see Market.indicator), shared with the other strategies and experts """
+        self.shortMeans = self.market.indicator(self.asset, "running_mean", (self.shortMedian,), self.initDay)
+        self.longMeans = self.market.indicator(self.asset, "running_mean", (self.longMedian,), self.initDay)
 
     def plot_medians(self):
         size = min(len(self.pastShortSum) + self.longMedian - 1, len(self.asset.data))
@@ -339,22 +390,26 @@ class JMRandomExpert(Expert):
 
 # SIMULATION FUNCTION V1
 
-def test_the_mobile_expert(number_of_line, number_of_column, first_day, last_day, print_time=True):
+# the number of couples of medians simulated in the same walk of the market by the test_and_write_several_* functions:
+# the days are played once per batch, the memory used grows with the size of the batch
+BATCH_SIZE = 500
+
+def test_the_mobile_expert(number_of_line, number_of_column, first_day, last_day, print_time=True, batch_size=None):
     """ Return the matrix where M(i, j) is the expected value of an MobileExpert which parameters are
-    longMedain = j+1, shortMedia = i+1, simulated from first_day to last_day """
+    longMedain = j+1, shortMedia = i+1, simulated from first_day to last_day
+
+    batch_size: (int) the number of experts simulated together, all of them if None """
 
     beginning_time = clock()  # for time execution measurement
-    matrix_of_results = np.zeros((number_of_line, number_of_column))
-    for i in range(number_of_line):  # short median
-        # print(i, (clock() - beginning_time), "s")
-        for j in range(number_of_column):  # long median
-            if j > i:
-                JMMobile = JMMobileExpert(theBacktest.market, "MobileExpert", longMedian=j + 1, shortMedian=i + 1)
-                theBacktest.simule(first_day=first_day, last_day=last_day, string_mode=False)
-                theBacktest.soft_reset()
-                matrix_of_results[i, j] = JMMobile.results_description()[4]
-            else:
-                matrix_of_results[i, j] = 0.5
+    matrix_of_results = np.full((number_of_line, number_of_column), 0.5)
+    # all the experts are simulated in one walk of the market (see Backtest.simule_batch)
+    couple_list = [(i, j) for i in range(number_of_line) for j in range(number_of_column) if j > i]
+    the_experts = theBacktest.simule_batch(lambda couple: JMMobileExpert(theBacktest.market, "MobileExpert",
+                                                                         longMedian=couple[1] + 1,
+                                                                         shortMedian=couple[0] + 1),
+                                           couple_list, batch_size=batch_size, first_day=first_day, last_day=last_day)
+    for couple, JMMobile in zip(couple_list, the_experts):
+        matrix_of_results[couple] = JMMobile.results_description()[4]
     if print_time:
         print((clock() - beginning_time), "s")
     return matrix_of_results
@@ -643,8 +698,21 @@ def plot_several_matrix(number_of_line, number_of_column, list_of_results, plot_
 
 # SIMULATION FUNCTION V2
 
-def write_a_prediction_list_on_file(file_name, prediction_list, format_type=0, overwrite=True, first_line=None):
-    """ Receive a prediction list and write a csv with the results, depending of the format """
+def write_a_prediction_list_on_file(file_name, prediction_list, format_type=0, overwrite=True, first_line=None,
+                                    results_writer=None, medians=None):
+    """ Receive a prediction list and write a csv with the results, depending of the format
+
+    If file_name is a ResultsStore, all the columns are added to the store (format_type, overwrite and first_line are
+    ignored), with the medians given (see resultsStore.result_rows)
+    If results_writer (ResultsWriter) is given, the writing is done in its background thread
+    """
+    if isinstance(file_name, ResultsStore):
+        if results_writer is not None:
+            results_writer.write_results(file_name, prediction_list, medians)
+        else:
+            file_name.append(prediction_list, medians)
+        return
+
     data = []
     if format_type == 0:  # [long, short, day, isTrue]       without asset
         for prediction in prediction_list:
@@ -696,24 +764,27 @@ def write_a_prediction_list_on_file(file_name, prediction_list, format_type=0, o
             temp_list = ["NO POSITION", "FOR THIS COUPLE"]
             data.append(temp_list)
 
-    data_writer(file_name, data, overwrite=overwrite, first_line=first_line)
+    if results_writer is not None:
+        results_writer.write_rows(file_name, data, overwrite=overwrite, first_line=first_line)
+    else:
+        data_writer(file_name, data, overwrite=overwrite, first_line=first_line)
 
 
 def test_and_write_several_experts(list_of_medians, file_name,
                                    print_time=True, overwrite=True, format_type=3, asset=None, randomReference=True,
                                    typeOfPred="UP", random_file_name="default_random_file.csv",
                                    numberOfRandPredictions=200, first_day=None, last_day=None,
-                                   prediction_term_type="median"):
-    """  """
-    if overwrite:
-        data_writer(file_name, [])
+                                   prediction_term_type="median", results_writer=None, batch_size=BATCH_SIZE):
+    """ batch_size: (int) the number of couples simulated together (see Backtest.simule_batch) """
+    if overwrite and not isinstance(file_name, ResultsStore):
+        write_a_prediction_list_on_file(file_name, [], format_type=0, results_writer=results_writer)
         if randomReference:
-            data_writer(random_file_name, [])
+            write_a_prediction_list_on_file(random_file_name, [], format_type=0, results_writer=results_writer)
 
     beginning_time = clock()  # for time execution measurement
     i, j = 0, 0
 
-    for couple in list_of_medians:
+    def make_experts(couple):
         if prediction_term_type == "short":
             temp_prediction_term = couple[1]
         elif prediction_term_type == "long":
@@ -727,18 +798,23 @@ def test_and_write_several_experts(list_of_medians, file_name,
         the_expert = JMMobileExpert(theBacktest.market, "MobileExpert",
                                     longMedian=couple[0], shortMedian=couple[1], asset=asset, typeOfPred=typeOfPred,
                                     predictionTerm=temp_prediction_term)
+        the_rand_expert = None
         if randomReference:
             the_rand_expert = JMRandomExpert(theBacktest.market, "RandomExpert",  asset=asset,
                                              numberOfPredictions=numberOfRandPredictions, predictionTerm=temp_prediction_term,
                                              typeOfPred=typeOfPred, first_day=first_day, last_day=last_day)
+        return the_expert, the_rand_expert
 
-        theBacktest.simule(string_mode=False, first_day=first_day, last_day=last_day)
-
+    # the couples are simulated together, batch_size couples per walk of the market (see Backtest.simule_batch)
+    for the_expert, the_rand_expert in theBacktest.simule_batch(make_experts, list_of_medians, batch_size=batch_size,
+                                                                first_day=first_day, last_day=last_day):
         write_a_prediction_list_on_file(file_name, the_expert.predictionMadeList,
-                                        format_type=format_type, overwrite=False)
+                                        format_type=format_type, overwrite=False, results_writer=results_writer)
         if randomReference:
+            # the random reference has no medians
             write_a_prediction_list_on_file(random_file_name, the_rand_expert.predictionMadeList,
-                                            format_type=format_type, overwrite=False)
+                                            format_type=format_type, overwrite=False,
+                                            results_writer=results_writer, medians=NO_MEDIANS)
             if len(the_rand_expert.predictionMadeList) != numberOfRandPredictions:
                 print("!!! WRONG PREDICTION MADE LIST SIZE : ", len(the_rand_expert.predictionMadeList), " !!!")
 
@@ -750,34 +826,29 @@ def test_and_write_several_experts(list_of_medians, file_name,
                 remaining_time = (clock()-beginning_time)*(len(list_of_medians)-j)/j
                 print("{:.1f}% done, still {:.1f}s for".format(100*j/len(list_of_medians), remaining_time),
                       the_expert.asset.name)
-        theBacktest.soft_reset()
     if print_time:
         print("End of {} in {:.1f}s with the prediction type '{}'".format(asset.name, clock() - beginning_time,
                                                                           prediction_term_type))
 
-def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfStep, typeOfPred, prediction_term_type, short_simulation=False):
+def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfStep, typeOfPred, prediction_term_type, short_simulation=False,
+                                results_format="store"):
 
     print("******************** Beggining of the 'do_a_full_expert_simulation' ********************")
 
     # the max day needs to be reinitialised
     theBacktest.hard_reset()
 
-    nameList = []  # 'human' name of the assets
-    fileList = []  # path file of the assets
-    realFileNameNoExtension = []  # path file of the results
-    assetList = []  # list of Asset objects
-    rawFileList = listdir(assetDirectory)
+    # the files are planned with the manifest of the directory: no price is loaded before the simulation
+    entryList = manifest_entries(load_manifest(assetDirectory, "yahoo", ","))
 
     # debug mode
-    # rawFileList = [rawFileList[0]]
+    # entryList = [entryList[0]]
     #
 
-    for name in rawFileList:
-        temp_name = name.split('-')
-        nameList.append(temp_name[0])
-    fileList = [assetDirectory + file for file in rawFileList]
-    for file in zip(fileList, nameList):  # powerful function ! fusion list elem by elem
-        assetList.append(theBacktest.add_asset_from_csv(file[0], "yahoo",  ",", file[1]))
+    nameList = [entry["name"] for entry in entryList]  # 'human' name of the assets
+    fileList = [assetDirectory + entry["file"] for entry in entryList]  # path file of the assets
+    realFileNameNoExtension = []  # path file of the results
+    assetList = []  # list of Asset objects
 
     # for asset in assetList:
     #     theBacktest.market.plot_market(asset)
@@ -815,7 +886,23 @@ def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfSte
     # plt.plot(*zip(*list_of_medians), marker='x', color='b', ls='')
     # plt.show()
 
-    nomberOfDays = min([asset.length for asset in assetList])
+    # the number of days is the length of the calendar common to all the assets (see Market.align_assets)
+    nomberOfDays = len(manifest_calendar(assetDirectory, entryList))
+    if not validate_manifest(entryList, minimum_rows=max(couple[0] for couple in list_of_medians)):
+        print("!!! SOME ASSETS ARE NOT VALID, SEE ABOVE !!!")
+
+    # lazy assets: only the values of the asset being simulated are loaded (see Backtest.add_asset_from_csv)
+    for file in zip(fileList, nameList):  # powerful function ! fusion list elem by elem
+        assetList.append(theBacktest.add_asset_from_csv(file[0], "yahoo", ",", file[1], lazy=True))
+
+    # results_format "store": one columnar file for the whole sweep (see resultsStore.py), "csv": one csv per asset
+    # and per step
+    resultsStore = None
+    if results_format == "store":
+        resultsStore = ResultsStore(resultsDirectory + nameOfTheSimulation + "/results.btr")
+    # the results are written in the background while the next couples are simulated
+    resultsWriter = ResultsWriter()
+
     numberOfDaysInStep = math.floor(nomberOfDays/numberOfStep)
     # print(nomberOfDays, numberOfStep, numberOfDaysInStep*numberOfStep)
     all_beginning_time = clock()  # for time execution measurement
@@ -825,8 +912,13 @@ def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfSte
         print("=============== STEP {}/{} ===============".format(i+1, numberOfStep))
         print("         day {} -> {}".format(first_day, last_day))
         beginning_time = clock()  # for time execution measurement
-        realFileName = [file + "_{}.csv".format(i+1) for file in realFileNameNoExtension]
-        randomFileName = [file + "_{}.csv".format(i+1) for file in randomFileNameNoExtension]
+        if resultsStore is not None:
+            # every result of the sweep goes in the same store, the step is known by the days
+            realFileName = [resultsStore] * len(assetList)
+            randomFileName = [resultsStore] * len(assetList)
+        else:
+            realFileName = [file + "_{}.csv".format(i+1) for file in realFileNameNoExtension]
+            randomFileName = [file + "_{}.csv".format(i+1) for file in randomFileNameNoExtension]
         # print(randomFileName, realFileName)
 
         for file in zip(assetList, realFileName, randomFileName):
@@ -835,7 +927,8 @@ def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfSte
                                            format_type=3, asset=file[0], randomReference=True,
                                            random_file_name=file[2], numberOfRandPredictions=200,
                                            first_day=first_day, last_day=last_day,
-                                           typeOfPred=typeOfPred, prediction_term_type=prediction_term_type)
+                                           typeOfPred=typeOfPred, prediction_term_type=prediction_term_type,
+                                           results_writer=resultsWriter)
         print("--- Step done in {:.1f}s, still {:.1f}s ---".format(clock()-beginning_time,
                                                                   (clock()-all_beginning_time)/(i+1)*(numberOfStep-i-1)))
 
@@ -844,6 +937,9 @@ def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfSte
                                                                                            numberOfStep, typeOfPred,
                                                                                            prediction_term_type)
 
+    resultsWriter.close()
+    if resultsStore is not None:
+        resultsStore.close()
     data_writer(resultsDirectory + nameOfTheSimulation + "/" + filePrefix + "readme.txt", list_of_medians,
                 first_line=first_line)
 
@@ -853,34 +949,42 @@ def do_a_full_expert_simulation(assetDirectory, nameOfTheSimulation, numberOfSte
 def test_and_write_several_MAstrategies(list_of_medians, file_name, print_time=True, overwrite=True,
                                         format_type=3, asset=None, randomReference=True,
                                         typeOfPred="UP", random_file_name="default_random_file.csv",
-                                        numberOfRandPredictions=200, first_day=None, last_day=None):
-    """  """
-    if overwrite:
-        data_writer(file_name, [])
+                                        numberOfRandPredictions=200, first_day=None, last_day=None,
+                                        results_writer=None, batch_size=BATCH_SIZE):
+    """ batch_size: (int) the number of couples simulated together (see Backtest.simule_batch) """
+    if overwrite and not isinstance(file_name, ResultsStore):
+        write_a_prediction_list_on_file(file_name, [], format_type=0, results_writer=results_writer)
         if randomReference:
-            data_writer(random_file_name, [])
+            write_a_prediction_list_on_file(random_file_name, [], format_type=0, results_writer=results_writer)
 
     beginning_time = clock()  # for time execution measurement
     i, j = 0, 0
 
-    for couple in list_of_medians:
+    def make_strategies(couple):
         the_strategy = JMMobileStrategy(theBacktest.market, "MobileExpert-{}-{}".format(couple[0], couple[1]),
                                         longMedian=couple[0], shortMedian=couple[1], asset=asset, typeOfPred=typeOfPred)
 
         # NB here we have a reference that has a prediction_term fixed !
+        the_rand_expert = None
         if randomReference:
             the_rand_expert = JMRandomExpert(theBacktest.market, "RandomExpert",  asset=asset,
                                              numberOfPredictions=numberOfRandPredictions, predictionTerm=50,
                                              typeOfPred=typeOfPred, first_day=first_day, last_day=last_day)
+        return the_strategy, the_rand_expert
 
-        theBacktest.simule(string_mode=False, first_day=first_day, last_day=last_day)
+    # the couples are simulated together, batch_size couples per walk of the market (see Backtest.simule_batch)
+    for the_strategy, the_rand_expert in theBacktest.simule_batch(make_strategies, list_of_medians,
+                                                                  batch_size=batch_size, first_day=first_day,
+                                                                  last_day=last_day):
         # the_strategy.plot_medians()
 
         write_a_prediction_list_on_file(file_name, the_strategy.portfolio.closePositionList,
-                                        format_type=format_type, overwrite=False)
+                                        format_type=format_type, overwrite=False, results_writer=results_writer)
         if randomReference:
+            # the random reference has no medians
             write_a_prediction_list_on_file(random_file_name, the_rand_expert.predictionMadeList,
-                                            format_type=format_type, overwrite=False)
+                                            format_type=format_type, overwrite=False,
+                                            results_writer=results_writer, medians=NO_MEDIANS)
             if len(the_rand_expert.predictionMadeList) != numberOfRandPredictions:
                 print("!!! WRONG PREDICTION MADE LIST SIZE : ", len(the_rand_expert.predictionMadeList), " !!!")
 
@@ -892,34 +996,28 @@ def test_and_write_several_MAstrategies(list_of_medians, file_name, print_time=T
                 remaining_time = (clock()-beginning_time)*(len(list_of_medians)-j)/j
                 print("{:.1f}% done, still {:.1f}s for".format(100*j/len(list_of_medians), remaining_time),
                       the_strategy.asset.name)
-        theBacktest.soft_reset()
     if print_time:
-        print("End of {} in {:.1f}s by the MAStrategy".format(the_strategy.asset.name, clock() - beginning_time))
+        print("End of {} in {:.1f}s by the MAStrategy".format(asset.name, clock() - beginning_time))
 
-def do_a_full_strategy_simulation(assetDirectory, nameOfTheSimulation, numberOfStep, typeOfPred, short_simulation=False):
+def do_a_full_strategy_simulation(assetDirectory, nameOfTheSimulation, numberOfStep, typeOfPred, short_simulation=False,
+                                  results_format="store"):
 
     print("******************** Beggining of the 'do_a_full_strategy_simulation' ********************")
 
     # the max day needs to be reinitialised
     theBacktest.hard_reset()
 
-    nameList = []  # 'human' name of the assets
-    fileList = []  # path file of the assets
-    realFileNameNoExtension = []  # path file of the results
-    assetList = []  # list of Asset objects
-    rawFileList = listdir(assetDirectory)
+    # the files are planned with the manifest of the directory: no price is loaded before the simulation
+    entryList = manifest_entries(load_manifest(assetDirectory, "yahoo", ","))
 
     # debug mode
-    # rawFileList = [rawFileList[0]]
+    # entryList = [entryList[0]]
     #
 
-
-    for name in rawFileList:
-        temp_name = name.split('-')
-        nameList.append(temp_name[0])
-    fileList = [assetDirectory + file for file in rawFileList]
-    for file in zip(fileList, nameList):  # powerful function ! fusion list elem by elem
-        assetList.append(theBacktest.add_asset_from_csv(file[0], "yahoo",  ",", file[1]))
+    nameList = [entry["name"] for entry in entryList]  # 'human' name of the assets
+    fileList = [assetDirectory + entry["file"] for entry in entryList]  # path file of the assets
+    realFileNameNoExtension = []  # path file of the results
+    assetList = []  # list of Asset objects
 
     # for asset in assetList:
     #     theBacktest.market.plot_market(asset)
@@ -957,7 +1055,23 @@ def do_a_full_strategy_simulation(assetDirectory, nameOfTheSimulation, numberOfS
     # plt.plot(*zip(*list_of_medians), marker='x', color='b', ls='')
     # plt.show()
 
-    nomberOfDays = min([asset.length for asset in assetList])
+    # the number of days is the length of the calendar common to all the assets (see Market.align_assets)
+    nomberOfDays = len(manifest_calendar(assetDirectory, entryList))
+    if not validate_manifest(entryList, minimum_rows=max(couple[0] for couple in list_of_medians)):
+        print("!!! SOME ASSETS ARE NOT VALID, SEE ABOVE !!!")
+
+    # lazy assets: only the values of the asset being simulated are loaded (see Backtest.add_asset_from_csv)
+    for file in zip(fileList, nameList):  # powerful function ! fusion list elem by elem
+        assetList.append(theBacktest.add_asset_from_csv(file[0], "yahoo", ",", file[1], lazy=True))
+
+    # results_format "store": one columnar file for the whole sweep (see resultsStore.py), "csv": one csv per asset
+    # and per step
+    resultsStore = None
+    if results_format == "store":
+        resultsStore = ResultsStore(resultsDirectory + nameOfTheSimulation + "/results.btr")
+    # the results are written in the background while the next couples are simulated
+    resultsWriter = ResultsWriter()
+
     numberOfDaysInStep = math.floor(nomberOfDays/numberOfStep)
     # print(nomberOfDays, numberOfStep, numberOfDaysInStep*numberOfStep)
     all_beginning_time = clock()  # for time execution measurement
@@ -967,8 +1081,13 @@ def do_a_full_strategy_simulation(assetDirectory, nameOfTheSimulation, numberOfS
         print("=============== STEP {}/{} ===============".format(i+1, numberOfStep))
         print("         day {} -> {}".format(first_day, last_day))
         beginning_time = clock()  # for time execution measurement
-        realFileName = [file + "_{}.csv".format(i+1) for file in realFileNameNoExtension]
-        randomFileName = [file + "_{}.csv".format(i+1) for file in randomFileNameNoExtension]
+        if resultsStore is not None:
+            # every result of the sweep goes in the same store, the step is known by the days
+            realFileName = [resultsStore] * len(assetList)
+            randomFileName = [resultsStore] * len(assetList)
+        else:
+            realFileName = [file + "_{}.csv".format(i+1) for file in realFileNameNoExtension]
+            randomFileName = [file + "_{}.csv".format(i+1) for file in randomFileNameNoExtension]
         # print(randomFileName, realFileName)
 
         for file in zip(assetList, realFileName, randomFileName):
@@ -977,13 +1096,17 @@ def do_a_full_strategy_simulation(assetDirectory, nameOfTheSimulation, numberOfS
                                                format_type=3, asset=file[0], randomReference=True,
                                                random_file_name=file[2], numberOfRandPredictions=200,
                                                first_day=first_day, last_day=last_day,
-                                               typeOfPred=typeOfPred)
+                                               typeOfPred=typeOfPred,
+                                               results_writer=resultsWriter)
         print("--- Step done in {:.1f}s, still {:.1f}s ---".format(clock()-beginning_time,
                                                                   (clock()-all_beginning_time)/(i+1)*(numberOfStep-i-1)))
 
     first_line = "this simulation was made with the following " \
                  "medians in {:.1f}s in {} steps and {}".format(clock() - all_beginning_time, numberOfStep, typeOfPred)
 
+    resultsWriter.close()
+    if resultsStore is not None:
+        resultsStore.close()
     data_writer(resultsDirectory + nameOfTheSimulation + "/" + filePrefix + "readme.txt", list_of_medians,
                 first_line=first_line)
 
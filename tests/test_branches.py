@@ -0,0 +1,53 @@
+import os
+from source.Backtest import Backtest
+from source.strategy_JM import JMMobileStrategy, JMMobileExpert
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+def ibm_backtest():
+    backtest = Backtest()
+    backtest.add_asset_from_csv(IBM_PATH, "yahoo", ",", "IBM", use_cache=False)
+    return backtest
+
+
+def add_instances(market, long_median=50, short_median=10):
+    JMMobileStrategy(market, "strategy", longMedian=long_median, shortMedian=short_median, typeOfPred="UP")
+    JMMobileExpert(market, "expert", longMedian=long_median, shortMedian=short_median)
+
+
+def market_state(market):
+    """ The results of the portfolios and experts of a market """
+    return ([(portfolio.cash, list(portfolio.valueHistory), portfolio.results_description())
+             for portfolio in market.portfolioList],
+            [[(prediction.day, prediction.isTrue, prediction.result) for prediction in expert.predictionMadeList]
+             for expert in market.expertList],
+            [(prediction.day, prediction.final_term) for prediction in market.predictionList])
+
+
+def test_branches_same_as_full_run():
+    """ The branches restored from a snapshot continue like a simulation of all the days, without changing the
+    snapshot nor the other branches """
+    backtest = ibm_backtest()
+    add_instances(backtest.market)
+    backtest.simule(first_day=0, last_day=3000, string_mode=False, plot_mode=False)
+    full_run = market_state(backtest.market)
+
+    backtest.soft_reset()
+    add_instances(backtest.market)
+    backtest.simule(first_day=0, last_day=1500, string_mode=False, plot_mode=False)
+    snapshot = backtest.snapshot()
+    snapshot_state = market_state(snapshot)
+
+    other_branch = backtest.restore(snapshot)
+    other_branch.strategyList[0].portfolio.cash = 0
+    backtest.simule(resume=True, last_day=2000, string_mode=False, plot_mode=False)
+    assert market_state(snapshot) == snapshot_state
+
+    branch = backtest.restore(snapshot)
+    assert branch.theDay == snapshot.theDay == 1501
+    assert branch.strategyList[0].portfolio is not snapshot.strategyList[0].portfolio
+    backtest.simule(resume=True, last_day=3000, string_mode=False, plot_mode=False)
+    assert market_state(branch) == full_run
+    assert market_state(snapshot) == snapshot_state
+    assert other_branch.theDay == 2001
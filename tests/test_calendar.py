@@ -0,0 +1,46 @@
+import numpy as np
+from source.Market import Market, Asset
+
+
+def dates(*days):
+    return np.array(["2020-01-{0:02d}".format(day) for day in days], dtype="datetime64[D]")
+
+
+def two_asset_market(how="intersection"):
+    market = Market()
+    market.calendarMode = how
+    market.register_asset(Asset("A", [1., 2., 3., 4., 5.], dates=dates(1, 2, 3, 6, 7)))
+    market.register_asset(Asset("B", [10., 20., 30., 40.], dates=dates(2, 3, 4, 7)))
+    return market
+
+
+def test_align_intersection():
+    """ The calendar is the days quoted by every asset """
+    market = two_asset_market("intersection")
+    assert market.maximumDay == 2
+    assert np.array_equal(market.calendar, dates(2, 3, 7))
+    assert market.assetList[0].data.tolist() == [2., 3., 5.]
+    assert market.assetList[1].data.tolist() == [10., 20., 40.]
+    assert market.get_day(np.datetime64("2020-01-03")) == 1
+
+
+def test_align_union():
+    """ The calendar is the days quoted by one asset between the common first and last days, the missing values are
+    the previous ones """
+    market = two_asset_market("union")
+    assert market.maximumDay == 4
+    assert np.array_equal(market.calendar, dates(2, 3, 4, 6, 7))
+    assert market.assetList[0].data.tolist() == [2., 3., 3., 4., 5.]
+    assert market.assetList[1].data.tolist() == [10., 20., 30., 30., 40.]
+
+
+def test_align_unsorted_dates(capsys):
+    """ An asset with unsorted dates can not be aligned on a calendar: all the assets are aligned by position """
+    market = Market()
+    market.register_asset(Asset("A", [1., 2., 3., 4.], dates=dates(1, 3, 2, 4)))
+    market.register_asset(Asset("B", [10., 20., 30.], dates=dates(1, 2, 3)))
+    assert market.maximumDay == 2
+    assert "ALIGNED BY POSITION" in capsys.readouterr().out
+    assert market.calendar is None
+    assert market.assetList[0].data.tolist() == [1., 2., 3., 4.]
+    assert market.assetList[1].data.tolist() == [10., 20., 30.]
@@ -0,0 +1,69 @@
+import os
+import pytest
+from source.Backtest import Backtest
+from source.Market import Asset
+from source.checkpoint import save_checkpoint, load_checkpoint, checkpoint_info
+from test_branches import ibm_backtest, add_instances, market_state
+
+
+def test_checkpoint_resume_same_as_full_run(tmp_path):
+    """ A simulation saved in a checkpoint and continued in a new backtest gives the results of a full run """
+    backtest = ibm_backtest()
+    add_instances(backtest.market)
+    backtest.simule(first_day=0, last_day=3000, string_mode=False, plot_mode=False)
+    full_run = market_state(backtest.market)
+
+    file_name = str(tmp_path / "state.btc")
+    backtest = ibm_backtest()
+    add_instances(backtest.market)
+    backtest.simule(first_day=0, last_day=2000, string_mode=False, plot_mode=False)
+    save_checkpoint(backtest.market, file_name)
+    info = checkpoint_info(file_name)
+    assert (info["theDay"], info["strategies"], info["experts"]) == (2001, 1, 1)
+
+    new_backtest = ibm_backtest()
+    market = load_checkpoint(file_name, new_backtest)
+    assert new_backtest.market is market and market.theDay == 2001
+    new_backtest.simule(resume=True, last_day=3000, string_mode=False, plot_mode=False)
+    assert market_state(market) == full_run
+
+
+def test_checkpoint_new_days(tmp_path):
+    """ The days added after a checkpoint (the next daily run) are simulated like in a full run """
+    full_asset = ibm_backtest().market.assetList[0]
+    values, dates = full_asset.data[:3001], full_asset.dates[:3001]
+
+    backtest = Backtest()
+    backtest.market.register_asset(Asset("IBM", values, dates=dates))
+    add_instances(backtest.market)
+    backtest.simule(string_mode=False, plot_mode=False)
+    full_run = market_state(backtest.market)
+
+    file_name = str(tmp_path / "state.btc")
+    backtest = Backtest()
+    backtest.market.register_asset(Asset("IBM", values[:2001], dates=dates[:2001]))
+    add_instances(backtest.market)
+    backtest.simule(string_mode=False, plot_mode=False)
+    save_checkpoint(backtest.market, file_name)
+
+    new_backtest = Backtest()
+    new_backtest.market.register_asset(Asset("IBM", values[:2001], dates=dates[:2001]))
+    market = load_checkpoint(file_name, new_backtest)
+    market.append_bars(market.assetList[0], values[2001:], dates[2001:])
+    new_backtest.simule(resume=True, string_mode=False, plot_mode=False)
+    assert market_state(market) == full_run
+
+
+def test_checkpoint_other_days(tmp_path):
+    """ A checkpoint can not be continued on a market whose first days are different """
+    full_asset = ibm_backtest().market.assetList[0]
+    backtest = Backtest()
+    backtest.market.register_asset(Asset("IBM", full_asset.data[:2001], dates=full_asset.dates[:2001]))
+    add_instances(backtest.market)
+    backtest.simule(string_mode=False, plot_mode=False)
+    save_checkpoint(backtest.market, str(tmp_path / "state.btc"))
+
+    new_backtest = Backtest()
+    new_backtest.market.register_asset(Asset("IBM", full_asset.data[1:3001], dates=full_asset.dates[1:3001]))
+    with pytest.raises(ValueError):
+        load_checkpoint(str(tmp_path / "state.btc"), new_backtest)
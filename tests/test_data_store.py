@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from source.Market import Market, Asset
+from source.dataStore import Panel, write_panel, load_panel
+
+
+def mixed_market():
+    """ Two assets of different fields (from csv of different formats) """
+    market = Market()
+    dates = np.array(["2020-01-01", "2020-01-02", "2020-01-03"], dtype="datetime64[D]")
+    market.register_asset(Asset("IBM", [1., 2., 3.], default_field="close", dates=dates))
+    market.register_asset(Asset("BTC", [10., 20., 30.], default_field="price", dates=dates))
+    return market
+
+
+def test_panel_round_trip(tmp_path):
+    """ The field and the format of each asset are recorded in the panel and given back by load_panel """
+    panel_name = str(tmp_path / "assets.panel")
+    write_panel(panel_name, mixed_market(), formats=["yahoo", "investing"])
+
+    panel = Panel(panel_name)
+    assert panel.names == ["IBM", "BTC"]
+    assert panel.fields == ["close", "price"]
+    assert panel.formats == ["yahoo", "investing"]
+    assert panel.get_column("BTC").tolist() == [10., 20., 30.]
+
+    market = Market()
+    ibm, btc = load_panel(market, panel_name)
+    assert (ibm.defaultField, btc.defaultField) == ("close", "price")
+    assert market.maximumDay == 2
+    assert ibm.data.tolist() == [1., 2., 3.]
+    assert np.array_equal(market.calendar, panel.calendar)
+
+
+def test_panel_wrong_number_of_formats(tmp_path):
+    with pytest.raises(ValueError):
+        write_panel(str(tmp_path / "assets.panel"), mixed_market(), formats=["yahoo"])
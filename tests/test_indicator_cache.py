@@ -0,0 +1,22 @@
+import os
+import numpy as np
+from source.Backtest import Backtest
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+def test_indicator_budget():
+    """ The indicators of a market with a budget are removed when the budget is exceeded, and computed again """
+    backtest = Backtest(indicator_budget=3 * 10097 * 8)
+    asset = backtest.add_asset_from_csv(IBM_PATH, "yahoo", ",", "IBM", use_cache=False)
+    cache = backtest.market.indicatorCache
+    first = np.array(backtest.market.indicator(asset, "sma", (10,)))
+    for window in range(20, 70, 10):
+        backtest.market.indicator(asset, "sma", (window,))
+    assert cache.size <= cache.budget
+    assert len(cache.indicators) == 3 and cache.evictions == 3
+    assert np.array_equal(backtest.market.indicator(asset, "sma", (10,)), first, equal_nan=True)
+    assert cache.misses == 7
+
+    backtest.hard_reset()
+    assert backtest.market.indicatorCache.budget == 3 * 10097 * 8
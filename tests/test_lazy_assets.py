@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from source.Backtest import Backtest
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data")
+NAMES = ["IBM_1970_2010", "GS", "SPY"]
+
+
+def add_assets(backtest, lazy):
+    return [backtest.add_asset_from_csv(os.path.join(DATA_PATH, "{0}_yahoo.csv".format(name)), "yahoo", ",",
+                                        name, use_cache=False, lazy=lazy) for name in NAMES]
+
+
+def test_lazy_assets_under_budget():
+    """ The lazy assets are loaded on first access, the least recently used is unloaded when the budget is exceeded
+    and loaded again with the same values """
+    backtest = Backtest()
+    assets = add_assets(backtest, lazy=False)
+    assert backtest.market.maximumDay == 1503  # the assets are aligned on the common days
+    expected = [asset.data.copy() for asset in assets]
+
+    backtest = Backtest(memory_budget=60000)
+    assets = add_assets(backtest, lazy=True)
+    assert not any(asset.is_loaded() for asset in assets)
+    assert backtest.market.maximumDay == 1503  # only the dates are needed to align the assets
+    assert not any(asset.is_loaded() for asset in assets)
+
+    for asset, values in zip(assets, expected):
+        assert np.array_equal(asset.data, values)
+    memory = backtest.market.assetMemory
+    assert memory.size <= memory.budget
+    assert memory.evictions > 0 and not assets[0].is_loaded() and assets[-1].is_loaded()
+
+    assert np.array_equal(assets[0].data, expected[0])
+    assert assets[0].is_loaded()
+    assert memory.loads == len(assets) + 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from source.Market import Market, Asset
+from source.leadLagTools import lead_lag_scan, rolling_lead_lag_scan
+
+
+def lagged_series():
+    """ Three random walks around 1000: the second one follows the first with 3 days, the third one is independent """
+    random_state = np.random.RandomState(1)
+    first = 1000 + np.cumsum(random_state.normal(0, 1, 600))
+    second = np.concatenate([first[:3], first[:-3]]) + random_state.normal(0, 0.3, 600)
+    third = 1000 + np.cumsum(random_state.normal(0, 1, 600))
+    return np.vstack([first, second, third])
+
+
+def corrcoef(data1, data2, start, time_frame, time_shift):
+    """ commonTools.correlation, nan if the shift is out of the data """
+    if start + time_shift < 0 or start + time_frame + time_shift > len(data2):
+        return np.nan
+    return np.corrcoef(data1[start:start + time_frame], data2[start + time_shift:start + time_frame + time_shift])[0, 1]
+
+
+def test_lead_lag_same_as_corrcoef():
+    """ The correlation of each pair and each shift is the one of np.corrcoef, even out of the data (nan) """
+    data = np.diff(lagged_series(), axis=1)
+    pairs, lags, matrix = lead_lag_scan(data, 10, time_frame=300, start=5)
+    assert pairs == [(0, 1), (0, 2), (1, 2)] and lags.tolist() == list(range(-10, 11))
+    for p, (i, j) in enumerate(pairs):
+        expected = [corrcoef(data[i], data[j], 5, 300, lag) for lag in lags.tolist()]
+        assert np.allclose(matrix[p], expected, rtol=0, atol=1e-9, equal_nan=True)
+    assert np.all(np.isnan(matrix[:, :5]))
+    assert lags[np.nanargmax(matrix[0])] == 3
+
+
+def test_rolling_lead_lag_same_as_windows():
+    data = lagged_series()
+    pairs, lags, starts, matrix = rolling_lead_lag_scan(data, 5, 100, step=50)
+    assert starts.tolist() == list(range(5, 600 - 100 - 5 + 1, 50))
+    for w, start in enumerate(starts.tolist()):
+        assert np.allclose(matrix[w], lead_lag_scan(data, 5, 100, start)[2], rtol=0, atol=1e-9)
+        assert np.allclose(matrix[w, 1], [corrcoef(data[0], data[2], start, 100, lag) for lag in lags.tolist()],
+                           rtol=0, atol=1e-9)
+
+
+def test_market_lead_lag():
+    """ The market scans the returns of its assets """
+    market = Market()
+    for name, values in zip("ABC", lagged_series()):
+        market.register_asset(Asset(name, values))
+    asset_pairs, lags, matrix = market.lead_lag(5, use_returns=True)
+    assert [(first.name, second.name) for first, second in asset_pairs] == [("A", "B"), ("A", "C"), ("B", "C")]
+    assert lags[np.nanargmax(matrix[0])] == 3
+    with pytest.raises(ValueError):
+        market.lead_lag(5, step=10)
@@ -0,0 +1,78 @@
+import os
+from source.Backtest import Backtest
+from source.strategy_JM import JMMobileStrategy, JMMobileExpert
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+def ibm_backtest():
+    backtest = Backtest()
+    backtest.add_asset_from_csv(IBM_PATH, "yahoo", ",", "IBM", use_cache=False)
+    return backtest
+
+
+def test_results_description_after_soft_reset():
+    """ The results of a portfolio are read from its own ledger, not from the one of the market after a reset """
+    backtest = ibm_backtest()
+    strategy = JMMobileStrategy(backtest.market, name="first", longMedian=50, shortMedian=10, typeOfPred="UP")
+    backtest.simule(string_mode=False, plot_mode=False)
+    results = strategy.portfolio.results_description()
+    gains = [position.gain for position in strategy.portfolio.closePositionList]
+    assert results[2] == sum(gain >= 0 for gain in gains)
+
+    backtest.soft_reset()
+    assert strategy.portfolio.results_description() == results
+
+    other_strategy = JMMobileStrategy(backtest.market, name="second", longMedian=60, shortMedian=20, typeOfPred="UP")
+    backtest.simule(string_mode=False, plot_mode=False)
+    assert strategy.portfolio.results_description() == results
+    assert other_strategy.portfolio.results_description() != results
+
+
+def test_simule_batch_results_description():
+    """ The strategies and experts yielded by simule_batch (reset after their batch) give the results of one
+    simulation per parameter """
+    grid = [(50, 10), (60, 20), (200, 20)]
+    backtest = ibm_backtest()
+    expected = []
+    for long_median, short_median in grid:
+        strategy = JMMobileStrategy(backtest.market, name="strategy", longMedian=long_median,
+                                    shortMedian=short_median, typeOfPred="UP")
+        expert = JMMobileExpert(backtest.market, name="expert", longMedian=long_median, shortMedian=short_median)
+        backtest.simule(string_mode=False, plot_mode=False)
+        expected.append((strategy.portfolio.results_description(), expert.results_description()))
+        backtest.soft_reset()
+
+    def make_instances(medians):
+        long_median, short_median = medians
+        return (JMMobileStrategy(backtest.market, name="strategy", longMedian=long_median, shortMedian=short_median,
+                                 typeOfPred="UP"),
+                JMMobileExpert(backtest.market, name="expert", longMedian=long_median, shortMedian=short_median))
+
+    instances = list(backtest.simule_batch(make_instances, grid, batch_size=2))
+    assert [(strategy.portfolio.results_description(), expert.results_description())
+            for strategy, expert in instances] == expected
+
+
+def test_simule_batch_store_medians(tmp_path):
+    """ The rows written in a ResultsStore while simule_batch yields its instances carry their own medians """
+    import numpy as np
+    import source.strategy_JM as strategy_JM
+    from source.resultsStore import ResultsStore, read_results
+
+    strategy_JM.theBacktest = backtest = ibm_backtest()
+    store = ResultsStore(str(tmp_path / "strategies.btr"))
+    random_store = ResultsStore(str(tmp_path / "random.btr"))
+    strategy_JM.test_and_write_several_MAstrategies([[50, 10], [60, 20], [200, 20]], store, print_time=False,
+                                                    asset=backtest.market.assetList[0], random_file_name=random_store,
+                                                    numberOfRandPredictions=20, first_day=0, last_day=3000,
+                                                    batch_size=2)
+    store.close()
+    random_store.close()
+
+    results = read_results(str(tmp_path / "strategies.btr"))
+    medians = set(zip(results["long"].tolist(), results["short"].tolist()))
+    assert medians == {(50, 10), (60, 20), (200, 20)}
+    random_results = read_results(str(tmp_path / "random.btr"))
+    assert len(random_results["long"]) == 3 * 20
+    assert np.all(random_results["long"] == -1) and np.all(random_results["short"] == -1)
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from source.commonTools import SMA, EMA
+from source.dataParsers import get_parser
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+def ibm_values():
+    return get_parser("yahoo").parse(IBM_PATH, ["close"])["close"]
+
+
+def test_sma_matrix_same_as_windows():
+    """ Each row of the SMA matrix is the mean of the sliding windows of its size """
+    values = ibm_values()
+    matrix = SMA(values, None, 10, 60)
+    assert matrix.shape == (51, len(values))
+    for row, window in enumerate(range(10, 61)):
+        assert np.all(np.isnan(matrix[row, :window - 1]))
+        assert np.allclose(matrix[row, window - 1:], sliding_window_view(values, window).mean(axis=1),
+                           rtol=1e-10, atol=0)
+
+
+def test_sma_first_values():
+    values = np.arange(1., 21.)
+    matrix = SMA(values.tolist(), 12, 2, 5)
+    assert matrix.shape == (4, 12)
+    assert matrix[0, 1] == 1.5 and matrix[3, 11] == 10.
+    assert np.all(np.isnan(SMA(values, 3, 5, 10)))
+
+
+def test_ema_matrix_same_as_loop():
+    """ Each row of the EMA matrix starts with the mean of the first values of its window, then alpha = 2/(p+1) """
+    values = ibm_values()[:2000]
+    matrix = EMA(values, None, 10, 30)
+    for row, window in enumerate(range(10, 31)):
+        alpha = 2 / (window + 1)
+        expected = np.full(len(values), np.nan)
+        expected[window - 1] = values[:window].mean()
+        for day in range(window, len(values)):
+            expected[day] = expected[day - 1] + alpha * (values[day] - expected[day - 1])
+        assert np.allclose(matrix[row], expected, rtol=1e-10, atol=0, equal_nan=True)
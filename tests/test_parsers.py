@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from source.dataParsers import PARSER_REGISTRY, DATE_FIELD, get_parser, sniff_parser
+
+# one small file per registered format: (name of the parser, delimiter, content), the values of the default field
+# are 1, 2, 3 from the oldest day (2020-01-01) to the newest one
+FILES = {
+    "yahoo": (",", "Date,Open,High,Low,Close,Volume,Adj Close\n"
+                   "2020-01-03,0,0,0,30,300,3\n2020-01-02,0,0,0,20,200,2\n2020-01-01,0,0,0,10,100,1\n"),
+    "ltc": (",", "Date,Low,High,Open,Close,Volume\n"
+                 "2020-01-03,0,0,0,3,300\n2020-01-02,0,0,0,2,200\n2020-01-01,0,0,0,1,100\n"),
+    "investing": (",", "date,close,open,high,low,change\n"
+                       "03/01/2020,3,0,0,0,-0.49%\n02/01/2020,2,0,0,0,-\n01/01/2020,1,0,0,0,1.5%\n"),
+    "propre": (";", "01/01/2020;1\n02/01/2020;2\n03/01/2020;3"),
+}
+
+
+def write_file(tmp_path, name):
+    path_name = str(tmp_path / "{0}.csv".format(name))
+    with open(path_name, "w") as file:
+        file.write(FILES[name][1])
+    return path_name
+
+
+def test_every_format_is_tested():
+    assert set(FILES) == set(PARSER_REGISTRY)
+
+
+@pytest.mark.parametrize("name", sorted(FILES))
+def test_sniff_and_parse(tmp_path, name):
+    """ Each format is recognized by sniff_parser and parsed from the oldest day, with its dates """
+    path_name = write_file(tmp_path, name)
+    assert sniff_parser(path_name) == (name, FILES[name][0])
+
+    parser = get_parser(name)
+    columns = parser.parse(path_name, [parser.default, DATE_FIELD], FILES[name][0])
+    assert columns[parser.default].tolist() == [1., 2., 3.]
+    assert columns[DATE_FIELD].tolist() == np.arange("2020-01-01", "2020-01-04", dtype="datetime64[D]").tolist()
+
+
+def test_propre_comma_and_day_numbers(tmp_path):
+    """ A propre file with ',' (BTC_daily.csv) is sniffed, a file of day numbers has no dates """
+    path_name = str(tmp_path / "days.csv")
+    with open(path_name, "w") as file:
+        file.write("0,100\n1,101\n2,99\n")
+    assert sniff_parser(path_name) == ("propre", ",")
+    columns = get_parser("propre").parse(path_name, ["close", DATE_FIELD], ",")
+    assert columns["close"].tolist() == [100., 101., 99.]
+    assert columns[DATE_FIELD] is None
+
+
+def test_investing_change(tmp_path):
+    """ The percents of the change are divided by 100, "-" is nan """
+    columns = get_parser("investing").parse(write_file(tmp_path, "investing"), ["change"])
+    assert columns["change"][0] == pytest.approx(0.015)
+    assert np.isnan(columns["change"][1])
+    assert columns["change"][2] == pytest.approx(-0.0049)
+
+
+def test_unknown_format(tmp_path):
+    path_name = str(tmp_path / "unknown.csv")
+    with open(path_name, "w") as file:
+        file.write("a,b,c\n1,2,3\n")
+    with pytest.raises(ValueError):
+        sniff_parser(path_name)
+    with pytest.raises(ValueError):
+        get_parser("unknown")
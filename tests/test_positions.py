@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from source.Backtest import Backtest
+from source.Market import Asset, Strategy
+
+VALUES = 100 + 10 * np.sin(np.arange(40) / 3)
+
+
+class ScriptStrategy(Strategy):
+    """ Opens a position the day 5 (closed the day 12), one the day 8 (closed the day 20), and one the day 15 (never
+    closed) """
+
+    def new_day(self):
+        asset = self.market.assetList[0]
+        day = self.market.theDay
+        if day in (5, 15):
+            self.market.open(self.portfolio, asset, 2, "LONG")
+        elif day == 8:
+            self.market.open(self.portfolio, asset, 3, "LONG")
+        elif day in (12, 20):
+            self.market.close(self.portfolio.open_positions(asset)[0])
+
+
+@pytest.mark.parametrize("deferred_valuation", [False, True])
+def test_position_value_history(deferred_valuation):
+    """ The valueHistory of a position is the volume x the values of the asset from its opening day to its closing
+    day (or to the last day simulated) """
+    backtest = Backtest()
+    backtest.market.register_asset(Asset("sinus", VALUES))
+    strategy = ScriptStrategy(backtest.market, "script")
+    backtest.simule(first_day=0, last_day=30, string_mode=False, plot_mode=False,
+                    deferred_valuation=deferred_valuation)
+
+    first, second = strategy.portfolio.closePositionList
+    (third,) = strategy.portfolio.open_positions(backtest.market.assetList[0])
+    assert np.array_equal(first.valueHistory, 2 * VALUES[5:13])
+    assert np.array_equal(second.valueHistory, 3 * VALUES[8:21])
+    assert np.array_equal(third.valueHistory, 2 * VALUES[15:31])
+    assert strategy.portfolio.lastDay == 30
+
+    assert np.allclose(first.get_returns(), VALUES[6:13] / VALUES[5:12] - 1)
+    assert np.allclose(third.get_returns(), VALUES[16:31] / VALUES[15:30] - 1)
@@ -0,0 +1,43 @@
+import numpy as np
+from source.Backtest import Backtest
+from source.Market import Asset, Expert, Prediction
+
+
+class TermExpert(Expert):
+    """ Predicts UP every day with the terms 1, 3 and 7, and records the day each prediction is verified """
+
+    def __init__(self, market, name="term expert"):
+        Expert.__init__(self, market, name)
+        self.verificationDays = []
+
+    def new_day(self):
+        for term in (7, 1, 3):
+            Prediction(self.market.assetList[0], "UP", self.market.theDay + term, self, self.market.theDay,
+                       self.market)
+
+    def prediction_result(self, prediction):
+        Expert.prediction_result(self, prediction)
+        self.verificationDays.append(self.market.theDay)
+
+
+def test_predictions_checked_on_their_term():
+    """ Each prediction is checked the day of its final_term, the ones after the last day stay pending """
+    values = 100 + 10 * np.sin(np.arange(60))
+    backtest = Backtest()
+    backtest.market.register_asset(Asset("sinus", values))
+    expert = TermExpert(backtest.market)
+    backtest.simule(first_day=0, last_day=40, string_mode=False, plot_mode=False)
+
+    checked = expert.predictionMadeList
+    assert [prediction.final_term for prediction in checked] == expert.verificationDays
+    assert expert.verificationDays == sorted(expert.verificationDays)
+    for prediction in checked:
+        assert prediction.result == values[prediction.final_term] / values[prediction.day]
+        assert prediction.isTrue == (values[prediction.final_term] > values[prediction.day])
+
+    pending = backtest.market.predictionList
+    assert [prediction.id for prediction in pending] == sorted(prediction.id for prediction in pending)
+    # theDay is the day after the last day simulated
+    assert all(prediction.final_term >= backtest.market.theDay for prediction in pending)
+    assert len(checked) + len(pending) == 3 * len({prediction.day for prediction in list(checked) + pending})
+    assert max(backtest.market.pendingPredictions) - backtest.market.theDay < 7
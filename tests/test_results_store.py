@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pytest
+from source.Backtest import Backtest
+from source.strategy_JM import JMMobileStrategy, JMMobileExpert, JMRandomExpert, write_a_prediction_list_on_file
+from source.resultsStore import ResultsStore, ResultsWriter, NO_MEDIANS, read_results, result_rows
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+@pytest.fixture(scope="module")
+def simulation():
+    """ A strategy, an expert and a random reference simulated on IBM """
+    backtest = Backtest()
+    asset = backtest.add_asset_from_csv(IBM_PATH, "yahoo", ",", "IBM", use_cache=False)
+    strategy = JMMobileStrategy(backtest.market, "strategy", longMedian=50, shortMedian=10, asset=asset,
+                                typeOfPred="UP")
+    expert = JMMobileExpert(backtest.market, "expert", longMedian=60, shortMedian=20, asset=asset)
+    random_expert = JMRandomExpert(backtest.market, "random", asset=asset, numberOfPredictions=30, predictionTerm=50,
+                                   typeOfPred="UP", first_day=0, last_day=3000)
+    backtest.simule(first_day=0, last_day=3000, string_mode=False)
+    return strategy, expert, random_expert
+
+
+def test_results_round_trip(tmp_path, simulation):
+    """ The rows written in several blocks are read back, with the medians of their strategy or expert """
+    strategy, expert, random_expert = simulation
+    file_name = str(tmp_path / "results.btr")
+    with ResultsStore(file_name, batch_size=20) as store:
+        store.append(strategy.portfolio.closePositionList)
+        store.append(expert.predictionMadeList)
+        store.append(random_expert.predictionMadeList, NO_MEDIANS)
+    assert store.blocksWritten > 1
+
+    expected = {name: [] for name in store.pendingColumns}
+    for prediction_list, medians in ((strategy.portfolio.closePositionList, None),
+                                     (expert.predictionMadeList, None), (random_expert.predictionMadeList, NO_MEDIANS)):
+        for name, values in result_rows(prediction_list, medians).items():
+            expected[name].extend(values)
+    results = read_results(file_name)
+    assert len(results["source"]) == store.rowsWritten == len(expected["source"])
+    for name, values in expected.items():
+        assert results[name].tolist() == values
+
+    assert set(results["source"][results["long"] == 50]) == {"Portfolio of strategy"}
+    assert set(results["source"][results["long"] == 60]) == {"expert"}
+    assert set(results["source"][results["long"] == -1]) == {"random"}
+    assert len(results["source"][results["source"] == "random"]) == 30
+
+    selected = read_results(file_name, ["day", "result"], where={"source": "expert", "isTrue": True})
+    is_selected = (results["source"] == "expert") & results["isTrue"]
+    assert selected["day"].tolist() == results["day"][is_selected].tolist()
+    assert list(selected) == ["day", "result"]
+
+
+def test_results_append_to_file(tmp_path, simulation):
+    """ A store opened without overwrite adds its blocks at the end of the file """
+    strategy, expert, random_expert = simulation
+    file_name = str(tmp_path / "results.btr")
+    with ResultsStore(file_name) as store:
+        store.append(expert.predictionMadeList)
+    with ResultsStore(file_name, overwrite=False) as store:
+        store.append(expert.predictionMadeList)
+    assert len(read_results(file_name)["day"]) == 2 * len(expert.predictionMadeList)
+
+
+def test_results_without_medians(simulation):
+    """ The rows of a reference without medians can not be written without explicit medians """
+    strategy, expert, random_expert = simulation
+    with pytest.raises(ValueError):
+        result_rows(random_expert.predictionMadeList)
+
+
+def test_read_unknown_column():
+    with pytest.raises(ValueError):
+        read_results(os.devnull, ["unknown"])
+
+
+def write_csv(file_name, simulation, results_writer=None):
+    """ The csv of a sweep: a header, then the lists of the strategy and of the expert, in the formats 1 and 3 """
+    strategy, expert, random_expert = simulation
+    write_a_prediction_list_on_file(file_name, [], first_line="sweep", results_writer=results_writer)
+    for format_type in (1, 3):
+        write_a_prediction_list_on_file(file_name, expert.predictionMadeList, format_type=format_type,
+                                        overwrite=False, results_writer=results_writer)
+    write_a_prediction_list_on_file(file_name, strategy.portfolio.closePositionList, format_type=3, overwrite=False,
+                                    results_writer=results_writer)
+
+
+def test_writer_csv_same_as_direct(tmp_path, simulation):
+    """ The csv written by the thread of a ResultsWriter is the same, byte for byte, as the one written directly """
+    write_csv(str(tmp_path / "direct.csv"), simulation)
+    with ResultsWriter(max_batches=2) as writer:
+        write_csv(str(tmp_path / "writer.csv"), simulation, writer)
+    assert writer.batchesWritten == 4
+    with open(str(tmp_path / "direct.csv"), "rb") as direct, open(str(tmp_path / "writer.csv"), "rb") as written:
+        content = direct.read()
+        assert content == written.read()
+    assert content.count(b"\n") > 3
+
+
+def test_writer_store_same_as_direct(tmp_path, simulation):
+    strategy, expert, random_expert = simulation
+    with ResultsStore(str(tmp_path / "direct.btr")) as store:
+        store.append(expert.predictionMadeList)
+        store.append(random_expert.predictionMadeList, NO_MEDIANS)
+    with ResultsWriter() as writer, ResultsStore(str(tmp_path / "writer.btr")) as store:
+        writer.write_results(store, expert.predictionMadeList)
+        writer.write_results(store, random_expert.predictionMadeList, NO_MEDIANS)
+        writer.flush()
+    direct, written = read_results(str(tmp_path / "direct.btr")), read_results(str(tmp_path / "writer.btr"))
+    for name in direct:
+        assert np.array_equal(direct[name], written[name])
+
+
+def test_writer_error(tmp_path):
+    """ An error of the thread is raised by the next call to the writer """
+    writer = ResultsWriter()
+    writer.write_rows(str(tmp_path / "missing" / "results.csv"), [[1, 2]])
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    with pytest.raises(RuntimeError):
+        writer.close()
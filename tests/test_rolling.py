@@ -0,0 +1,38 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from source.rollingTools import RollingVariance, RollingStd, RollingZScore
+
+
+def trending_series():
+    """ Prices going from 1 to 1e6, then staying around 1e6 with a small noise: far from the first values, with a
+    small variance """
+    days = np.arange(20000)
+    noise = np.random.RandomState(0).normal(0, 1e-2, len(days))
+    return np.minimum(1 + 100. * days, 1e6) + noise
+
+
+def test_rolling_variance_trending_series():
+    """ The variance, standard deviation and z-score of a trending series match numpy on each window """
+    values = trending_series()
+    for window, ddof in ((20, 1), (20, 0), (250, 1)):
+        variance, std, z_score = RollingVariance(window, ddof), RollingStd(window, ddof), RollingZScore(window, ddof)
+        results = np.array([(variance.update(value), std.update(value), z_score.update(value)) for value in values])
+        assert np.all(np.isnan(results[:window - 1]))
+
+        windows = sliding_window_view(values, window)
+        expected_variance = np.var(windows, axis=1, ddof=ddof)
+        expected_std = np.sqrt(expected_variance)
+        expected_z_score = (values[window - 1:] - windows.mean(axis=1)) / expected_std
+        assert np.allclose(results[window - 1:, 0], expected_variance, rtol=1e-6, atol=0)
+        assert np.allclose(results[window - 1:, 1], expected_std, rtol=1e-6, atol=0)
+        assert np.allclose(results[window - 1:, 2], expected_z_score, rtol=1e-6, atol=1e-6)
+        assert math.isclose(variance.mean, windows[-1].mean(), rel_tol=1e-12)
+
+
+def test_rolling_z_score_constant_window():
+    """ The z-score of a window of equal values is 0 """
+    z_score = RollingZScore(5)
+    for value in [3.] * 10:
+        z_score.update(value)
+    assert z_score.value == 0.
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pytest
+from source.Backtest import Backtest
+from source.Market import Strategy
+from source.strategy_JM import JMMobileStrategy
+
+IBM_PATH = os.path.join(os.path.dirname(__file__), "..", "source", "Data", "IBM_1970_2010_yahoo.csv")
+
+
+class PeekStrategy(Strategy):
+    """ Buys the day before each rise: reads the whole history of the asset (look-ahead) """
+
+    def __init__(self, *args, **kwargs):
+        self.asset = kwargs.pop("asset")
+        super().__init__(*args, **kwargs)
+
+    def signals(self, first_day):
+        data = self.asset.data
+        rises = np.zeros(len(data), dtype=bool)
+        rises[:-1] = data[1:] > data[:-1]
+        return [(self.asset, rises, ~rises, np.ones(len(data)))]
+
+
+def ibm_backtest():
+    backtest = Backtest()
+    asset = backtest.add_asset_from_csv(IBM_PATH, "yahoo", ",", "IBM", use_cache=False)
+    return backtest, asset
+
+
+def test_look_ahead_detected():
+    backtest, asset = ibm_backtest()
+    PeekStrategy(backtest.market, "peek", asset=asset, vectorized=True)
+    with pytest.raises(ValueError, match="look-ahead"):
+        backtest.simule(string_mode=False, plot_mode=False, last_day=3000)
+    # the values are visible again after the check
+    assert asset.visibleDays is None and len(asset.data) == asset.length == 10097
+
+
+def test_vectorized_same_as_day_by_day():
+    results = []
+    for vectorized in (False, True):
+        backtest, asset = ibm_backtest()
+        strategy = JMMobileStrategy(backtest.market, "strategy", longMedian=50, shortMedian=10, typeOfPred="UP",
+                                    vectorized=vectorized)
+        backtest.simule(string_mode=False, plot_mode=False, first_day=5, last_day=3000)
+        results.append((strategy.portfolio.valueHistory, strategy.portfolio.results_description()))
+    assert results[0] == results[1]